@@ -0,0 +1,14 @@
+# backend/benchmarks/__main__.py
+#
+# Run from the backend directory:
+#
+#     python -m benchmarks [names...] [--quick] [--output results.json]
+#                          [--baseline baseline.json] [--threshold 0.1]
+#
+# Exits with status 1 when a metric regressed past the threshold.
+
+import sys
+from benchmarks.runner import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,390 @@
+# backend/benchmarks/cases.py
+#
+# Every benchmark is a function of `quick` (smaller sizes for a fast check)
+# returning {metric name: metric(...)}. They run in a fresh process each (see
+# benchmarks.runner), with DATABASE_URL pointing at a throwaway SQLite file,
+# so application modules that touch the database are imported inside them.
+
+import asyncio
+import datetime
+import functools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from typing import Any, Callable, Dict, List
+
+Metrics = Dict[str, Dict[str, Any]]
+
+def metric(value: float, unit: str, higher_is_better: bool) -> Dict[str, Any]:
+    return {"value": float(value), "unit": unit, "higher_is_better": higher_is_better}
+
+def rss_mb(ru_maxrss: int) -> float:
+    # getrusage reports kilobytes on Linux and bytes on macOS.
+    return ru_maxrss / 2 ** 20 if sys.platform == "darwin" else ru_maxrss / 2 ** 10
+
+def best_time(fn: Callable[[], Any], repeat: int) -> float:
+    """Fastest of `repeat` runs of `fn`, in seconds (after one warm-up run)."""
+    fn()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+def client_training(quick: bool) -> Metrics:
+    """Samples per second of one client's local epoch (`train_client_epoch`)."""
+    from benchmarks.synthetic import SyntheticMNIST
+    from nn_models import MNISTModel
+    from utils.client_training import train_client_epoch
+    from utils.mnist_cache import TensorBatchLoader
+
+    num_samples = 2048 if quick else 8192
+    loader = TensorBatchLoader(SyntheticMNIST(num_samples), batch_size=32, shuffle=True)
+    model = MNISTModel()
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=0.001)
+    seconds = best_time(lambda: train_client_epoch(model, loader, criterion, optimizer), 2 if quick else 3)
+    return {"samples_per_sec": metric(num_samples / seconds, "samples/s", True)}
+
+def fast_compute(quick: bool) -> Metrics:
+    """
+    Samples per second of a client epoch on the fast-compute path (torch.compile
+    and bf16 autocast where available, see `FastCompute`) against eager.
+    """
+    from benchmarks.synthetic import SyntheticMNIST
+    from nn_models import MNISTModel
+    from utils.client_training import train_client_epoch
+    from utils.fast_compute import FastCompute
+    from utils.mnist_cache import TensorBatchLoader
+
+    num_samples = 2048 if quick else 8192
+    loader = TensorBatchLoader(SyntheticMNIST(num_samples), batch_size=32, shuffle=True)
+    criterion = nn.CrossEntropyLoss()
+    repeat = 2 if quick else 3
+    rates = {}
+    # No calibration: every step takes the fast path (or eager after a compile error).
+    for name, compute in (("eager", None), ("fast", FastCompute(calibration_steps=0))):
+        model = MNISTModel()
+        optimizer = optim.Adam(model.parameters(), lr=0.001)
+        seconds = best_time(lambda: train_client_epoch(model, loader, criterion, optimizer, fast_compute=compute), repeat)
+        rates[name] = num_samples / seconds
+    return {
+        "eager_samples_per_sec": metric(rates["eager"], "samples/s", True),
+        "fast_samples_per_sec": metric(rates["fast"], "samples/s", True),
+        "speedup": metric(rates["fast"] / rates["eager"], "x", True),
+    }
+
+def round_time(quick: bool) -> Metrics:
+    """Round wall time of `training_loop_stream` as the number of clients grows."""
+    from benchmarks.synthetic import SyntheticMNIST
+    from nn_models import MNISTModel
+    from utils.data_partition import create_data_loaders, partition_dataset
+    from utils.training_loop import training_loop_stream
+
+    samples_per_client = 256
+    results = {}
+    for num_clients in ([2, 8] if quick else [2, 8, 32]):
+        dataset = SyntheticMNIST(num_clients * samples_per_client)
+        loaders = create_data_loaders(partition_dataset(dataset, num_clients, seed=0))
+        events = training_loop_stream(
+            MNISTModel(), 3, loaders, nn.CrossEntropyLoss(),
+            functools.partial(optim.Adam, lr=0.001), num_clients=num_clients, seed=0,
+        )
+        durations = [event["duration_s"] for event in events if event["type"] == "round_summary"]
+        # The first round pays for allocator and kernel warm-up.
+        results[f"round_wall_s.clients_{num_clients}"] = metric(statistics.median(durations[1:]), "s", False)
+    return results
+
+def aggregation(quick: bool) -> Metrics:
+    """Latency of aggregating 10 client updates as the model grows."""
+    from utils.aggregation import StreamingAggregator, aggregate_updates
+    from utils.flat_state import FlatStateLayout
+
+    num_updates = 10
+    results = {}
+    for numel in ([100_000, 1_000_000] if quick else [100_000, 1_000_000, 10_000_000]):
+        # Four entries of equal size, like a small network's weights and biases.
+        state = {f"layer{i}.weight": torch.randn(numel // 4) for i in range(4)}
+        updates = [{key: torch.randn_like(value) for key, value in state.items()} for _ in range(num_updates)]
+        layout = FlatStateLayout(state)
+        flat_updates = [layout.flatten(update) for update in updates]
+        global_flat = layout.flatten(state)
+        aggregator = StreamingAggregator(layout)
+
+        def streaming():
+            for update in flat_updates:
+                aggregator.add(update, weight=100.0)
+            aggregator.apply_to(global_flat)
+
+        label = f"params_{numel}"
+        results[f"streaming_ms.{label}"] = metric(best_time(streaming, 5) * 1000, "ms", False)
+        results[f"aggregate_updates_ms.{label}"] = metric(
+            best_time(lambda: aggregate_updates(updates, [100.0] * num_updates), 5) * 1000, "ms", False
+        )
+    return results
+
+def compression(quick: bool) -> Metrics:
+    """
+    Compression ratio of each update codec and what it costs in test accuracy
+    and loss against the same seeded run with uncompressed updates.
+    """
+    from benchmarks.synthetic import SyntheticMNIST
+    from nn_models import MNISTModel
+    from utils.compression import make_codec
+    from utils.data_partition import create_data_loaders, partition_dataset
+    from utils.evaluation import Evaluator
+    from utils.training_loop import training_loop_stream
+
+    num_clients, num_rounds = (4, 2) if quick else (8, 4)
+    train, test = SyntheticMNIST(num_clients * 256, seed=0), SyntheticMNIST(2000, seed=1)
+    # Label by a fixed random linear teacher, so the task is learnable and
+    # the codecs' effect on accuracy is visible.
+    teacher = torch.randn(28 * 28, 10, generator=torch.Generator().manual_seed(2))
+    for dataset in (train, test):
+        dataset.targets = (dataset.images.flatten(1) @ teacher).argmax(dim=1)
+    loaders = create_data_loaders(partition_dataset(train, num_clients, seed=0), shuffle=False)
+
+    scores, ratios = {}, {}
+    for name in ("none", "int8", "int4", "topk"):
+        torch.manual_seed(0)
+        evaluator = Evaluator(test.images, test.targets, every_rounds=0)
+        events = training_loop_stream(
+            MNISTModel(), num_rounds, loaders, nn.CrossEntropyLoss(),
+            functools.partial(optim.Adam, lr=0.001), num_clients=num_clients, seed=0,
+            codec=make_codec(name, topk_fraction=0.05, seed=0), evaluator=evaluator,
+        )
+        ratios[name] = [event.get("compression_ratio", 1.0) for event in events if event["type"] == "round_summary"]
+        scores[name] = evaluator.history[-1][1:]
+
+    baseline_loss, baseline_accuracy = scores["none"]
+    results = {
+        "test_accuracy.none": metric(baseline_accuracy, "fraction", True),
+        "test_loss.none": metric(baseline_loss, "loss", False),
+    }
+    for name in ("int8", "int4", "topk"):
+        loss, accuracy = scores[name]
+        results[f"compression_ratio.{name}"] = metric(statistics.mean(ratios[name]), "x", True)
+        results[f"test_accuracy.{name}"] = metric(accuracy, "fraction", True)
+        results[f"test_loss.{name}"] = metric(loss, "loss", False)
+        # Positive when the codec makes the model worse than the uncompressed run.
+        results[f"accuracy_cost.{name}"] = metric(baseline_accuracy - accuracy, "fraction", False)
+        results[f"loss_cost.{name}"] = metric(loss - baseline_loss, "loss", False)
+    return results
+
+def evaluation(quick: bool) -> Metrics:
+    """Test-set samples scored per second by `Evaluator` (inference mode, large batches)."""
+    from benchmarks.synthetic import SyntheticMNIST
+    from nn_models import MNISTModel
+    from utils.evaluation import Evaluator
+
+    dataset = SyntheticMNIST(10000, seed=1)
+    evaluator = Evaluator(dataset.images, dataset.targets)
+    model = MNISTModel()
+    seconds = best_time(lambda: evaluator.evaluate(model), 3 if quick else 10)
+    return {"samples_per_sec": metric(evaluator.num_samples / seconds, "samples/s", True)}
+
+def mnist_loading(quick: bool) -> Metrics:
+    """Opening the MNIST cache through `load_mnist_dataloader` and reading one epoch."""
+    from benchmarks.synthetic import write_synthetic_cache
+
+    num_samples = 20000 if quick else 60000
+    with tempfile.TemporaryDirectory() as root:
+        write_synthetic_cache(os.path.join(root, "data"), num_samples)
+        cwd = os.getcwd()
+        # load_mnist_dataloader reads ./data, like the app does.
+        os.chdir(root)
+        try:
+            from utils.simulation_manager import load_mnist_dataloader
+
+            started = time.perf_counter()
+            loader = load_mnist_dataloader(batch_size=32)
+            open_s = time.perf_counter() - started
+
+            def epoch():
+                for images, _ in loader:
+                    images.sum()
+
+            epoch_s = best_time(epoch, 2)
+        finally:
+            os.chdir(cwd)
+    return {
+        "open_ms": metric(open_s * 1000, "ms", False),
+        "epoch_samples_per_sec": metric(num_samples / epoch_s, "samples/s", True),
+    }
+
+def ledger(quick: bool) -> Metrics:
+    """Throughput of the SQL ledger (and the in-memory one) for lookups, transfers and batch credits."""
+    from database import SessionLocal, engine
+    from models import Base
+    from utils.token_rewards import SQLTokenLedger, TokenLedger
+
+    Base.metadata.create_all(bind=engine)
+    num_users = 1000
+    lookups = 500 if quick else 2000
+    transfers = 100 if quick else 500
+    batch = 2000 if quick else 10000
+    rng = random.Random(0)
+
+    sql_ledger = SQLTokenLedger(SessionLocal)
+    sql_ledger.record_transactions(range(1, num_users + 1), [1000.0] * num_users, "seed")
+    memory_ledger = TokenLedger()
+    memory_ledger.record_transactions(range(1, num_users + 1), [1000.0] * num_users, "seed")
+
+    def rate(fn: Callable[[], Any], count: int) -> float:
+        started = time.perf_counter()
+        for _ in range(count):
+            fn()
+        return count / (time.perf_counter() - started)
+
+    def pair():
+        return rng.sample(range(1, num_users + 1), 2)
+
+    batch_users = [rng.randint(1, num_users) for _ in range(batch)]
+    started = time.perf_counter()
+    sql_ledger.record_transactions(batch_users, [0.5] * batch, "benchmark")
+    batch_rate = batch / (time.perf_counter() - started)
+
+    return {
+        "sql.balance_lookups_per_sec": metric(
+            rate(lambda: sql_ledger.get_balance(rng.randint(1, num_users)), lookups), "ops/s", True
+        ),
+        "sql.transfers_per_sec": metric(
+            rate(lambda: sql_ledger.transfer_tokens(*pair(), 1.0, "benchmark"), transfers), "ops/s", True
+        ),
+        "sql.batch_credits_per_sec": metric(batch_rate, "rows/s", True),
+        "memory.balance_lookups_per_sec": metric(
+            rate(lambda: memory_ledger.get_balance(rng.randint(1, num_users)), lookups * 10), "ops/s", True
+        ),
+        "memory.transfers_per_sec": metric(
+            rate(lambda: memory_ledger.transfer_tokens(*pair(), 1.0, "benchmark"), transfers * 10), "ops/s", True
+        ),
+    }
+
+def api(quick: bool, concurrency: int = 16) -> Metrics:
+    """Latency and throughput of the FastAPI routes under `concurrency` concurrent requests."""
+    import httpx
+    from sqlalchemy import insert
+    from create_tables import create_tables
+    from database import SessionLocal
+    from main import app
+    from models import SimulationRecord
+    from utils.token_rewards import global_ledger
+
+    # ASGITransport does not run the app's startup hook, which creates the tables.
+    create_tables()
+    now = datetime.datetime.utcnow()
+    with SessionLocal() as db, db.begin():
+        db.execute(insert(SimulationRecord), [
+            {
+                "num_rounds": 10,
+                "num_clients": 5,
+                "fraction_fit": 0.5,
+                "status": "Completed" if i % 4 else "Failed",
+                "started_at": now - datetime.timedelta(minutes=i),
+                "finished_at": now - datetime.timedelta(minutes=i) + datetime.timedelta(seconds=30),
+            }
+            for i in range(5000)
+        ])
+    global_ledger.record_transactions([1] * 500, [1.0] * 500, "seed")
+
+    requests_per_route = 200 if quick else 1000
+    routes = {
+        "simulations_page": ("GET", "/api/simulations/?limit=50", None),
+        "simulations_filtered": ("GET", "/api/simulations/?limit=50&status=Failed&fields=id,status,started_at", None),
+        "ledger_page": ("GET", "/api/incentives/ledger?user_id=1&limit=50", None),
+        "rewards_batch": ("POST", "/api/incentives/rewards/batch", {
+            "user_ids": list(range(1, 101)),
+            "previous_metrics": [0.5] * 100,
+            "current_metrics": [0.4] * 100,
+        }),
+    }
+
+    async def load(method: str, url: str, body) -> Metrics:
+        latencies: List[float] = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            remaining = iter(range(requests_per_route))
+
+            async def worker():
+                for _ in remaining:
+                    started = time.perf_counter()
+                    response = await client.request(method, url, json=body)
+                    latencies.append(time.perf_counter() - started)
+                    response.raise_for_status()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+        return {
+            "p50_ms": metric(_percentile(latencies, 0.5) * 1000, "ms", False),
+            "p95_ms": metric(_percentile(latencies, 0.95) * 1000, "ms", False),
+            "requests_per_sec": metric(len(latencies) / elapsed, "req/s", True),
+        }
+
+    async def load_all() -> Metrics:
+        # One event loop for every route: the async engine's pool is bound to it.
+        results = {}
+        for name, (method, url, body) in routes.items():
+            for key, value in (await load(method, url, body)).items():
+                results[f"{name}.{key}"] = value
+        return results
+
+    return asyncio.run(load_all())
+
+# Printed by a fresh interpreter: seconds to import the app, peak RSS in MB and
+# whether torch got loaded. On Linux ru_maxrss survives exec (it would include
+# the forking benchmark process), so the peak is read from /proc instead.
+_COLD_START_SCRIPT = (
+    "import json, os, resource, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import main\n"
+    "elapsed = time.perf_counter() - started\n"
+    "if os.path.exists('/proc/self/status'):\n"
+    "    hwm = [line for line in open('/proc/self/status') if line.startswith('VmHWM')][0]\n"
+    "    peak_mb = int(hwm.split()[1]) / 1024\n"
+    "else:\n"
+    "    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 20\n"
+    "print(json.dumps([elapsed, peak_mb, 'torch' in sys.modules]))\n"
+)
+
+def cold_start(quick: bool) -> Metrics:
+    """Import time and memory of a fresh API worker (`import main`), and whether it loads torch."""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = []
+    for _ in range(3 if quick else 5):
+        output = subprocess.run(
+            [sys.executable, "-c", _COLD_START_SCRIPT],
+            cwd=backend_dir, capture_output=True, text=True, check=True,
+        ).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+    return {
+        "import_s": metric(min(seconds for seconds, _, _ in runs), "s", False),
+        "worker_rss_mb": metric(min(peak_mb for _, peak_mb, _ in runs), "MB", False),
+        "torch_loaded": metric(float(any(loaded for _, _, loaded in runs)), "bool", False),
+    }
+
+BENCHMARKS: Dict[str, Callable[..., Metrics]] = {
+    "cold_start": cold_start,
+    "client_training": client_training,
+    "fast_compute": fast_compute,
+    "round_time": round_time,
+    "aggregation": aggregation,
+    "compression": compression,
+    "evaluation": evaluation,
+    "mnist_loading": mnist_loading,
+    "ledger": ledger,
+    "api": api,
+}
@@ -0,0 +1,134 @@
+# backend/benchmarks/runner.py
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing as mp
+import os
+import platform
+import random
+import resource
+import tempfile
+from typing import Any, Dict, List, Optional
+from benchmarks.cases import BENCHMARKS, Metrics, metric, rss_mb
+
+def _run_case(name: str, quick: bool, threads: int, options: Dict[str, Any]) -> Metrics:
+    # Runs in its own process, so peak RSS is this benchmark's alone.
+    import numpy as np
+    import torch
+
+    random.seed(0)
+    np.random.seed(0)
+    torch.manual_seed(0)
+    torch.set_num_threads(threads)
+    results = BENCHMARKS[name](quick, **options)
+    results["peak_rss_mb"] = metric(rss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss), "MB", False)
+    return results
+
+def run_benchmarks(
+    names: List[str],
+    quick: bool = False,
+    threads: int = 1,
+    options: Optional[Dict[str, Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Run the named benchmarks, each in a fresh process with its own scratch
+    database, and return the results document written by `main`.
+    """
+    options = options or {}
+    context = mp.get_context("spawn")
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        for name in names:
+            print(f"Running {name}...", flush=True)
+            # Benchmarks must never write to the configured database.
+            os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, name)}.db"
+            os.environ.pop("DATABASE_ASYNC_URL", None)
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results[name] = executor.submit(_run_case, name, quick, threads, options.get(name, {})).result()
+
+    import torch
+
+    return {
+        "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch_threads": threads,
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    Compare every metric present in both documents.
+
+    A metric regresses when it is more than `threshold` (a fraction) worse than
+    the baseline, in whichever direction is worse for it.
+
+    Returns:
+        List[Dict[str, Any]]: One row per compared metric, with its relative
+        change and whether it regressed.
+    """
+    rows = []
+    for name, metrics in results["results"].items():
+        for key, current in metrics.items():
+            previous = baseline.get("results", {}).get(name, {}).get(key)
+            if previous is None or previous["value"] == 0:
+                continue
+            change = (current["value"] - previous["value"]) / previous["value"]
+            worse = -change if current["higher_is_better"] else change
+            rows.append({
+                "metric": f"{name}.{key}",
+                "value": current["value"],
+                "baseline": previous["value"],
+                "unit": current["unit"],
+                "change": change,
+                "regressed": worse > threshold,
+            })
+    return rows
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the training and API benchmarks")
+    parser.add_argument("benchmarks", nargs="*", help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--quick", action="store_true", help="Use smaller sizes for a fast check")
+    parser.add_argument("--output", default="benchmark-results.json", help="Where to write the results JSON")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown that counts as a regression")
+    parser.add_argument("--threads", type=int, default=1, help="torch threads per benchmark process")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent requests in the API benchmark")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+    names = args.benchmarks or list(BENCHMARKS)
+
+    results = run_benchmarks(names, args.quick, args.threads, {"api": {"concurrency": args.concurrency}})
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    for name in names:
+        for key, value in results["results"][name].items():
+            print(f"{name}.{key}: {value['value']:.4g} {value['unit']}")
+    print(f"Results written to {args.output}")
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("environment", {}).get("quick") != args.quick:
+        print("Warning: the baseline was run with different --quick sizes; metrics may not be comparable")
+    rows = compare(results, baseline, args.threshold)
+    regressions = [row for row in rows if row["regressed"]]
+    print(f"\nCompared with {args.baseline} ({len(rows)} metrics, threshold {args.threshold:.0%}):")
+    for row in rows:
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(f"{row['metric']}: {row['value']:.4g} vs {row['baseline']:.4g} {row['unit']} ({row['change']:+.1%}){flag}")
+    if regressions:
+        print(f"{len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+        return 1
+    return 0
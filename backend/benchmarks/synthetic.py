@@ -0,0 +1,45 @@
+# backend/benchmarks/synthetic.py
+
+import os
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from utils.mnist_cache import _atomic_save, _cache_paths
+
+def _synthetic_arrays(num_samples: int, seed: int):
+    rng = np.random.default_rng(seed)
+    images = rng.standard_normal((num_samples, 1, 28, 28), dtype=np.float32)
+    labels = rng.integers(0, 10, size=num_samples, dtype=np.int64)
+    return images, labels
+
+class SyntheticMNIST(Dataset):
+    """
+    Random data with the shapes and dtypes of the normalized MNIST cache.
+
+    Exposes the same `images` and `targets` tensors as `MNISTTensorDataset`, so
+    it works with `TensorBatchLoader` and `partition_dataset`, and the same seed
+    always gives the same data.
+    """
+
+    def __init__(self, num_samples: int = 60000, seed: int = 0) -> None:
+        images, labels = _synthetic_arrays(num_samples, seed)
+        self.images = torch.from_numpy(images)
+        self.targets = torch.from_numpy(labels)
+
+    def __len__(self) -> int:
+        return self.targets.shape[0]
+
+    def __getitem__(self, index):
+        return self.images[index], int(self.targets[index])
+
+def write_synthetic_cache(root: str, num_samples: int = 60000, seed: int = 0, train: bool = True) -> None:
+    """
+    Write synthetic data where `build_mnist_cache` keeps the real MNIST cache
+    (of the training split, or the test split with `train=False`), so
+    `MNISTTensorDataset(root)` and `load_mnist_dataloader` run offline.
+    """
+    images, labels = _synthetic_arrays(num_samples, seed)
+    images_path, labels_path = _cache_paths(root, train=train)
+    os.makedirs(os.path.dirname(images_path), exist_ok=True)
+    _atomic_save(images_path, images)
+    _atomic_save(labels_path, labels)
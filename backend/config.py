@@ -1,5 +1,6 @@
 # backend/config.py
-from pydantic import BaseSettings, AnyUrl, Field
+from pydantic import BaseSettings, Field
+from typing import Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Federated Learning Simulation with Tokenized Incentives"
@@ -9,12 +10,129 @@ class Settings(BaseSettings):
     NUM_ROUNDS: int = 100
     NUM_CLIENTS: int = 2
     FRACTION_FIT: float = 0.5
+    # Client data shards: None gives an IID split, a float a Dirichlet(alpha) label skew
+    PARTITION_DIRICHLET_ALPHA: Optional[float] = None
+    PARTITION_SEED: Optional[int] = None
+
+    # Client training execution: 0 workers trains clients sequentially in-process
+    TRAINING_NUM_WORKERS: int = 0
+    TRAINING_THREADS_PER_WORKER: int = 1
+    TRAINING_MP_START_METHOD: str = "spawn"
+    # Train all clients as one batched model (Adam only); ignored when workers > 0
+    TRAINING_VECTORIZED: bool = False
+    # Keep each client's optimizer state across rounds (sequential engine only)
+    TRAINING_PERSISTENT_OPTIMIZER_STATE: bool = False
+    # Opt-in fast compute for client steps (not the vectorized engine):
+    # torch.compile (once per client replica) and bf16 autocast on CPUs with
+    # native bf16, kept only if calibration against eager over the first
+    # steps finds it faster; compile errors fall back to eager. Also applies
+    # the intra-/inter-op torch thread counts (None: unchanged) to the
+    # training process, or to each worker process
+    TRAINING_FAST_COMPUTE: bool = False
+    TRAINING_COMPILE: bool = True
+    TRAINING_COMPILE_BACKEND: str = "inductor"
+    TRAINING_BF16_AUTOCAST: bool = True
+    TRAINING_FAST_COMPUTE_CALIBRATION_STEPS: int = 20
+    TRAINING_INTRA_OP_THREADS: Optional[int] = None
+    TRAINING_INTER_OP_THREADS: Optional[int] = None
+    # Asynchronous (buffered) aggregation, selected per simulation: updates per
+    # buffer application and the server learning rate applied to the buffer
+    ASYNC_BUFFER_SIZE: int = 4
+    ASYNC_SERVER_LR: float = 1.0
+    # Client update codec: none, lossless, int8, int4 or topk (error feedback is
+    # per-client state, so topk with error feedback needs TRAINING_NUM_WORKERS=0)
+    UPDATE_CODEC: str = "none"
+    UPDATE_CODEC_TOPK_FRACTION: float = 0.01
+    UPDATE_CODEC_ERROR_FEEDBACK: bool = True
+
+    # Test-set evaluation of the global model every N rounds (0: only after the
+    # last one), optionally on a fixed random subset and of every client model
+    EVALUATION_EVERY_ROUNDS: int = 1
+    EVALUATION_SAMPLE_SIZE: Optional[int] = None
+    EVALUATION_BATCH_SIZE: int = 2048
+    EVALUATION_CLIENTS: bool = False
+    # Per-client rewards from truncated Monte Carlo Shapley values, estimated
+    # each round on a test subset within a per-round budget of coalition
+    # evaluations and seconds (None: unbounded). Off by default: it keeps every
+    # client's update of a round in memory, and it needs TRAINING_NUM_WORKERS=0
+    # and synchronous aggregation (other runs fail). Off, the global
+    # improvement goes to user 1
+    CONTRIBUTION_SCORING: bool = False
+    CONTRIBUTION_SAMPLE_SIZE: Optional[int] = 1000
+    CONTRIBUTION_PERMUTATIONS: int = 50
+    CONTRIBUTION_TRUNCATION_TOLERANCE: float = 0.01
+    CONTRIBUTION_MAX_EVALUATIONS: Optional[int] = 200
+    CONTRIBUTION_TIME_BUDGET_SECONDS: Optional[float] = None
+
+    # Per-round metrics persisted to round_metrics (per client unless
+    # ROUND_METRICS_CLIENTS is off), bulk-written every N rounds
+    ROUND_METRICS_ENABLED: bool = True
+    ROUND_METRICS_FLUSH_EVERY_ROUNDS: int = 10
+    ROUND_METRICS_CLIENTS: bool = True
+
+    # Per-round checkpoints of jobs (0 disables); every CHECKPOINT_FULL_EVERY-th
+    # checkpoint stores the weights in full, the others a delta from the previous one
+    CHECKPOINT_DIR: str = "./checkpoints"
+    CHECKPOINT_EVERY_ROUNDS: int = 0
+    CHECKPOINT_KEEP_LAST: int = 3
+    CHECKPOINT_FULL_EVERY: int = 1
+
+    # Per-phase timers and counters served at /metrics (off: near-zero overhead),
+    # and an optional torch.profiler trace of one round written to PROFILE_DIR
+    METRICS_ENABLED: bool = True
+    PROFILE_ROUND: Optional[int] = None
+    PROFILE_DIR: str = "./profiles"
+
+    # Local multi-process federation (python -m utils.federated): seconds to wait
+    # for every client process to report ready
+    FEDERATION_READY_TIMEOUT_SECONDS: float = 120.0
+
+    # Seed of jobs that do not pass one (model init, partition, client sampling
+    # and shuffling); None runs every job unseeded
+    SIMULATION_SEED: Optional[int] = 0
+    # Results of seeded runs, replayed instead of retrained when a run's whole
+    # configuration was seen before; least recently used ones are evicted
+    # beyond RESULT_CACHE_MAX_BYTES
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_DIR: str = "./result_cache"
+    RESULT_CACHE_MAX_BYTES: int = 1 << 30
+
+    # Background simulation jobs
+    SIMULATION_MAX_CONCURRENT_JOBS: int = 1
+    SIMULATION_EVENT_BUFFER_SIZE: int = 1000
+    SIMULATION_JOB_HISTORY: int = 100
+    SIMULATION_SSE_KEEPALIVE_SECONDS: float = 15.0
+    # Client results kept per round in the event stream ("clients" verbosity)
+    SSE_MAX_CLIENT_RESULTS_PER_ROUND: int = 100
+
+    # Parameter sweeps: concurrent simulations (None: one per CPU) sharing
+    # SWEEP_CPU_THREADS torch threads (None: all CPUs), at most
+    # SWEEP_MAX_CONFIGURATIONS per sweep
+    SWEEP_MAX_CONCURRENT_JOBS: Optional[int] = None
+    SWEEP_CPU_THREADS: Optional[int] = None
+    SWEEP_MAX_CONFIGURATIONS: int = 256
 
     # Token incentive configuration
     TOKEN_REWARD_SCALING_FACTOR: float = 10.0
 
-    # Database configuration: must be provided via .env
-    DATABASE_URL: AnyUrl = Field(..., env="DATABASE_URL")
+    # Database configuration: must be provided via .env (e.g. postgresql://...
+    # or sqlite:///./fml.db for local development)
+    DATABASE_URL: str = Field(..., env="DATABASE_URL")
+    # URL for the async engine; derived from DATABASE_URL (asyncpg / aiosqlite) when unset
+    DATABASE_ASYNC_URL: Optional[str] = None
+    # Log every SQL statement
+    DB_ECHO: bool = False
+    # Create missing tables and indexes when the API starts (see create_tables.py)
+    DB_CREATE_TABLES_ON_STARTUP: bool = True
+    # Connection pool (ignored for SQLite, which uses SQLAlchemy's default pool)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_PRE_PING: bool = True
+    # Seconds after which a pooled connection is replaced; -1 disables recycling
+    DB_POOL_RECYCLE: int = 1800
+    # SQLite only: seconds a writer waits for another connection's write lock
+    DB_SQLITE_BUSY_TIMEOUT: float = 30.0
 
     # Dummy secret keys for development
     ACCESS_SECRET_KEY: str = Field("dummy_access_secret", env="ACCESS_SECRET_KEY")
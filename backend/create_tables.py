@@ -1,9 +1,31 @@
 # backend/create_tables.py
+from sqlalchemy import inspect, text
 from database import engine
 from models import Base  # Ensure that your models.py defines Base = declarative_base()
 
+def add_missing_columns():
+    # create_all skips tables that already exist, so add nullable columns
+    # declared on them since they were created.
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    # create_all skips tables that already exist, so add any indexes declared
+    # on them since they were created.
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
     print("Tables created successfully.")
 
 if __name__ == "__main__":
@@ -1,13 +1,51 @@
 # backend/database.py
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from config import settings
 
+# Async drivers used when DATABASE_ASYNC_URL is not set explicitly.
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+def async_database_url(url: str) -> str:
+    """Rewrite a synchronous database URL to use the backend's async driver."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend!r}; set DATABASE_ASYNC_URL")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+def engine_options(url: str) -> dict:
+    """Engine keyword arguments from the DB_* settings."""
+    options = {"echo": settings.DB_ECHO, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLite has one writer at a time; concurrent writers queue on its lock.
+        options["connect_args"] = {"timeout": settings.DB_SQLITE_BUSY_TIMEOUT}
+    else:
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    return options
+
 # Create the engine. Ensure your DATABASE_URL in .env is correctly set.
-engine = create_engine(settings.DATABASE_URL, echo=True)
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for routes that await the database instead of blocking a
+# threadpool worker. It has its own pool, sized by the same settings.
+ASYNC_DATABASE_URL = settings.DATABASE_ASYNC_URL or async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     """Dependency to get a SQLAlchemy DB session."""
     db = SessionLocal()
@@ -15,3 +53,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """Dependency to get an async SQLAlchemy DB session."""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,13 +1,15 @@
 # backend/main.py
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from config import settings
 from routes import simulations, incentives  # Make sure your routes are imported correctly
-from database import engine
-from models import Base
-
-# Create tables (for development)
-Base.metadata.create_all(bind=engine)
+from create_tables import create_tables
+from database import async_engine, engine
+from utils.instrumentation import HTTP_REQUEST_SECONDS, registry
+from utils.job_manager import job_manager
+from utils.sweep import sweep_manager
 
 app = FastAPI(title=settings.PROJECT_NAME, debug=settings.DEBUG)
 
@@ -20,9 +22,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.METRICS_ENABLED:
+    # Registered only when metrics are on, so disabling them removes the middleware entirely.
+    @app.middleware("http")
+    async def record_request_metrics(request: Request, call_next):
+        started = time.perf_counter()
+        response = await call_next(request)
+        # Label by route template (e.g. /jobs/{job_id}) to keep the label set bounded.
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path_format if route is not None else "unmatched",
+            status=str(response.status_code),
+        )
+        return response
+
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 app.include_router(simulations.router, prefix="/api/simulations", tags=["Simulations"])
 app.include_router(incentives.router, prefix="/api/incentives", tags=["Incentives"])
 
+@app.on_event("startup")
+def create_database_tables():
+    # Schema creation is an explicit startup step rather than an import side
+    # effect; deployments that migrate the schema separately can turn it off.
+    if settings.DB_CREATE_TABLES_ON_STARTUP:
+        create_tables()
+
+@app.on_event("shutdown")
+def stop_simulation_jobs():
+    # Ask running simulations to stop so worker processes are torn down with the server.
+    job_manager.shutdown()
+    sweep_manager.shutdown()
+
+@app.on_event("shutdown")
+async def close_database_pools():
+    await async_engine.dispose()
+    engine.dispose()
+
 @app.get("/")
 async def root():
     return {"message": f"Welcome to {settings.PROJECT_NAME}!"}
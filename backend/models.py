@@ -1,9 +1,7 @@
 # backend/models.py
 
 import datetime
-import torch
-import torch.nn as nn
-from sqlalchemy import Column, Integer, Float, String, DateTime
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -18,19 +16,74 @@ class SimulationRecord(Base):
     started_at = Column(DateTime, default=datetime.datetime.utcnow)
     finished_at = Column(DateTime, nullable=True)
     status = Column(String, default="pending")
+    # Set for runs scheduled by a parameter sweep.
+    sweep_id = Column(Integer, ForeignKey("simulation_sweeps.id"), nullable=True, index=True)
+    # Result of the run: rounds trained and the global model's last test scores.
+    rounds_completed = Column(Integer, nullable=True)
+    test_loss = Column(Float, nullable=True)
+    test_accuracy = Column(Float, nullable=True)
 
-# A proper PyTorch model for MNIST classification
-class MNISTModel(nn.Module):
-    def __init__(self):
-        super(MNISTModel, self).__init__()
-        self.flatten = nn.Flatten()
-        self.fc1 = nn.Linear(784, 128)
-        self.relu = nn.ReLU()
-        self.fc2 = nn.Linear(128, 10)
-    
-    def forward(self, x):
-        x = self.flatten(x)
-        x = self.fc1(x)
-        x = self.relu(x)
-        x = self.fc2(x)
-        return x
+    # History is listed newest-first with keyset pagination on (started_at, id),
+    # optionally filtered by status.
+    __table_args__ = (
+        Index("ix_simulation_records_started_at_id", "started_at", "id"),
+        Index("ix_simulation_records_status_started_at_id", "status", "started_at", "id"),
+    )
+
+class SimulationSweep(Base):
+    """A batch of simulations scheduled together by the sweep scheduler."""
+    __tablename__ = "simulation_sweeps"
+
+    id = Column(Integer, primary_key=True)
+    num_configurations = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="Queued")
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class RoundMetric(Base):
+    """
+    Per-round results of a simulation: one row per client that trained, and
+    one for the round as a whole (client -1) with the average client loss and
+    the global model's test scores.
+    """
+    __tablename__ = "round_metrics"
+
+    # Keyed client-first so a run's curve for one client (or the global row)
+    # is a single primary-key range scan ordered by round.
+    simulation_id = Column(Integer, ForeignKey("simulation_records.id"), primary_key=True)
+    client = Column(Integer, primary_key=True)
+    round = Column(Integer, primary_key=True)
+    loss = Column(Float, nullable=False)
+    num_samples = Column(Integer, nullable=False)
+    test_loss = Column(Float, nullable=True)
+    test_accuracy = Column(Float, nullable=True)
+    duration_s = Column(Float, nullable=True)
+
+class LedgerTransaction(Base):
+    """Append-only record of every token credit and debit."""
+    __tablename__ = "ledger_transactions"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    amount = Column(Float, nullable=False)
+    description = Column(String, nullable=False, default="")
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    # Serves a user's history newest-first with keyset pagination on id.
+    __table_args__ = (Index("ix_ledger_transactions_user_id_id", "user_id", "id"),)
+
+class TokenBalance(Base):
+    """Running balance per user, maintained alongside every ledger write."""
+    __tablename__ = "token_balances"
+
+    user_id = Column(Integer, primary_key=True)
+    balance = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+def __getattr__(name):
+    # MNISTModel lives in nn_models so that importing the ORM never loads torch;
+    # `from models import MNISTModel` keeps working for existing scripts.
+    if name == "MNISTModel":
+        from nn_models import MNISTModel
+        return MNISTModel
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
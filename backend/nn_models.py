@@ -0,0 +1,43 @@
+# backend/nn_models.py
+#
+# PyTorch models, kept apart from the SQLAlchemy models in models.py so the
+# web tier can use the ORM without importing torch.
+
+import math
+import torch
+import torch.nn as nn
+from typing import Optional
+
+# A proper PyTorch model for MNIST classification
+class MNISTModel(nn.Module):
+    def __init__(self):
+        super(MNISTModel, self).__init__()
+        self.flatten = nn.Flatten()
+        self.fc1 = nn.Linear(784, 128)
+        self.relu = nn.ReLU()
+        self.fc2 = nn.Linear(128, 10)
+    
+    def forward(self, x):
+        x = self.flatten(x)
+        x = self.fc1(x)
+        x = self.relu(x)
+        x = self.fc2(x)
+        return x
+
+@torch.no_grad()
+def reset_parameters(model: nn.Module, generator: Optional[torch.Generator] = None) -> nn.Module:
+    """
+    Redraw the weights and biases of `model`'s Linear layers in place from
+    `generator` (torch's global RNG if None), with the same distribution as
+    nn.Linear's default initialization.
+
+    Returns:
+        nn.Module: `model`.
+    """
+    for module in model.modules():
+        if isinstance(module, nn.Linear):
+            bound = 1 / math.sqrt(module.in_features)
+            module.weight.uniform_(-bound, bound, generator=generator)
+            if module.bias is not None:
+                module.bias.uniform_(-bound, bound, generator=generator)
+    return model
@@ -1,9 +1,9 @@
 # backend/routes/incentives.py
 
 from fastapi import APIRouter, HTTPException, Query
-from pydantic import BaseModel
+from pydantic import BaseModel, root_validator
 from typing import List, Dict, Any, Optional
-from utils.token_rewards import calculate_reward, global_ledger
+from utils.token_rewards import calculate_reward, credit_rewards, global_ledger
 
 router = APIRouter()
 
@@ -44,17 +44,65 @@ def add_reward(reward_req: RewardRequest):
         new_balance=new_balance,
     )
 
+# Request schema for crediting a whole cohort at once; the lists are parallel.
+class BatchRewardRequest(BaseModel):
+    user_ids: List[int]
+    previous_metrics: List[float]
+    current_metrics: List[float]
+    # Defaults to settings.TOKEN_REWARD_SCALING_FACTOR.
+    scaling_factor: Optional[float] = None
+
+    @root_validator(skip_on_failure=True)
+    def check_lengths(cls, values):
+        n = len(values["user_ids"])
+        if n == 0:
+            raise ValueError("user_ids must not be empty")
+        if len(values["previous_metrics"]) != n or len(values["current_metrics"]) != n:
+            raise ValueError("user_ids, previous_metrics and current_metrics must have the same length")
+        return values
+
+# Response schema for the batch reward endpoint
+class BatchRewardResponse(BaseModel):
+    user_ids: List[int]
+    rewards: List[float]
+    # New balance per credited user (keys are user IDs).
+    balances: Dict[int, float]
+
+@router.post("/rewards/batch", response_model=BatchRewardResponse, tags=["Incentives"])
+def add_rewards_batch(batch_req: BatchRewardRequest):
+    try:
+        rewards, balances = credit_rewards(
+            batch_req.user_ids,
+            batch_req.previous_metrics,
+            batch_req.current_metrics,
+            batch_req.scaling_factor,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return BatchRewardResponse(
+        user_ids=batch_req.user_ids,
+        rewards=rewards.tolist(),
+        balances={user_id: round(balance, 2) for user_id, balance in balances.items()},
+    )
+
 # Response schema for returning the ledger
 class LedgerResponse(BaseModel):
     user_id: int
     balance: float
     transactions: List[Dict[str, Any]]
+    # Pass as `cursor` to fetch the next (older) page; null on the last page.
+    next_cursor: Optional[int] = None
 
 @router.get("/ledger", response_model=LedgerResponse, tags=["Incentives"])
-def get_ledger(user_id: int = Query(..., description="User ID to query ledger for")):
+def get_ledger(
+    user_id: int = Query(..., description="User ID to query ledger for"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of transactions to return"),
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+):
     try:
         balance = round(global_ledger.get_balance(user_id), 2)
-        transactions = global_ledger.ledger.get(user_id, [])
+        transactions, next_cursor = global_ledger.get_transactions(user_id, limit=limit, cursor=cursor)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -62,4 +110,5 @@ def get_ledger(user_id: int = Query(..., description="User ID to query ledger fo
         user_id=user_id,
         balance=balance,
         transactions=transactions,
+        next_cursor=next_cursor,
     )
@@ -1,46 +1,320 @@
 # backend/routes/simulations.py
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List
-from sqlalchemy.orm import Session
+import base64
+import datetime
+import numpy as np
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from pydantic import ValidationError
+from typing import Literal, Optional, Tuple
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.responses import StreamingResponse
-from schemas import SimulationRecord as SimulationRecordSchema, SimulationStartRequest, SimulationStartResponse
-from database import get_db
-from utils.simulation_manager import run_simulation_stream
-from models import MNISTModel, SimulationRecord as SimulationRecordModel
+from config import settings
+from schemas import (
+    SIMULATION_RECORD_FIELDS,
+    SimulationRecordPage,
+    SimulationStartRequest,
+    SimulationJobResponse,
+    RoundMetricSeries,
+    SweepConfiguration,
+    SweepRequest,
+    SweepResponse,
+)
+from database import get_async_db
+from models import RoundMetric, SimulationRecord as SimulationRecordModel, SimulationSweep
+from utils.downsample import downsample
+from utils.job_manager import job_manager
+from utils.round_metrics import GLOBAL_CLIENT
+from utils.sweep import expand_grid, sweep_manager
 
 router = APIRouter()
 
-@router.get("/", response_model=List[SimulationRecordSchema], tags=["Simulations"])
-def get_simulations(db: Session = Depends(get_db)):
+def _encode_cursor(started_at: datetime.datetime, record_id: int) -> str:
+    raw = f"{started_at.isoformat()}|{record_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
     try:
-        simulations = db.query(SimulationRecordModel).all()
-        print(f"Retrieved {len(simulations)} simulation records from the database.")
-        return simulations
+        started_at, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(started_at), int(record_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _naive_utc(value: datetime.datetime) -> datetime.datetime:
+    # Records store naive UTC timestamps; accept offset-aware query parameters too.
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+def _parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    if fields is None:
+        return SIMULATION_RECORD_FIELDS
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(SIMULATION_RECORD_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    # id and started_at make up the cursor, so they are always returned.
+    requested.update(("id", "started_at"))
+    return tuple(name for name in SIMULATION_RECORD_FIELDS if name in requested)
+
+@router.get(
+    "/",
+    response_model=SimulationRecordPage,
+    response_model_exclude_unset=True,
+    tags=["Simulations"],
+)
+async def get_simulations(
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of records to return"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    status: Optional[str] = Query(None, description="Only records with this status"),
+    sweep_id: Optional[int] = Query(None, description="Only records of this parameter sweep"),
+    started_after: Optional[datetime.datetime] = Query(None, description="Only records started at or after this time"),
+    started_before: Optional[datetime.datetime] = Query(None, description="Only records started before this time"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return (default: all)"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Newest first, paginated by keyset on (started_at, id) so every page is an
+    # index range scan regardless of how much history there is.
+    columns = _parse_fields(fields)
+    query = select(*(getattr(SimulationRecordModel, name) for name in columns))
+    if status is not None:
+        query = query.where(SimulationRecordModel.status == status)
+    if sweep_id is not None:
+        query = query.where(SimulationRecordModel.sweep_id == sweep_id)
+    if started_after is not None:
+        query = query.where(SimulationRecordModel.started_at >= _naive_utc(started_after))
+    if started_before is not None:
+        query = query.where(SimulationRecordModel.started_at < _naive_utc(started_before))
+    if cursor is not None:
+        query = query.where(
+            tuple_(SimulationRecordModel.started_at, SimulationRecordModel.id) < _decode_cursor(cursor)
+        )
+    query = query.order_by(
+        SimulationRecordModel.started_at.desc(), SimulationRecordModel.id.desc()
+    ).limit(limit + 1)
+
+    try:
+        rows = (await db.execute(query)).mappings().all()
     except Exception as e:
         print("Error retrieving simulations:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = _encode_cursor(last["started_at"], last["id"])
+    return SimulationRecordPage(items=[dict(row) for row in rows[:limit]], next_cursor=next_cursor)
+
+def _job_response(job) -> SimulationJobResponse:
+    return SimulationJobResponse(
+        job_id=job.id,
+        status=job.status,
+        last_event_id=job.last_event_id,
+        error=job.error,
+    )
+
+def _event_stream(job, last_event_id: int) -> StreamingResponse:
+    return StreamingResponse(
+        job.subscribe(last_event_id, settings.SIMULATION_SSE_KEEPALIVE_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Simulation-Job-Id": str(job.id)},
+    )
+
+@router.post("/jobs", response_model=SimulationJobResponse, status_code=202, tags=["Simulations"])
+def submit_simulation_job(request: SimulationStartRequest):
+    try:
+        job = job_manager.submit(
+            num_rounds=request.num_rounds,
+            num_clients=request.num_clients,
+            fraction_fit=request.fraction_fit,
+            dirichlet_alpha=request.dirichlet_alpha,
+            verbosity=request.verbosity,
+            flush_interval_ms=request.flush_interval_ms,
+            aggregation=request.aggregation,
+            async_buffer_size=request.async_buffer_size,
+            seed=request.seed,
+        )
+    except Exception as e:
+        print("Error submitting simulation job:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    return _job_response(job)
+
+@router.get("/jobs/{job_id}", response_model=SimulationJobResponse, tags=["Simulations"])
+async def get_simulation_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    job = job_manager.get(job_id)
+    if job is not None:
+        return _job_response(job)
+    # Jobs from earlier processes (or evicted ones) are only known through their record.
+    record = await db.get(SimulationRecordModel, job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Simulation job {job_id} not found")
+    return SimulationJobResponse(job_id=record.id, status=record.status)
+
+@router.delete("/jobs/{job_id}", response_model=SimulationJobResponse, tags=["Simulations"])
+def cancel_simulation_job(job_id: int):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Simulation job {job_id} is not running")
+    return _job_response(job)
+
+@router.post("/jobs/{job_id}/resume", response_model=SimulationJobResponse, status_code=202, tags=["Simulations"])
+def resume_simulation_job(
+    job_id: int,
+    verbosity: Literal["summary", "clients"] = Query("clients", description="'summary' omits per-client events"),
+    flush_interval_ms: int = Query(0, ge=0, description="Coalesce events into at most one batch per interval (0: one per round)"),
+):
+    # Continue an interrupted (failed, cancelled or crashed) run from its latest checkpoint.
+    try:
+        job = job_manager.resume(job_id, verbosity=verbosity, flush_interval_ms=flush_interval_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Simulation {job_id} has no checkpoint to resume from")
+    return _job_response(job)
+
+@router.get("/jobs/{job_id}/events", tags=["Simulations"])
+def stream_simulation_job(
+    job_id: int,
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+    after: Optional[int] = Query(None, description="Resume after this event id (alternative to the Last-Event-ID header)"),
+):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Simulation job {job_id} not found")
+    return _event_stream(job, last_event_id if last_event_id is not None else (after or 0))
+
 # SSE endpoint for streaming simulation logs
 @router.get("/stream", tags=["Simulations"])
 def start_simulation_stream(
-    num_rounds: int = Query(..., description="Number of rounds"),
-    num_clients: int = Query(..., description="Number of clients"),
-    fraction_fit: float = Query(..., description="Fraction of clients to train"),
-    db: Session = Depends(get_db)
+    num_rounds: int = Query(..., ge=1, description="Number of rounds"),
+    num_clients: int = Query(..., ge=1, description="Number of clients"),
+    fraction_fit: float = Query(..., gt=0, le=1, description="Fraction of clients to train"),
+    dirichlet_alpha: Optional[float] = Query(None, gt=0, description="Dirichlet alpha for non-IID client shards (omit for IID)"),
+    verbosity: Literal["summary", "clients"] = Query("clients", description="'summary' omits per-client events"),
+    flush_interval_ms: int = Query(0, ge=0, description="Coalesce events into at most one batch per interval (0: one per round)"),
+    aggregation: Literal["sync", "async"] = Query("sync", description="'async' applies buffered, staleness-weighted updates"),
+    async_buffer_size: Optional[int] = Query(None, ge=1, description="Updates per buffer application in async mode"),
+    seed: Optional[int] = Query(None, description="Seed of the run (default: settings.SIMULATION_SEED)"),
 ):
-    # Instantiate a proper PyTorch model for simulation
-    global_model = MNISTModel()
+    # Submit the simulation as a background job and follow its events; closing
+    # this stream detaches from the job without stopping it.
     try:
-        log_generator = run_simulation_stream(
-            db=db,
+        job = job_manager.submit(
             num_rounds=num_rounds,
             num_clients=num_clients,
             fraction_fit=fraction_fit,
-            global_model=global_model
+            dirichlet_alpha=dirichlet_alpha,
+            verbosity=verbosity,
+            flush_interval_ms=flush_interval_ms,
+            aggregation=aggregation,
+            async_buffer_size=async_buffer_size,
+            seed=seed,
         )
     except Exception as e:
         print("Error during simulation execution:", e)
         raise HTTPException(status_code=500, detail=str(e))
     
-    return StreamingResponse(log_generator, media_type="text/event-stream")
+    return _event_stream(job, 0)
+
+@router.post("/sweeps", response_model=SweepResponse, status_code=202, tags=["Simulations"])
+def submit_sweep(request: SweepRequest):
+    # Run a grid and/or a list of configurations as one sweep; poll
+    # GET /sweeps/{sweep_id} for the ranked results.
+    configurations = [configuration.dict() for configuration in request.configurations]
+    if request.grid is not None:
+        try:
+            configurations += [
+                SweepConfiguration(**combination).dict() for combination in expand_grid(request.grid.dict())
+            ]
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors())
+    if len(configurations) > settings.SWEEP_MAX_CONFIGURATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A sweep can run at most {settings.SWEEP_MAX_CONFIGURATIONS} configurations, got {len(configurations)}",
+        )
+    try:
+        sweep_id = sweep_manager.submit(
+            configurations,
+            successive_halving=request.successive_halving,
+            eta=request.eta,
+            min_rounds=request.min_rounds,
+            seed=request.seed,
+        )
+    except Exception as e:
+        print("Error submitting sweep:", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    return SweepResponse(
+        sweep_id=sweep_id,
+        status="Queued",
+        num_configurations=len(configurations),
+        created_at=datetime.datetime.utcnow(),
+    )
+
+@router.get("/sweeps/{sweep_id}", response_model=SweepResponse, tags=["Simulations"])
+async def get_sweep(sweep_id: int, db: AsyncSession = Depends(get_async_db)):
+    sweep = await db.get(SimulationSweep, sweep_id)
+    if sweep is None:
+        raise HTTPException(status_code=404, detail=f"Sweep {sweep_id} not found")
+    records = (await db.execute(
+        select(SimulationRecordModel)
+        .where(SimulationRecordModel.sweep_id == sweep_id)
+        .order_by(
+            SimulationRecordModel.test_loss.is_(None),
+            SimulationRecordModel.test_loss,
+            SimulationRecordModel.id,
+        )
+    )).scalars().all()
+    return SweepResponse(
+        sweep_id=sweep.id,
+        status=sweep.status,
+        num_configurations=sweep.num_configurations,
+        created_at=sweep.created_at,
+        finished_at=sweep.finished_at,
+        simulations=records,
+    )
+
+@router.delete("/sweeps/{sweep_id}", response_model=SweepResponse, tags=["Simulations"])
+async def cancel_sweep(sweep_id: int, db: AsyncSession = Depends(get_async_db)):
+    # Running configurations stop after their current round; queued ones never start.
+    if not sweep_manager.cancel(sweep_id):
+        raise HTTPException(status_code=404, detail=f"Sweep {sweep_id} is not running")
+    return await get_sweep(sweep_id, db)
+
+@router.get("/{simulation_id}/metrics", response_model=RoundMetricSeries, tags=["Simulations"])
+async def get_round_metrics(
+    simulation_id: int,
+    metric: Literal["loss", "test_loss", "test_accuracy", "duration_s", "num_samples"] = Query(
+        "loss", description="Column to chart; 'loss' is the average client loss for the round-level series"
+    ),
+    client: Optional[int] = Query(None, ge=0, description="A client's series instead of the round-level one"),
+    points: int = Query(500, ge=3, le=10000, description="Maximum number of points to return"),
+    method: Literal["lttb", "minmax"] = Query("lttb", description="'lttb' keeps the curve's shape, 'minmax' every bucket's extremes"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Downsampled on the server, so the response size is bounded by `points`
+    # however many rounds the run had.
+    if await db.get(SimulationRecordModel, simulation_id) is None:
+        raise HTTPException(status_code=404, detail=f"Simulation {simulation_id} not found")
+    column = getattr(RoundMetric, metric)
+    rows = (await db.execute(
+        select(RoundMetric.round, column)
+        .where(
+            RoundMetric.simulation_id == simulation_id,
+            RoundMetric.client == (GLOBAL_CLIENT if client is None else client),
+            column.is_not(None),
+        )
+        .order_by(RoundMetric.round)
+    )).all()
+    rounds = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    values = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    rounds, values = downsample(rounds, values, points, method)
+    return RoundMetricSeries(
+        simulation_id=simulation_id,
+        metric=metric,
+        client=client,
+        method=method,
+        total_points=len(rows),
+        rounds=rounds.tolist(),
+        values=values.tolist(),
+    )
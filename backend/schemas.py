@@ -1,6 +1,6 @@
 # backend/schemas.py
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, validator
+from typing import Optional, List, Literal
 from datetime import datetime
 
 class SimulationRecord(BaseModel):
@@ -11,16 +11,117 @@ class SimulationRecord(BaseModel):
     started_at: datetime
     finished_at: Optional[datetime] = None
     status: str
+    sweep_id: Optional[int] = None
+    rounds_completed: Optional[int] = None
+    test_loss: Optional[float] = None
+    test_accuracy: Optional[float] = None
 
     class Config:
         orm_mode = True
 
+# Columns that can be requested through the `fields` projection of the history
+# listing; id and started_at are always included since they form the cursor.
+SIMULATION_RECORD_FIELDS = (
+    "id", "num_rounds", "num_clients", "fraction_fit", "started_at", "finished_at", "status",
+    "sweep_id", "rounds_completed", "test_loss", "test_accuracy",
+)
+
+class SimulationRecordProjection(BaseModel):
+    """A SimulationRecord restricted to the requested fields."""
+    id: int
+    started_at: datetime
+    num_rounds: Optional[int]
+    num_clients: Optional[int]
+    fraction_fit: Optional[float]
+    finished_at: Optional[datetime]
+    status: Optional[str]
+    sweep_id: Optional[int]
+    rounds_completed: Optional[int]
+    test_loss: Optional[float]
+    test_accuracy: Optional[float]
+
+class SimulationRecordPage(BaseModel):
+    items: List[SimulationRecordProjection]
+    # Pass as `cursor` to fetch the next (older) page; null on the last page.
+    next_cursor: Optional[str] = None
+
 class SimulationStartRequest(BaseModel):
-    num_rounds: int
-    num_clients: int
-    fraction_fit: float
+    num_rounds: int = Field(..., ge=1)
+    num_clients: int = Field(..., ge=1)
+    fraction_fit: float = Field(..., gt=0, le=1)
+    dirichlet_alpha: Optional[float] = Field(None, gt=0)
+    # Event stream shape: "summary" drops per-client events; batches are sent
+    # once per round, or at most once per flush_interval_ms when it is set.
+    verbosity: Literal["summary", "clients"] = "clients"
+    flush_interval_ms: int = Field(0, ge=0)
+    # "async" applies buffered, staleness-weighted updates without waiting for
+    # a full round; async_buffer_size defaults to settings.ASYNC_BUFFER_SIZE.
+    aggregation: Literal["sync", "async"] = "sync"
+    async_buffer_size: Optional[int] = Field(None, ge=1)
+    # Seeds model init, partition, sampling and shuffling; defaults to
+    # settings.SIMULATION_SEED. Seeded runs are served from the result cache.
+    seed: Optional[int] = None
 
 class SimulationStartResponse(BaseModel):
     message: str
     parameters: dict
     logs: List[str]
+
+class SimulationJobResponse(BaseModel):
+    job_id: int
+    status: str
+    last_event_id: int = 0
+    error: Optional[str] = None
+
+class SweepConfiguration(BaseModel):
+    num_rounds: int = Field(..., ge=1)
+    num_clients: int = Field(..., ge=1)
+    fraction_fit: float = Field(..., gt=0, le=1)
+    dirichlet_alpha: Optional[float] = Field(None, gt=0)
+
+class SweepGrid(BaseModel):
+    """Values to combine; the sweep runs every combination."""
+    num_rounds: List[int] = Field(..., min_items=1)
+    num_clients: List[int] = Field(..., min_items=1)
+    fraction_fit: List[float] = Field(..., min_items=1)
+    # None stands for an IID split.
+    dirichlet_alpha: List[Optional[float]] = [None]
+
+class SweepRequest(BaseModel):
+    # The grid's combinations and the listed configurations are all run.
+    grid: Optional[SweepGrid] = None
+    configurations: List[SweepConfiguration] = []
+    # Stop runs that are not among the best 1/eta by test loss at rounds
+    # min_rounds * eta^k (asynchronous successive halving).
+    successive_halving: bool = True
+    eta: int = Field(3, ge=2)
+    min_rounds: int = Field(1, ge=1)
+    # Seed of the client partition shared by every configuration (default: random).
+    seed: Optional[int] = None
+
+    @validator("configurations", always=True)
+    def grid_or_configurations(cls, configurations, values):
+        if not configurations and values.get("grid") is None:
+            raise ValueError("a sweep needs a grid or a list of configurations")
+        return configurations
+
+class SweepResponse(BaseModel):
+    sweep_id: int
+    status: str
+    num_configurations: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    # Ranked by test loss; runs without a result come last.
+    simulations: List[SimulationRecord] = []
+
+class RoundMetricSeries(BaseModel):
+    """One per-round metric of a simulation, downsampled to at most `points` points."""
+    simulation_id: int
+    metric: str
+    # Null for the round-level series (average client loss, test scores).
+    client: Optional[int] = None
+    method: str
+    # Points in the full series, before downsampling.
+    total_points: int
+    rounds: List[int]
+    values: List[float]
@@ -3,12 +3,8 @@ from sqlalchemy.orm import Session
 from database import engine, SessionLocal
 from models import SimulationRecord
 from sqlalchemy.exc import SQLAlchemyError
-
-def create_tables():
-    # Create tables if they do not exist yet.
-    # Note: In production, use Alembic for migrations.
-    from models import Base
-    Base.metadata.create_all(bind=engine)
+# Note: In production, use Alembic for migrations.
+from create_tables import create_tables
 
 def seed_simulations(db: Session):
     # Create dummy simulation records.
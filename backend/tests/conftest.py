@@ -0,0 +1,39 @@
+# backend/tests/conftest.py
+
+import os
+import sys
+import tempfile
+import pytest
+
+# The backend imports its modules from the backend directory (`from utils...`),
+# and `config.Settings` needs a DATABASE_URL. A file rather than an in-memory
+# database, so the threads of the job manager all see the same one.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+
+@pytest.fixture
+def database():
+    """The app's database engine, with freshly created (empty) tables."""
+    from database import engine
+    from models import Base
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+
+@pytest.fixture
+def synthetic_mnist(tmp_path, monkeypatch):
+    """Run from a directory whose ./data holds small synthetic train and test caches."""
+    from benchmarks.synthetic import write_synthetic_cache
+    from utils.evaluation import load_test_set
+    from utils.simulation_manager import load_mnist_train_set
+
+    write_synthetic_cache(str(tmp_path / "data"), num_samples=600, seed=0)
+    write_synthetic_cache(str(tmp_path / "data"), num_samples=200, seed=1, train=False)
+    monkeypatch.chdir(tmp_path)
+    # Both are loaded once per process from ./data.
+    load_mnist_train_set.cache_clear()
+    load_test_set.cache_clear()
+    yield tmp_path
+    load_mnist_train_set.cache_clear()
+    load_test_set.cache_clear()
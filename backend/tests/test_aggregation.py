@@ -0,0 +1,58 @@
+# backend/tests/test_aggregation.py
+
+import torch
+from torch import nn
+from utils.aggregation import StreamingAggregator, aggregate_updates
+from utils.flat_state import FlatStateLayout
+
+def _client_states(global_state: dict, num_clients: int) -> list:
+    generator = torch.Generator().manual_seed(0)
+    return [
+        {key: value + torch.randn(value.shape, generator=generator) for key, value in global_state.items()}
+        for _ in range(num_clients)
+    ]
+
+def test_streaming_aggregator_matches_weighted_mean():
+    torch.manual_seed(0)
+    global_state = nn.Sequential(nn.Linear(5, 4), nn.Linear(4, 2)).state_dict()
+    layout = FlatStateLayout(global_state)
+    global_flat = layout.flatten(global_state)
+    client_states = _client_states(global_state, 4)
+    weights = [3.0, 1.0, 7.0, 2.0]
+
+    deltas = [{key: state[key] - global_state[key] for key in state} for state in client_states]
+    expected = aggregate_updates(deltas, weights)
+
+    streamed = global_flat.clone()
+    aggregator = StreamingAggregator(layout)
+    for state, weight in zip(client_states, weights):
+        aggregator.add_state_delta(state, global_flat, weight=weight)
+    aggregator.apply_to(streamed)
+    result = layout.unflatten(streamed)
+    for key, value in global_state.items():
+        torch.testing.assert_close(result[key], value + expected[key])
+    assert aggregator.total_weight == 0.0 and not aggregator.total.any()
+
+def test_flat_updates_and_merged_partial_sums_agree():
+    torch.manual_seed(0)
+    layout = FlatStateLayout(nn.Linear(6, 3).state_dict())
+    updates = [torch.randn(layout.numel) for _ in range(5)]
+    weights = [1.0, 2.0, 3.0, 4.0, 5.0]
+    expected = sum(w * u for w, u in zip(weights, updates)) / sum(weights)
+
+    direct = StreamingAggregator(layout)
+    for update, weight in zip(updates, weights):
+        direct.add(update, weight=weight)
+    # A worker's partial sum over some of the clients, merged in afterwards.
+    partial = StreamingAggregator(layout)
+    merged = StreamingAggregator(layout)
+    for update, weight in zip(updates[:2], weights[:2]):
+        partial.add(update, weight=weight)
+    for update, weight in zip(updates[2:], weights[2:]):
+        merged.add(update, weight=weight)
+    merged.merge(partial.total, partial.total_weight)
+
+    for aggregator in (direct, merged):
+        result = torch.zeros(layout.numel)
+        aggregator.apply_to(result)
+        torch.testing.assert_close(result, expected)
@@ -0,0 +1,118 @@
+# backend/tests/test_async_aggregation.py
+
+import copy
+import functools
+import multiprocessing
+import threading
+import types
+import torch
+from torch import nn
+from torch.utils.data import DataLoader, TensorDataset
+from config import settings
+from nn_models import MNISTModel
+from utils import client_training
+from utils.aggregation import staleness_weight
+from utils.client_training import ClientProcessPool, train_client_epoch
+from utils.flat_state import FlatStateLayout
+from utils.simulation_manager import run_simulation_events
+
+class _StaleLoader:
+    """A client's data that, when iterated, bumps the global version as if the
+    server applied `applies` buffers while the client trained."""
+
+    def __init__(self, loader: DataLoader, applies: int) -> None:
+        self.loader = loader
+        self.applies = applies
+
+    def __iter__(self):
+        client_training._worker_state["shared_version"] += self.applies
+        return iter(self.loader)
+
+def _loader(num_samples: int, seed: int) -> DataLoader:
+    generator = torch.Generator().manual_seed(seed)
+    inputs = torch.randn(num_samples, 4, generator=generator)
+    targets = torch.randint(0, 2, (num_samples,), generator=generator)
+    return DataLoader(TensorDataset(inputs, targets), batch_size=4, shuffle=False)
+
+def test_staleness_weight():
+    assert staleness_weight(0) == 1.0
+    assert staleness_weight(3) == 0.5
+
+def test_stale_updates_are_discounted_in_the_buffer():
+    torch.manual_seed(0)
+    model = nn.Linear(4, 2)
+    layout = FlatStateLayout(model.state_dict())
+    optimizer_fn = functools.partial(torch.optim.SGD, lr=0.1)
+    loaders = [_loader(8, 0), _loader(12, 1)]
+    global_flat = layout.flatten(model.state_dict())
+
+    # Each client's plain update, trained from the same global weights.
+    expected_updates = []
+    for loader in loaders:
+        client_model = copy.deepcopy(model)
+        train_client_epoch(client_model, loader, nn.CrossEntropyLoss(), optimizer_fn(client_model.parameters()))
+        expected_updates.append(layout.flatten(client_model.state_dict()) - global_flat)
+
+    server = types.SimpleNamespace(
+        _lock=threading.Lock(),
+        layout=layout,
+        shared_global=global_flat.clone(),
+        shared_version=torch.zeros(1, dtype=torch.int64),
+        shared_buffer=torch.zeros(layout.numel),
+        shared_buffer_totals=torch.zeros(2, dtype=torch.float64),
+    )
+    num_threads = torch.get_num_threads()
+    try:
+        # Run the worker side in this process: client 1 comes back three versions late.
+        client_training._init_worker(
+            model, layout, server.shared_global, torch.zeros(1, layout.numel), torch.zeros(1, dtype=torch.float64),
+            multiprocessing.Value("i", 0), [loaders[0], _StaleLoader(loaders[1], 3)], nn.CrossEntropyLoss(),
+            optimizer_fn, "cpu", num_threads, None, server._lock, server.shared_version,
+            server.shared_buffer, server.shared_buffer_totals, None,
+        )
+        first = client_training._train_client_async_task(0)
+        second = client_training._train_client_async_task(1)
+    finally:
+        client_training._worker_state.clear()
+        torch.set_num_threads(num_threads)
+
+    # (client, samples, staleness, version of the buffer the update went into)
+    assert (first[0], first[2], first[4], first[6]) == (0, 8, 0, 0)
+    assert (second[0], second[2], second[4], second[6]) == (1, 12, 3, 3)
+    torch.testing.assert_close(server.shared_buffer, 8 * expected_updates[0] + 12 * 0.5 * expected_updates[1])
+
+    # The buffer is divided by the total samples (not the discounted weights),
+    # so a stale update counts for less than a fresh one of the same size.
+    assert ClientProcessPool.apply_buffer(server, server_lr=2.0) == 2
+    torch.testing.assert_close(
+        server.shared_global,
+        global_flat + 2.0 * (8 * expected_updates[0] + 6 * expected_updates[1]) / 20,
+    )
+    assert int(server.shared_version) == 4
+    assert not server.shared_buffer.any() and not server.shared_buffer_totals.any()
+
+def test_async_rounds_report_the_updates_their_buffer_applied(synthetic_mnist, database, monkeypatch):
+    from database import SessionLocal
+
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "TRAINING_NUM_WORKERS", 2)
+    with SessionLocal() as db:
+        events = list(run_simulation_events(
+            db, 3, 4, 1.0, MNISTModel(), partition_seed=0, aggregation="async", async_buffer_size=2,
+        ))
+
+    summaries = [event for event in events if event["type"] == "round_summary"]
+    assert [summary["round"] for summary in summaries] == [1, 2, 3]
+    previous = -1
+    for summary in summaries:
+        index = events.index(summary)
+        # Every result a round reports comes after the previous round's summary.
+        results = [event for event in events[previous + 1:index] if event["type"] == "client_result"]
+        assert all(result["round"] == summary["round"] for result in results)
+        assert summary["num_clients"] == len(results) >= 2
+        assert summary["num_samples"] == sum(result["num_samples"] for result in results)
+        assert sum(summary["staleness_counts"]) == len(results)
+        previous = index
+    applied = next(event["message"] for event in events if event.get("message", "").startswith("Applied"))
+    assert applied.startswith(f"Applied {sum(summary['num_clients'] for summary in summaries)} updates")
+    assert events[-1]["type"] == "done" and events[-1]["status"] == "Completed"
@@ -0,0 +1,79 @@
+# backend/tests/test_checkpoint.py
+
+import functools
+import os
+import random
+import torch
+from torch import nn
+from torch.utils.data import DataLoader, TensorDataset
+from utils.checkpoint import SimulationCheckpointer, load_checkpoint
+from utils.contribution import ContributionScorer
+from utils.evaluation import Evaluator
+from utils.flat_state import FlatStateLayout
+from utils.training_loop import training_loop_stream
+
+def test_delta_checkpoints_rebuild_the_full_weights(tmp_path):
+    torch.manual_seed(0)
+    layout = FlatStateLayout(nn.Sequential(nn.Linear(6, 5), nn.Linear(5, 2)).state_dict())
+    checkpointer = SimulationCheckpointer(str(tmp_path), simulation_id=1, keep_last=0, full_every=3)
+    weights = torch.randn(layout.numel)
+    saved = {}
+    kinds = []
+    for round_num in range(1, 6):
+        # Only the first entry changes, so the deltas skip the others.
+        _, _, _, offset, numel = layout.entries[0]
+        weights[offset:offset + numel] += torch.randn(numel) * 1e-3
+        saved[round_num] = weights.clone()
+        kind, _ = checkpointer.save(round_num, layout, weights, random.Random(round_num))
+        kinds.append(kind)
+    assert kinds == ["full", "delta", "delta", "full", "delta"]
+
+    for round_num, expected in saved.items():
+        checkpoint = load_checkpoint(str(tmp_path), 1, round_num)
+        # Bit-exact: the XOR deltas are lossless.
+        assert torch.equal(checkpoint.weights, expected)
+        assert checkpoint.keys == layout.keys()
+        assert checkpoint.rng_state == random.Random(round_num).getstate()
+    assert checkpointer.latest().round == 5
+
+    # The latest checkpoint is a delta, so the full one it builds on is kept too.
+    checkpointer.keep_last = 1
+    checkpointer._prune()
+    assert sorted(os.listdir(tmp_path / "1")) == ["round-000004", "round-000005"]
+    assert torch.equal(checkpointer.latest().weights, saved[5])
+
+def _resumable_run(checkpoint_root, num_rounds, resume_from=None, stop_after=None):
+    torch.manual_seed(0)
+    model = nn.Sequential(nn.Flatten(), nn.Linear(8, 3))
+    generator = torch.Generator().manual_seed(1)
+    loaders = []
+    for _ in range(3):
+        inputs, targets = torch.randn(12, 8, generator=generator), torch.randint(0, 3, (12,), generator=generator)
+        loaders.append(DataLoader(TensorDataset(inputs, targets), batch_size=4, shuffle=False))
+    evaluator = Evaluator(torch.randn(40, 8, generator=generator), torch.randint(0, 3, (40,), generator=generator))
+    contribution = ContributionScorer(Evaluator(evaluator.images, evaluator.targets), num_permutations=3, seed=0)
+    events = training_loop_stream(
+        model, num_rounds, loaders, nn.CrossEntropyLoss(), functools.partial(torch.optim.SGD, lr=0.1),
+        num_clients=3, seed=0, evaluator=evaluator, contribution=contribution, resume_from=resume_from,
+        checkpointer=SimulationCheckpointer(checkpoint_root, simulation_id=1, keep_last=0),
+    )
+    for event in events:
+        if event["type"] == "round_summary" and event["round"] == stop_after:
+            # The round's checkpoint is written right after its summary.
+            next(events)
+            events.close()
+            break
+    return evaluator, contribution
+
+def test_resumed_run_keeps_the_initial_evaluation_and_contributions(tmp_path):
+    evaluator, contribution = _resumable_run(str(tmp_path / "full"), 4)
+    _resumable_run(str(tmp_path / "resumed"), 4, stop_after=2)
+    checkpoint = load_checkpoint(str(tmp_path / "resumed"), 1)
+    assert checkpoint.round == 2
+    resumed_evaluator, resumed_contribution = _resumable_run(str(tmp_path / "resumed"), 4, resume_from=checkpoint)
+
+    # The reward baseline is still the score before round 1, not the one at the resume point.
+    assert resumed_evaluator.history[0] == evaluator.history[0]
+    assert resumed_evaluator.history[-1] == evaluator.history[-1]
+    assert resumed_contribution.rounds_scored == contribution.rounds_scored == 4
+    assert resumed_contribution.totals == contribution.totals
@@ -0,0 +1,43 @@
+# backend/tests/test_client_replicas.py
+
+import copy
+import functools
+import pytest
+import torch
+from torch import nn
+from utils.client_training import ClientReplicaPool, train_client_epoch
+from utils.flat_state import FlatStateLayout
+
+def _batches(seed: int) -> list:
+    generator = torch.Generator().manual_seed(seed)
+    return [(torch.randn(4, 6, generator=generator), torch.randint(0, 3, (4,), generator=generator)) for _ in range(3)]
+
+@pytest.mark.parametrize("optimizer_fn", [
+    functools.partial(torch.optim.Adam, lr=0.01),
+    functools.partial(torch.optim.SGD, lr=0.1, momentum=0.9),
+])
+def test_reset_replica_trains_like_a_fresh_model(optimizer_fn):
+    torch.manual_seed(0)
+    # BatchNorm has buffers (running statistics) that training also changes.
+    global_model = nn.Sequential(nn.Linear(6, 5), nn.BatchNorm1d(5), nn.ReLU(), nn.Linear(5, 3))
+    layout = FlatStateLayout(global_model.state_dict())
+    global_flat = layout.flatten(global_model.state_dict())
+    pool = ClientReplicaPool(global_model, optimizer_fn, layout)
+    criterion = nn.CrossEntropyLoss()
+
+    # Dirty the replica, its optimizer state and its buffers with another client's round.
+    with pool.replica(0, global_flat) as (replica, optimizer):
+        train_client_epoch(replica, _batches(0), criterion, optimizer)
+
+    fresh = copy.deepcopy(global_model)
+    fresh_loss, _ = train_client_epoch(fresh, _batches(1), criterion, optimizer_fn(fresh.parameters()))
+    with pool.replica(1, global_flat) as (replica, optimizer):
+        # The optimizer's state is a new one's: dropped, or zeroed in place.
+        for state in optimizer.state.values():
+            assert not any(value.any() for value in state.values())
+        for key, value in global_model.state_dict().items():
+            assert torch.equal(replica.state_dict()[key], value), key
+        loss, _ = train_client_epoch(replica, _batches(1), criterion, optimizer)
+        assert loss == fresh_loss
+        for key, value in fresh.state_dict().items():
+            assert torch.equal(replica.state_dict()[key], value), key
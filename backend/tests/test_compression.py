@@ -0,0 +1,86 @@
+# backend/tests/test_compression.py
+
+import pytest
+import torch
+from utils.compression import LosslessCodec, QuantizationCodec, TopKCodec, make_codec
+
+def _update(numel: int = 3001, seed: int = 0) -> torch.Tensor:
+    return torch.randn(numel, generator=torch.Generator().manual_seed(seed))
+
+def test_lossless_round_trip_is_exact():
+    codec = LosslessCodec()
+    update = _update()
+    torch.testing.assert_close(codec.decode(codec.encode(update, client=0)), update, rtol=0, atol=0)
+
+@pytest.mark.parametrize("bits", [8, 4])
+def test_quantization_round_trip_is_within_one_level(bits):
+    # An odd length that is not a multiple of the chunk size exercises the
+    # padding and the 4-bit nibble packing.
+    codec = QuantizationCodec(bits=bits, chunk_size=256, seed=0)
+    update = _update()
+    encoded = codec.encode(update, client=0)
+    decoded = codec.decode(encoded)
+    assert decoded.shape == update.shape
+    num_chunks = -(-update.numel() // 256)
+    assert encoded.nbytes == -(-update.numel() * bits // 8) + 4 * num_chunks
+    scales = encoded.tensors["scales"].repeat_interleave(256)[:update.numel()]
+    assert bool(((decoded - update).abs() <= scales * (1 + 1e-5)).all())
+
+def test_quantization_is_unbiased():
+    codec = QuantizationCodec(bits=4, chunk_size=64, seed=0)
+    update = _update(640)
+    mean = torch.stack([codec.decode(codec.encode(update, client=0)) for _ in range(2000)]).mean(dim=0)
+    torch.testing.assert_close(mean, update, rtol=0, atol=0.02)
+
+def test_quantization_noise_is_seeded_per_client():
+    update = _update()
+    first, second = QuantizationCodec(seed=7), QuantizationCodec(seed=7)
+    # The same client gets the same draws whatever other clients were encoded before it.
+    first.encode(update, client=1)
+    same = first.encode(update, client=0).tensors["values"]
+    torch.testing.assert_close(second.encode(update, client=0).tensors["values"], same, rtol=0, atol=0)
+    # Different clients get different draws.
+    other = second.encode(update, client=2).tensors["values"]
+    assert not torch.equal(other, QuantizationCodec(seed=7).encode(update, client=3).tensors["values"])
+
+def test_quantization_state_dict_restores_the_draws():
+    codec = QuantizationCodec(seed=3)
+    update = _update()
+    codec.encode(update, client=0)
+    restored = QuantizationCodec(seed=3)
+    restored.load_state_dict(codec.state_dict())
+    torch.testing.assert_close(
+        restored.encode(update, client=0).tensors["values"], codec.encode(update, client=0).tensors["values"],
+        rtol=0, atol=0,
+    )
+
+def test_topk_keeps_the_largest_values():
+    codec = TopKCodec(fraction=0.01, error_feedback=False)
+    update = _update()
+    encoded = codec.encode(update, client=0)
+    decoded = codec.decode(encoded)
+    k = int(0.01 * update.numel())
+    assert not encoded.dense and int((decoded != 0).sum()) == k
+    kept = update.abs().topk(k).indices
+    torch.testing.assert_close(decoded[kept], update[kept], rtol=0, atol=0)
+
+def test_topk_falls_back_to_dense():
+    codec = TopKCodec(fraction=0.6)
+    update = _update()
+    encoded = codec.encode(update, client=0)
+    assert encoded.dense
+    torch.testing.assert_close(codec.decode(encoded), update, rtol=0, atol=0)
+
+def test_topk_error_feedback_carries_the_residual():
+    codec = TopKCodec(fraction=0.05, error_feedback=True)
+    updates = [_update(seed=seed) for seed in range(4)]
+    sent = torch.zeros_like(updates[0])
+    for update in updates:
+        sent += codec.decode(codec.encode(update, client=5))
+    # Nothing is lost: what was sent plus the residual still owed is what was produced.
+    torch.testing.assert_close(sent + codec.residuals[5], sum(updates), rtol=1e-5, atol=1e-5)
+    # Residuals are per client and survive a checkpoint.
+    assert list(codec.residuals) == [5]
+    restored = make_codec("topk", topk_fraction=0.05)
+    restored.load_state_dict(codec.state_dict())
+    torch.testing.assert_close(restored.residuals[5], codec.residuals[5], rtol=0, atol=0)
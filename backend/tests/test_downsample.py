@@ -0,0 +1,48 @@
+# backend/tests/test_downsample.py
+
+import numpy as np
+import pytest
+from utils.downsample import downsample, lttb, minmax
+
+def _series(n: int = 1000):
+    rng = np.random.default_rng(0)
+    x = np.arange(n, dtype=np.float64)
+    y = np.cumsum(rng.standard_normal(n))
+    return x, y
+
+@pytest.mark.parametrize("num_points", [3, 10, 101, 500])
+def test_lttb_keeps_the_endpoints_and_the_point_count(num_points):
+    x, y = _series()
+    kept = lttb(x, y, num_points)
+    assert len(kept) == num_points
+    assert kept[0] == 0 and kept[-1] == len(x) - 1
+    assert np.all(np.diff(kept) > 0)
+
+@pytest.mark.parametrize("num_points", [3, 10, 101, 500, 998])
+def test_minmax_keeps_the_endpoints_the_point_count_and_the_extremes(num_points):
+    x, y = _series()
+    kept = minmax(x, y, num_points)
+    # One fewer point when `num_points` is odd: each bucket keeps two.
+    assert len(kept) == num_points - num_points % 2
+    assert kept[0] == 0 and kept[-1] == len(x) - 1
+    assert np.all(np.diff(kept) > 0)
+    if num_points >= 4:
+        assert int(np.argmax(y)) in kept and int(np.argmin(y)) in kept
+
+def test_minmax_keeps_the_point_count_of_a_flat_series():
+    x, y = _series(50)
+    kept = minmax(x, np.zeros_like(y), 10)
+    assert len(kept) == 10 and np.all(np.diff(kept) > 0)
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_short_series_are_returned_whole(method):
+    x, y = _series(20)
+    kept_x, kept_y = downsample(x, y, 20, method)
+    assert np.array_equal(kept_x, x) and np.array_equal(kept_y, y)
+
+def test_downsample_rejects_bad_arguments():
+    x, y = _series(20)
+    with pytest.raises(ValueError):
+        downsample(x, y, 10, "mean")
+    with pytest.raises(ValueError):
+        downsample(x, y, 2)
@@ -0,0 +1,60 @@
+# backend/tests/test_round_metrics.py
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from models import Base, RoundMetric
+from utils.events import client_result_event
+from utils.round_metrics import GLOBAL_CLIENT, RoundMetricsWriter
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+def _summary(round_num: int, avg_loss: float) -> dict:
+    return {"type": "round_summary", "round": round_num, "avg_loss": avg_loss, "num_samples": 40, "duration_s": 0.5}
+
+def _rows(session_factory) -> dict:
+    with session_factory() as db:
+        return {(row.client, row.round): row for row in db.scalars(select(RoundMetric))}
+
+def test_repeated_client_results_are_merged(session_factory):
+    writer = RoundMetricsWriter(session_factory, simulation_id=1)
+    # The asynchronous engine can report a client twice before a buffer is applied.
+    writer.add(client_result_event(1, 0, 2.0, 10, {"test_loss": 1.0, "test_accuracy": 0.5}))
+    writer.add(client_result_event(1, 3, 1.0, 20))
+    writer.add(client_result_event(1, 0, 1.0, 30, {"test_loss": 3.0, "test_accuracy": 0.9}))
+    writer.add(_summary(1, 1.5))
+    assert writer.flush() == 3
+
+    rows = _rows(session_factory)
+    assert set(rows) == {(0, 1), (3, 1), (GLOBAL_CLIENT, 1)}
+    assert rows[(0, 1)].num_samples == 40
+    assert rows[(0, 1)].loss == pytest.approx((2.0 * 10 + 1.0 * 30) / 40)
+    assert rows[(0, 1)].test_loss == pytest.approx((1.0 * 10 + 3.0 * 30) / 40)
+    assert rows[(0, 1)].test_accuracy == pytest.approx((0.5 * 10 + 0.9 * 30) / 40)
+    assert rows[(3, 1)].test_loss is None
+
+@pytest.mark.parametrize("upsert", [True, False])
+def test_rewritten_rounds_replace_only_their_rows(session_factory, monkeypatch, upsert):
+    if not upsert:
+        # A dialect without an upsert deletes the rows it is about to write first.
+        monkeypatch.setattr(session_factory.kw["bind"].dialect, "name", "generic")
+    writer = RoundMetricsWriter(session_factory, simulation_id=1, flush_every_rounds=2)
+    for round_num in (1, 2):
+        writer.add(client_result_event(round_num, 0, 1.0 / round_num, 10))
+        writer.add(_summary(round_num, 1.0 / round_num))
+    # Resumed from a round 1 checkpoint: round 2 is run again.
+    resumed = RoundMetricsWriter(session_factory, simulation_id=1)
+    resumed.add(client_result_event(2, 1, 0.25, 10))
+    resumed.add(_summary(2, 0.25))
+    resumed.flush()
+
+    rows = _rows(session_factory)
+    assert set(rows) == {(0, 1), (0, 2), (1, 2), (GLOBAL_CLIENT, 1), (GLOBAL_CLIENT, 2)}
+    assert rows[(GLOBAL_CLIENT, 1)].loss == 1.0
+    assert rows[(GLOBAL_CLIENT, 2)].loss == 0.25
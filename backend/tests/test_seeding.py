@@ -0,0 +1,46 @@
+# backend/tests/test_seeding.py
+
+import pickle
+import torch
+from torch.utils.data import TensorDataset
+from nn_models import MNISTModel, reset_parameters
+from utils.data_partition import create_data_loaders, partition_dataset
+from utils.mnist_cache import TensorBatchLoader
+
+class _TensorImages:
+    """Stands in for `MNISTTensorDataset`: TensorBatchLoader only slices its tensors."""
+
+    def __init__(self, num_samples: int) -> None:
+        self.images = torch.arange(num_samples, dtype=torch.float32).reshape(-1, 1)
+        self.targets = torch.arange(num_samples)
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+def _seeded_run(seed: int):
+    generator = torch.Generator().manual_seed(seed)
+    model = reset_parameters(MNISTModel(), generator)
+    dataset = TensorDataset(torch.arange(40, dtype=torch.float32), torch.arange(40))
+    loaders = create_data_loaders(partition_dataset(dataset, 3, generator=generator), 4, generator=generator)
+    return model, [[targets.tolist() for _, targets in loader] for loader in loaders]
+
+def test_seeded_run_does_not_depend_on_the_global_rng():
+    torch.manual_seed(1)
+    model, batches = _seeded_run(7)
+    torch.manual_seed(2)
+    other_model, other_batches = _seeded_run(7)
+
+    assert batches == other_batches
+    for key, tensor in model.state_dict().items():
+        assert torch.equal(tensor, other_model.state_dict()[key])
+    _, different_batches = _seeded_run(8)
+    assert different_batches != batches
+
+def test_pickled_loader_continues_its_generator():
+    loader = TensorBatchLoader(_TensorImages(20), 5, generator=torch.Generator().manual_seed(3))
+    next(iter(loader))
+    copied = pickle.loads(pickle.dumps(loader))
+
+    assert copied.generator is not loader.generator
+    for _ in range(2):
+        assert [t.tolist() for _, t in copied] == [t.tolist() for _, t in loader]
@@ -0,0 +1,88 @@
+# backend/tests/test_simulation_jobs.py
+
+import json
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from config import settings
+from routes import simulations
+from utils.job_manager import FINAL_STATUSES, SimulationJob
+
+NUM_ROUNDS = 4
+CANCEL_AFTER_ROUND = 2
+
+@pytest.fixture
+def client(synthetic_mnist, database, monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "TRAINING_NUM_WORKERS", 0)
+    monkeypatch.setattr(settings, "CHECKPOINT_EVERY_ROUNDS", 1)
+    monkeypatch.setattr(settings, "CHECKPOINT_DIR", str(synthetic_mnist / "checkpoints"))
+    app = FastAPI()
+    app.include_router(simulations.router, prefix="/api/simulations")
+    return TestClient(app)
+
+def _wait(client, job_id: int) -> str:
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        status = client.get(f"/api/simulations/jobs/{job_id}").json()["status"]
+        if status in FINAL_STATUSES:
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+def _events(client, job_id: int) -> list:
+    body = client.get(f"/api/simulations/jobs/{job_id}/events").text
+    events = []
+    for line in body.splitlines():
+        if line.startswith("data: ") and line[6:].startswith("["):
+            events.extend(json.loads(line[6:]))
+    return events
+
+def _series(client, job_id: int, metric: str) -> dict:
+    series = client.get(f"/api/simulations/{job_id}/metrics", params={"metric": metric}).json()
+    return dict(zip(series["rounds"], series["values"]))
+
+def _rewards(events: list) -> dict:
+    return {event["user_id"]: event["reward"] for event in events if event["type"] == "reward"}
+
+@pytest.mark.parametrize("contribution_scoring", [False, True])
+def test_cancelled_job_resumes_like_an_uninterrupted_run(client, monkeypatch, contribution_scoring):
+    monkeypatch.setattr(settings, "CONTRIBUTION_SCORING", contribution_scoring)
+    parameters = {"num_rounds": NUM_ROUNDS, "num_clients": 3, "fraction_fit": 1.0, "seed": 3}
+
+    uninterrupted = client.post("/api/simulations/jobs", json=parameters).json()["job_id"]
+    assert _wait(client, uninterrupted) == "Completed"
+
+    # Cancel from the job's own thread as soon as round 2 is checkpointed, so
+    # the request lands before round 3 starts however fast the rounds are.
+    publish_event = SimulationJob.publish_event
+
+    def cancel_after_checkpoint(job, event):
+        publish_event(job, event)
+        message = event.get("message", "")
+        if message.startswith("Saved ") and f" checkpoint for round {CANCEL_AFTER_ROUND} " in message:
+            assert client.delete(f"/api/simulations/jobs/{job.id}").status_code == 200
+
+    monkeypatch.setattr(SimulationJob, "publish_event", cancel_after_checkpoint)
+    interrupted = client.post("/api/simulations/jobs", json=parameters).json()["job_id"]
+    assert _wait(client, interrupted) == "Cancelled"
+    monkeypatch.setattr(SimulationJob, "publish_event", publish_event)
+    cancelled_rounds = [e["round"] for e in _events(client, interrupted) if e["type"] == "round_summary"]
+    assert cancelled_rounds == list(range(1, CANCEL_AFTER_ROUND + 1))
+
+    assert client.post(f"/api/simulations/jobs/{interrupted}/resume").status_code == 202
+    assert _wait(client, interrupted) == "Completed"
+    resumed_events = _events(client, interrupted)
+    assert [e["round"] for e in resumed_events if e["type"] == "round_summary"] == list(
+        range(CANCEL_AFTER_ROUND + 1, NUM_ROUNDS + 1)
+    )
+
+    # The rounds after the resume, the final scores and the rewards (which
+    # depend on the initial evaluation or the contribution totals) all match.
+    for metric in ("loss", "test_loss", "test_accuracy"):
+        assert _series(client, interrupted, metric) == pytest.approx(_series(client, uninterrupted, metric))
+    assert len(_series(client, interrupted, "loss")) == NUM_ROUNDS
+    expected_rewards = _rewards(_events(client, uninterrupted))
+    assert len(expected_rewards) == (3 if contribution_scoring else 1)
+    assert _rewards(resumed_events) == pytest.approx(expected_rewards)
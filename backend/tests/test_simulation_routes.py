@@ -0,0 +1,24 @@
+# backend/tests/test_simulation_routes.py
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from routes import simulations
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(simulations.router, prefix="/api/simulations")
+    return TestClient(app)
+
+@pytest.mark.parametrize("parameters", [
+    {"num_rounds": 0, "num_clients": 2, "fraction_fit": 0.5},
+    {"num_rounds": 1, "num_clients": 0, "fraction_fit": 0.5},
+    {"num_rounds": 1, "num_clients": 2, "fraction_fit": 0},
+    {"num_rounds": 1, "num_clients": 2, "fraction_fit": 1.5},
+    {"num_rounds": 1, "num_clients": 2, "fraction_fit": 0.5, "dirichlet_alpha": 0},
+])
+def test_out_of_range_parameters_are_rejected(client, parameters):
+    # Neither a job nor a stream is started for them.
+    assert client.post("/api/simulations/jobs", json=parameters).status_code == 422
+    assert client.get("/api/simulations/stream", params=parameters).status_code == 422
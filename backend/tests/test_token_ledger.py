@@ -0,0 +1,57 @@
+# backend/tests/test_token_ledger.py
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from models import Base, LedgerTransaction, TokenBalance
+from utils.token_rewards import SQLTokenLedger
+
+@pytest.fixture
+def ledger():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield SQLTokenLedger(sessionmaker(bind=engine))
+    engine.dispose()
+
+def _balance_rows(ledger) -> dict:
+    with ledger.session_factory() as db:
+        return dict(db.execute(select(TokenBalance.user_id, TokenBalance.balance)).all())
+
+def test_credits_and_transfers_update_balances_and_history(ledger):
+    ledger.record_transaction(1, 10.0, "reward")
+    ledger.transfer_tokens(1, 2, 4.0, "thanks")
+
+    assert ledger.get_balance(1) == pytest.approx(6.0)
+    assert ledger.get_balance(2) == pytest.approx(4.0)
+    assert ledger.get_balance(3) == 0.0
+    transactions, cursor = ledger.get_transactions(1)
+    assert [t["amount"] for t in transactions] == [-4.0, 10.0]
+    assert transactions[0]["description"] == "Transfer to user 2: thanks"
+    assert cursor is None
+
+@pytest.mark.parametrize("upsert", [True, False])
+def test_bulk_credits_upsert_one_balance_row_per_user(ledger, monkeypatch, upsert):
+    if not upsert:
+        # A dialect without an upsert updates existing rows and inserts the rest.
+        monkeypatch.setattr(ledger.session_factory.kw["bind"].dialect, "name", "generic")
+    ledger.record_transaction(1, 1.0)
+    # User 1 already has a row, user 2 appears twice in one batch.
+    balances = ledger.record_transactions([1, 2, 2], [2.0, 3.0, 0.5], "batch")
+
+    assert balances == pytest.approx({1: 3.0, 2: 3.5})
+    assert _balance_rows(ledger) == pytest.approx({1: 3.0, 2: 3.5})
+    with ledger.session_factory() as db:
+        assert len(db.scalars(select(LedgerTransaction)).all()) == 4
+
+def test_transfer_without_enough_balance_is_rejected(ledger):
+    ledger.record_transaction(1, 3.0)
+    with pytest.raises(ValueError, match="Insufficient funds"):
+        ledger.transfer_tokens(1, 2, 5.0)
+    # Neither side changed, and nothing was recorded.
+    assert _balance_rows(ledger) == {1: 3.0}
+    transactions, _ = ledger.get_transactions(1)
+    assert len(transactions) == 1
+    assert ledger.get_transactions(2) == ([], None)
+    with pytest.raises(ValueError, match="Insufficient funds"):
+        ledger.transfer_tokens(3, 1, 1.0)
@@ -0,0 +1,32 @@
+# backend/tests/test_vectorized_training.py
+
+import functools
+import torch
+from torch import nn
+from torch.utils.data import DataLoader, TensorDataset
+from utils.training_loop import training_loop_stream
+
+def _run(vectorized: bool) -> dict:
+    torch.manual_seed(0)
+    model = nn.Sequential(nn.Flatten(), nn.Linear(8, 6), nn.ReLU(), nn.Linear(6, 3))
+    generator = torch.Generator().manual_seed(1)
+    # Unequal shard sizes, so clients run different numbers of steps and the
+    # last batch is partial.
+    loaders = []
+    for num_samples in (10, 13, 16):
+        inputs = torch.randn(num_samples, 8, generator=generator)
+        targets = torch.randint(0, 3, (num_samples,), generator=generator)
+        loaders.append(DataLoader(TensorDataset(inputs, targets), batch_size=4, shuffle=False))
+    events = list(training_loop_stream(
+        model, 3, loaders, nn.CrossEntropyLoss(), functools.partial(torch.optim.Adam, lr=0.01),
+        num_clients=3, vectorized=vectorized, seed=0,
+    ))
+    losses = [event["loss"] for event in events if event["type"] == "client_result"]
+    return {"state": model.state_dict(), "losses": losses}
+
+def test_vectorized_engine_matches_sequential():
+    sequential, vectorized = _run(False), _run(True)
+    assert len(vectorized["losses"]) == len(sequential["losses"]) == 9
+    torch.testing.assert_close(vectorized["losses"], sequential["losses"], rtol=1e-4, atol=1e-5)
+    for key, value in sequential["state"].items():
+        torch.testing.assert_close(vectorized["state"][key], value, rtol=1e-4, atol=1e-5)
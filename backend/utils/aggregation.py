@@ -0,0 +1,87 @@
+# backend/utils/aggregation.py
+
+import math
+import torch
+from typing import Dict, Optional
+from utils.flat_state import FlatStateLayout
+
+class StreamingAggregator:
+    """
+    Weighted FedAvg over a flat parameter vector, folded in one client at a time.
+
+    Each client's update is added into a single running accumulator in place as
+    soon as that client finishes, so nothing per-client is retained and peak
+    memory is the global vector plus the accumulator regardless of how many
+    clients take part in a round.
+    """
+
+    def __init__(
+        self,
+        layout: FlatStateLayout,
+        device: str = "cpu",
+        total: Optional[torch.Tensor] = None
+    ) -> None:
+        # `total` lets the accumulator live in a caller-provided (e.g. shared-memory) buffer.
+        self.layout = layout
+        self.total = torch.zeros(layout.numel, device=device) if total is None else total
+        self.total_weight = 0.0
+        # Reused per-key scratch for computing exact deltas before weighting them.
+        self._scratch = torch.empty(max((e[4] for e in layout.entries), default=0), device=device)
+
+    def add(self, update: torch.Tensor, weight: float = 1.0) -> None:
+        """Fold a flat update vector into the accumulator."""
+        self.total.add_(update, alpha=weight)
+        self.total_weight += weight
+
+    @torch.no_grad()
+    def add_state_delta(
+        self,
+        client_state: Dict[str, torch.Tensor],
+        global_flat: torch.Tensor,
+        weight: float = 1.0
+    ) -> None:
+        """
+        Fold `client_state - global` into the accumulator without materialising
+        a model-sized delta.
+        """
+        for key, _, _, offset, numel in self.layout.entries:
+            delta = self._scratch[:numel]
+            torch.sub(client_state[key].reshape(-1), global_flat[offset:offset + numel], out=delta)
+            self.total[offset:offset + numel].add_(delta, alpha=weight)
+        self.total_weight += weight
+
+    def merge(self, total: torch.Tensor, total_weight: float) -> None:
+        """Fold in a partial weighted sum produced elsewhere (e.g. by a worker process)."""
+        self.total.add_(total)
+        self.total_weight += total_weight
+
+    @torch.no_grad()
+    def apply_to(self, global_flat: torch.Tensor) -> None:
+        """Add the weighted mean update to `global_flat` in place and reset."""
+        if self.total_weight > 0:
+            global_flat.add_(self.total, alpha=1.0 / self.total_weight)
+        self.reset()
+
+    def reset(self) -> None:
+        self.total.zero_()
+        self.total_weight = 0.0
+
+def staleness_weight(staleness: int) -> float:
+    """Discount for an update computed `staleness` global versions ago: 1 / sqrt(1 + s)."""
+    return 1.0 / math.sqrt(1.0 + staleness)
+
+def aggregate_updates(client_updates, weights: Optional[list] = None) -> dict:
+    """
+    Aggregate client updates by computing the (optionally weighted) element-wise
+    average of the updates, accumulating each key in place.
+    """
+    if weights is None:
+        weights = [1.0] * len(client_updates)
+    total_weight = float(sum(weights))
+    aggregated_update = {}
+    for key in client_updates[0].keys():
+        total_update = torch.zeros_like(client_updates[0][key])
+        for client_update, weight in zip(client_updates, weights):
+            total_update.add_(client_update[key], alpha=weight)
+        aggregated_update[key] = total_update.div_(total_weight)
+    return aggregated_update
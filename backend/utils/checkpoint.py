@@ -0,0 +1,266 @@
+# backend/utils/checkpoint.py
+
+import datetime
+import json
+import os
+import random
+import shutil
+import numpy as np
+import torch
+from typing import Any, Dict, List, Optional, Tuple
+from utils.flat_state import FlatStateLayout
+
+# Each checkpoint is a directory `round-NNNNNN` under `<root>/<simulation_id>`:
+#
+#   meta.json        round, kind ("full" or "delta"), base_round, state keys,
+#                    Python RNG state, run parameters, run state (the initial
+#                    evaluation and contribution totals, when there are any)
+#   weights.npy      full checkpoints: the flat float32 global weights
+#   delta.npz        delta checkpoints: per changed state entry, the bitwise
+#                    XOR against the base checkpoint's weights (lossless)
+#   torch_rng.npy    the data-shuffling torch RNG state (the run's generator, else
+#                    torch's global CPU RNG)
+#   codec_state.npz  the update codec's named state tensors (only if it has any)
+#
+# A checkpoint is written to a temporary directory and renamed into place, so
+# a crash mid-write never leaves a partial checkpoint behind.
+CHECKPOINT_FORMAT_VERSION = 1
+
+def _round_dir(directory: str, round_num: int) -> str:
+    return os.path.join(directory, f"round-{round_num:06d}")
+
+def _list_rounds(directory: str) -> List[int]:
+    if not os.path.isdir(directory):
+        return []
+    rounds = []
+    for name in os.listdir(directory):
+        if name.startswith("round-") and os.path.exists(os.path.join(directory, name, "meta.json")):
+            rounds.append(int(name[len("round-"):]))
+    return sorted(rounds)
+
+def _read_meta(directory: str, round_num: int) -> Dict[str, Any]:
+    with open(os.path.join(_round_dir(directory, round_num), "meta.json")) as f:
+        return json.load(f)
+
+def _shuffle_bytes(bits: np.ndarray) -> np.ndarray:
+    # Group the bytes of every int32 by significance; the high bytes of an XOR
+    # between nearby floats are mostly zero and deflate much better together.
+    return np.ascontiguousarray(bits.view(np.uint8).reshape(-1, 4).T)
+
+def _unshuffle_bytes(shuffled: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(shuffled.T).view(np.int32).reshape(-1)
+
+class Checkpoint:
+    """A checkpoint loaded from disk, ready to resume from."""
+
+    def __init__(
+        self,
+        round_num: int,
+        weights: torch.Tensor,
+        meta: Dict[str, Any],
+        torch_rng_state: torch.Tensor,
+        codec_state: Dict[str, torch.Tensor]
+    ) -> None:
+        self.round = round_num
+        self.weights = weights
+        self.meta = meta
+        self.torch_rng_state = torch_rng_state
+        self.codec_state = codec_state
+
+    @property
+    def keys(self) -> List[str]:
+        return self.meta["keys"]
+
+    @property
+    def parameters(self) -> Dict[str, Any]:
+        return self.meta["parameters"]
+
+    @property
+    def rng_state(self) -> Tuple:
+        version, internal, gauss = self.meta["rng_state"]
+        return version, tuple(internal), gauss
+
+    @property
+    def run_state(self) -> Dict[str, Any]:
+        return self.meta.get("run_state") or {}
+
+def latest_checkpoint_meta(root: str, simulation_id: int) -> Optional[Dict[str, Any]]:
+    """Metadata of a simulation's most recent checkpoint, or None if it has none."""
+    directory = os.path.join(root, str(simulation_id))
+    rounds = _list_rounds(directory)
+    return _read_meta(directory, rounds[-1]) if rounds else None
+
+def load_checkpoint(root: str, simulation_id: int, round_num: Optional[int] = None) -> Optional[Checkpoint]:
+    """
+    Load a simulation's checkpoint (the latest one unless `round_num` is given).
+
+    Full checkpoints are memory-mapped, so weights are only paged in as they
+    are read; a delta checkpoint is rebuilt from its chain back to the last
+    full one.
+    """
+    directory = os.path.join(root, str(simulation_id))
+    if round_num is None:
+        rounds = _list_rounds(directory)
+        if not rounds:
+            return None
+        round_num = rounds[-1]
+    meta = _read_meta(directory, round_num)
+
+    chain = [meta]
+    while chain[-1]["kind"] == "delta":
+        chain.append(_read_meta(directory, chain[-1]["base_round"]))
+    full = chain.pop()
+    weights = np.load(os.path.join(_round_dir(directory, full["round"]), "weights.npy"), mmap_mode="c")
+    if chain:
+        weights = np.array(weights)
+        bits = weights.view(np.int32)
+        offsets = {key: (offset, numel) for key, offset, numel in full["entries"]}
+        for delta_meta in reversed(chain):
+            with np.load(os.path.join(_round_dir(directory, delta_meta["round"]), "delta.npz")) as delta:
+                for key in delta.files:
+                    offset, numel = offsets[key]
+                    bits[offset:offset + numel] ^= _unshuffle_bytes(delta[key])
+
+    round_dir = _round_dir(directory, round_num)
+    torch_rng_state = torch.from_numpy(np.load(os.path.join(round_dir, "torch_rng.npy")))
+    codec_state = {}
+    codec_path = os.path.join(round_dir, "codec_state.npz")
+    if os.path.exists(codec_path):
+        with np.load(codec_path) as state:
+            codec_state = {name: torch.from_numpy(state[name]) for name in state.files}
+    return Checkpoint(round_num, torch.from_numpy(weights), meta, torch_rng_state, codec_state)
+
+class SimulationCheckpointer:
+    """
+    Writes a simulation's server-side state every `every_rounds` rounds.
+
+    A checkpoint holds the global weights, the codec state (e.g. error-feedback
+    residuals), the client-sampling and data-shuffling RNG states, the round
+    index and the run state that spans rounds (the test scores before the
+    first round and the contribution totals), which is everything needed to
+    continue the run as if it had not stopped. With `full_every > 1`, only every `full_every`-th checkpoint stores
+    the weights in full and the ones in between store a lossless delta against
+    the previous checkpoint: state entries that did not change are skipped and
+    the rest are deflated. Only the latest `keep_last` checkpoints (plus any
+    they depend on) are kept; 0 keeps all of them.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        simulation_id: int,
+        every_rounds: int = 1,
+        keep_last: int = 3,
+        full_every: int = 1,
+        parameters: Optional[Dict[str, Any]] = None
+    ) -> None:
+        self.root = root
+        self.simulation_id = simulation_id
+        self.directory = os.path.join(root, str(simulation_id))
+        self.every_rounds = every_rounds
+        self.keep_last = keep_last
+        self.full_every = max(full_every, 1)
+        self.parameters = parameters or {}
+        # Weights of the last checkpoint written by this instance, the base of the next delta.
+        self._previous: Optional[np.ndarray] = None
+        self._previous_round: Optional[int] = None
+        self._since_full = 0
+
+    def due(self, round_num: int) -> bool:
+        return self.every_rounds > 0 and round_num % self.every_rounds == 0
+
+    def latest(self) -> Optional[Checkpoint]:
+        return load_checkpoint(self.root, self.simulation_id)
+
+    @torch.no_grad()
+    def save(
+        self,
+        round_num: int,
+        layout: FlatStateLayout,
+        weights: torch.Tensor,
+        rng: random.Random,
+        codec_state: Optional[Dict[str, torch.Tensor]] = None,
+        run_state: Optional[Dict[str, Any]] = None,
+        torch_rng_state: Optional[torch.Tensor] = None
+    ) -> Tuple[str, int]:
+        """
+        Write the checkpoint for `round_num` from the flat global `weights`.
+        `run_state` must be JSON-serializable; it is stored in meta.json.
+        `torch_rng_state` is the state of the generator the data is shuffled
+        with (torch's global RNG state if None).
+
+        Returns:
+            Tuple[str, int]: The checkpoint's kind ("full" or "delta") and the
+            number of bytes written.
+        """
+        current = weights.detach().to("cpu", torch.float32).numpy().copy()
+        kind = "full"
+        if self._previous is not None and self._since_full + 1 < self.full_every:
+            kind = "delta"
+
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_dir = os.path.join(self.directory, f".round-{round_num:06d}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        if kind == "full":
+            np.save(os.path.join(tmp_dir, "weights.npy"), current)
+        else:
+            xor = current.view(np.int32) ^ self._previous.view(np.int32)
+            changed = {}
+            for key, _, _, offset, numel in layout.entries:
+                entry = xor[offset:offset + numel]
+                if entry.any():
+                    changed[key] = _shuffle_bytes(entry)
+            np.savez_compressed(os.path.join(tmp_dir, "delta.npz"), **changed)
+
+        if torch_rng_state is None:
+            torch_rng_state = torch.get_rng_state()
+        np.save(os.path.join(tmp_dir, "torch_rng.npy"), torch_rng_state.numpy())
+        if codec_state:
+            np.savez(
+                os.path.join(tmp_dir, "codec_state.npz"),
+                **{name: state.detach().cpu().numpy() for name, state in codec_state.items()},
+            )
+
+        version, internal, gauss = rng.getstate()
+        meta = {
+            "version": CHECKPOINT_FORMAT_VERSION,
+            "simulation_id": self.simulation_id,
+            "round": round_num,
+            "kind": kind,
+            "base_round": self._previous_round if kind == "delta" else None,
+            "keys": layout.keys(),
+            "entries": [[key, offset, numel] for key, _, _, offset, numel in layout.entries],
+            "rng_state": [version, list(internal), gauss],
+            "parameters": self.parameters,
+            "run_state": run_state or {},
+            "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        final_dir = _round_dir(self.directory, round_num)
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+        num_bytes = sum(entry.stat().st_size for entry in os.scandir(final_dir))
+
+        self._previous = current
+        self._previous_round = round_num
+        self._since_full = 0 if kind == "full" else self._since_full + 1
+        self._prune()
+        return kind, num_bytes
+
+    def _prune(self) -> None:
+        if self.keep_last <= 0:
+            return
+        rounds = _list_rounds(self.directory)
+        needed = set()
+        for round_num in rounds[-self.keep_last:]:
+            # A delta checkpoint is only usable with every checkpoint it builds on.
+            while round_num is not None and round_num not in needed:
+                needed.add(round_num)
+                round_num = _read_meta(self.directory, round_num)["base_round"]
+        for round_num in rounds:
+            if round_num not in needed:
+                shutil.rmtree(_round_dir(self.directory, round_num), ignore_errors=True)
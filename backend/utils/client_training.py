@@ -0,0 +1,407 @@
+# backend/utils/client_training.py
+
+import contextlib
+import copy
+import time
+import torch
+import torch.multiprocessing as mp
+from torch import nn
+from torch.optim import Optimizer
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from utils.aggregation import StreamingAggregator, staleness_weight
+from utils.compression import CompressionStats, UpdateCodec, round_trip
+from utils.fast_compute import FastCompute
+from utils.flat_state import FlatStateLayout
+from utils.instrumentation import TimedIterable, count, observe_phase, registry
+
+# Optimizer state entries whose fresh value is all zeros, so zeroing them in
+# place is the same as starting a new optimizer (Adam, AdamW, AMSGrad).
+ZERO_INITIALIZED_STATE = frozenset(("step", "exp_avg", "exp_avg_sq", "max_exp_avg_sq"))
+
+@torch.no_grad()
+def reset_optimizer_state(optimizer: Optimizer) -> None:
+    """
+    Return `optimizer` to its freshly constructed state.
+
+    State tensors that start at zero are zeroed in place and kept; any other
+    state (e.g. an SGD momentum buffer, which starts as a copy of the first
+    gradient) is dropped and recreated by the next step.
+    """
+    for state in optimizer.state.values():
+        if not ZERO_INITIALIZED_STATE.issuperset(state):
+            optimizer.state.clear()
+            return
+    for state in optimizer.state.values():
+        for value in state.values():
+            value.zero_()
+
+class ClientReplicaPool:
+    """
+    Preallocated client models (and their optimizers), reused for every
+    client-round instead of deep-copying the global model each time.
+
+    `replica(client, global_flat)` checks out a replica, loads the global
+    weights into its parameters in place, and hands it out with an optimizer
+    whose state has been zeroed in place, so no model- or optimizer-sized
+    tensors are allocated after the first round. With
+    `persistent_optimizer_state=True` every client instead keeps its own
+    optimizer (bound to the replica's parameters) across rounds, for stateful
+    local training; that state is not part of checkpoints.
+
+    The time spent on each checkout is recorded as the "client_setup" phase,
+    and replica and optimizer allocations are counted.
+    """
+
+    def __init__(
+        self,
+        global_model: nn.Module,
+        optimizer_fn: Callable[[List[torch.nn.parameter.Parameter]], Optimizer],
+        layout: FlatStateLayout,
+        num_replicas: int = 1,
+        device: str = "cpu",
+        persistent_optimizer_state: bool = False
+    ) -> None:
+        self.optimizer_fn = optimizer_fn
+        self.layout = layout
+        self.persistent_optimizer_state = persistent_optimizer_state
+        self._free = [copy.deepcopy(global_model).to(device) for _ in range(num_replicas)]
+        count("replica_allocations", num_replicas)
+        # One optimizer per replica, or per (client, replica) with persistent state.
+        self._optimizers: Dict[Tuple[int, int], Optimizer] = {}
+
+    def _optimizer(self, client: int, replica: nn.Module) -> Optimizer:
+        key = (client if self.persistent_optimizer_state else -1, id(replica))
+        optimizer = self._optimizers.get(key)
+        if optimizer is None:
+            optimizer = self._optimizers[key] = self.optimizer_fn(replica.parameters())
+            count("optimizer_allocations")
+        elif not self.persistent_optimizer_state:
+            reset_optimizer_state(optimizer)
+        return optimizer
+
+    @contextlib.contextmanager
+    def replica(self, client: int, global_flat: torch.Tensor):
+        """
+        Check out a replica holding `global_flat`'s weights for `client`.
+
+        Yields:
+            Tuple[nn.Module, Optimizer]: The replica and its optimizer; both go
+            back to the pool when the block exits.
+        """
+        if not self._free:
+            raise RuntimeError("All client replicas are checked out")
+        started = time.perf_counter()
+        replica = self._free.pop()
+        self.layout.load_into(replica.state_dict(), global_flat)
+        optimizer = self._optimizer(client, replica)
+        observe_phase("client_setup", time.perf_counter() - started)
+        try:
+            yield replica, optimizer
+        finally:
+            self._free.append(replica)
+
+def train_client_epoch(
+    client_model: nn.Module,
+    client_dataloader: Iterable,
+    criterion: nn.Module,
+    optimizer: Optimizer,
+    device: str = "cpu",
+    fast_compute: Optional[FastCompute] = None
+) -> Tuple[float, int]:
+    """
+    Run one local epoch for a single client, taking each step through
+    `fast_compute` when it is given.
+
+    Returns:
+        Tuple[float, int]: The average training loss over the epoch's batches
+        and the number of samples seen.
+    """
+    client_model.train()
+    running_loss = 0.0
+    total_batches = 0
+    total_samples = 0
+    # Time spent waiting for batches is split from forward/backward only when metrics are on.
+    instrumented = registry.enabled
+    batches = TimedIterable(client_dataloader) if instrumented else client_dataloader
+    epoch_started = time.perf_counter()
+
+    for batch in batches:
+        inputs, targets = batch
+        inputs, targets = inputs.to(device), targets.to(device)
+        if fast_compute is not None:
+            loss = fast_compute.step(client_model, optimizer, criterion, inputs, targets)
+        else:
+            optimizer.zero_grad()
+            outputs = client_model(inputs)
+            loss = criterion(outputs, targets)
+            loss.backward()
+            optimizer.step()
+
+        running_loss += loss.item()
+        total_batches += 1
+        total_samples += targets.size(0)
+
+    if instrumented:
+        observe_phase("data", batches.seconds)
+        observe_phase("forward_backward", time.perf_counter() - epoch_started - batches.seconds)
+        count("batches", total_batches)
+        count("samples", total_samples)
+
+    avg_loss = running_loss / total_batches if total_batches > 0 else 0.0
+    return avg_loss, total_samples
+
+# Per-process state of a pool worker, filled in once by `_init_worker`.
+_worker_state = {}
+
+def _seed_worker_loaders(client_dataloaders: Sequence[Iterable], slot: int) -> None:
+    # Loaders that shuffled with one shared generator each arrive with their own
+    # copy of its state. The worker gives them one generator seeded from that
+    # state and its slot, so neither workers nor clients repeat each other's shuffles.
+    generators = [getattr(loader, "generator", None) for loader in client_dataloaders]
+    seeded = [generator for generator in generators if isinstance(generator, torch.Generator)]
+    if not seeded:
+        return
+    seed = int(torch.randint(2 ** 62, (1,), generator=seeded[0])) + slot
+    worker_generator = torch.Generator().manual_seed(seed)
+    for loader, generator in zip(client_dataloaders, generators):
+        if isinstance(generator, torch.Generator):
+            loader.generator = worker_generator
+
+def _init_worker(model, layout, shared_global, shared_totals, shared_weights, slot_counter,
+                 client_dataloaders, criterion, optimizer_fn, device, num_threads, codec,
+                 lock, shared_version, shared_buffer, shared_buffer_totals, fast_compute):
+    # Give every worker a fixed intra-op budget so that N workers don't each
+    # spin up one thread per core.
+    torch.set_num_threads(num_threads)
+    if fast_compute is not None:
+        # Configured thread counts override the per-worker budget; each worker
+        # compiles and calibrates for itself.
+        fast_compute.configure_threads()
+    # Tensors pickled through torch.multiprocessing arrive in shared memory, so
+    # the replica is a private copy of the template; it and its optimizer are
+    # reused for every client this worker trains.
+    replicas = ClientReplicaPool(model, optimizer_fn, layout, device=device)
+    # Claim this worker's private accumulator row.
+    with slot_counter.get_lock():
+        slot = slot_counter.value
+        slot_counter.value += 1
+    _seed_worker_loaders(client_dataloaders, slot)
+    aggregator = StreamingAggregator(layout, device, total=shared_totals[slot])
+    _worker_state.update(
+        replicas=replicas,
+        layout=layout,
+        slot=slot,
+        aggregator=aggregator,
+        shared_global=shared_global,
+        shared_weights=shared_weights,
+        client_dataloaders=client_dataloaders,
+        criterion=criterion,
+        device=device,
+        codec=codec,
+        fast_compute=fast_compute,
+        # Reused buffer for the flat update when it has to go through the codec
+        # or into the asynchronous buffer.
+        update=layout.empty().to(device) if codec is not None or lock is not None else None,
+        lock=lock,
+        shared_version=shared_version,
+        shared_buffer=shared_buffer,
+        shared_buffer_totals=shared_buffer_totals,
+        # Private copy of the global weights an asynchronous task started from.
+        snapshot=layout.empty().to(device) if lock is not None else None,
+    )
+
+def _train_client_task(client: int) -> Tuple[int, float, int, Optional[CompressionStats]]:
+    state = _worker_state
+    layout = state["layout"]
+
+    # Pull the current global weights straight out of shared memory.
+    with state["replicas"].replica(client, state["shared_global"]) as (model, optimizer):
+        avg_loss, num_samples = train_client_epoch(
+            model, state["client_dataloaders"][client], state["criterion"], optimizer, state["device"],
+            state["fast_compute"],
+        )
+
+        # Fold the sample-weighted update into this worker's shared accumulator;
+        # only the loss, sample count and codec statistics are pickled back.
+        model_state = model.state_dict()
+        stats = None
+        if state["codec"] is None:
+            state["aggregator"].add_state_delta(model_state, state["shared_global"], weight=num_samples)
+        else:
+            update = layout.flatten(model_state, out=state["update"]).sub_(state["shared_global"])
+            stats = CompressionStats()
+            state["aggregator"].add(round_trip(state["codec"], update, client, stats), weight=num_samples)
+    state["shared_weights"][state["slot"]] += num_samples
+    return client, avg_loss, num_samples, stats
+
+def _train_client_async_task(client: int) -> Tuple[int, float, int, Optional[CompressionStats], int, float, int]:
+    state = _worker_state
+    layout = state["layout"]
+    snapshot = state["snapshot"]
+
+    # The server may apply a buffer at any time, so take a consistent copy of
+    # the global weights and remember which version they are.
+    with state["lock"]:
+        snapshot.copy_(state["shared_global"])
+        version = int(state["shared_version"][0])
+    with state["replicas"].replica(client, snapshot) as (model, optimizer):
+        avg_loss, num_samples = train_client_epoch(
+            model, state["client_dataloaders"][client], state["criterion"], optimizer, state["device"],
+            state["fast_compute"],
+        )
+        update = layout.flatten(model.state_dict(), out=state["update"]).sub_(snapshot)
+    stats = None
+    if state["codec"] is not None:
+        stats = CompressionStats()
+        update = round_trip(state["codec"], update, client, stats)
+
+    # Staleness is the number of buffers the server applied while this client trained.
+    fold_started = time.perf_counter()
+    with state["lock"]:
+        buffer_version = int(state["shared_version"][0])
+        staleness = buffer_version - version
+        state["shared_buffer"].add_(update, alpha=num_samples * staleness_weight(staleness))
+        state["shared_buffer_totals"][0] += num_samples
+        state["shared_buffer_totals"][1] += 1
+    # Returned so the server can record it: worker-side metrics do not reach /metrics.
+    fold_seconds = time.perf_counter() - fold_started
+    return client, avg_loss, num_samples, stats, staleness, fold_seconds, buffer_version
+
+class ClientProcessPool:
+    """
+    A pool of worker processes that train simulated clients in parallel.
+
+    `client_dataloaders[c]` is client c's data; it is sent to each worker once,
+    when the pool starts. Loaders that shuffle with a `generator` share one
+    per worker, seeded from theirs and the worker's slot.
+
+    The global weights and one update accumulator per worker live in
+    shared-memory flat buffers, so each task only pickles a client index on the
+    way in and a loss on the way out, and memory does not grow with the number
+    of clients. A stateless `codec` is applied to each update inside the worker
+    that trained it.
+
+    With `asynchronous=True` the pool also serves buffered asynchronous
+    aggregation: `submit` trains one client against whatever the global
+    weights are when it starts, and its staleness-weighted update is folded
+    into a single shared buffer that the server applies with `apply_buffer`.
+
+    A `fast_compute` is copied to every worker, which compiles its own replica.
+
+    Use it as a context manager so the workers are torn down
+    when the training generator finishes or is closed early.
+    """
+
+    def __init__(
+        self,
+        global_model: nn.Module,
+        client_dataloaders: Sequence[Iterable],
+        criterion: nn.Module,
+        optimizer_fn: Callable[[List[torch.nn.parameter.Parameter]], Optimizer],
+        num_workers: int,
+        threads_per_worker: int = 1,
+        device: str = "cpu",
+        start_method: str = "spawn",
+        codec: Optional[UpdateCodec] = None,
+        asynchronous: bool = False,
+        fast_compute: Optional[FastCompute] = None
+    ) -> None:
+        if codec is not None and codec.stateful:
+            # A client may train on a different worker each round, so per-client
+            # codec state would be split across processes.
+            raise ValueError(f"The {codec.name} codec keeps per-client state and cannot be used with worker processes")
+        self.layout = FlatStateLayout(global_model.state_dict())
+        self.shared_global = self.layout.empty(shared=True)
+        self.shared_totals = torch.zeros(num_workers, self.layout.numel).share_memory_()
+        self.shared_weights = torch.zeros(num_workers, dtype=torch.float64).share_memory_()
+        self.layout.flatten(global_model.state_dict(), out=self.shared_global)
+
+        context = mp.get_context(start_method)
+        slot_counter = context.Value("i", 0)
+        self._lock = None
+        self.shared_version = self.shared_buffer = self.shared_buffer_totals = None
+        if asynchronous:
+            self._lock = context.Lock()
+            self.shared_version = torch.zeros(1, dtype=torch.int64).share_memory_()
+            self.shared_buffer = torch.zeros(self.layout.numel).share_memory_()
+            # Sum of sample counts and number of updates in the buffer.
+            self.shared_buffer_totals = torch.zeros(2, dtype=torch.float64).share_memory_()
+        self._pool = context.Pool(
+            processes=num_workers,
+            initializer=_init_worker,
+            initargs=(
+                global_model, self.layout, self.shared_global, self.shared_totals,
+                self.shared_weights, slot_counter, client_dataloaders, criterion,
+                optimizer_fn, device, threads_per_worker, codec, self._lock,
+                self.shared_version, self.shared_buffer, self.shared_buffer_totals,
+                fast_compute,
+            ),
+        )
+
+    def train_round(self, clients: List[int]) -> Iterator[Tuple[int, float, int, Optional[CompressionStats]]]:
+        """
+        Train `clients` against the current shared global weights.
+
+        Yields (client, average loss, samples, codec statistics or None) in the order the clients were given,
+        as soon as each one is available. Once the iterator is exhausted, every
+        update has been folded into the workers' accumulators.
+        """
+        pending = [self._pool.apply_async(_train_client_task, (client,)) for client in clients]
+        for result in pending:
+            yield result.get()
+
+    def collect(self, aggregator: StreamingAggregator) -> None:
+        """Merge the workers' accumulators into `aggregator` and clear them."""
+        for total, weight in zip(self.shared_totals, self.shared_weights.tolist()):
+            if weight > 0:
+                aggregator.merge(total, weight)
+        self.shared_totals.zero_()
+        self.shared_weights.zero_()
+
+    def submit(self, client: int, callback: Callable, error_callback: Callable) -> None:
+        """
+        Train `client` asynchronously. `callback` receives (client, average loss,
+        samples, codec statistics or None, staleness, seconds spent folding the
+        update into the buffer, the version of the buffer it went into) once its
+        update is in the buffer; it runs on the pool's result thread. The buffer
+        may be applied before the callback runs.
+        """
+        self._pool.apply_async(
+            _train_client_async_task, (client,), callback=callback, error_callback=error_callback
+        )
+
+    def buffered_updates(self) -> int:
+        with self._lock:
+            return int(self.shared_buffer_totals[1])
+
+    @torch.no_grad()
+    def apply_buffer(self, server_lr: float = 1.0) -> int:
+        """
+        Add the buffered updates to the global weights and start a new version.
+
+        Each update was weighted by its sample count and discounted by its
+        staleness; the sum is divided by the total sample count, so fresh
+        updates are averaged as in FedAvg and stale ones count for less.
+
+        Returns:
+            int: The number of updates applied.
+        """
+        with self._lock:
+            total_weight, count = self.shared_buffer_totals.tolist()
+            if count == 0:
+                return 0
+            self.shared_global.add_(self.shared_buffer, alpha=server_lr / total_weight)
+            self.shared_buffer.zero_()
+            self.shared_buffer_totals.zero_()
+            self.shared_version += 1
+        return int(count)
+
+    def close(self) -> None:
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self) -> "ClientProcessPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -0,0 +1,262 @@
+# backend/utils/compression.py
+
+import math
+import torch
+from typing import Dict, Optional
+
+class EncodedUpdate:
+    """A compressed flat update: the codec's payload tensors and their size in bytes."""
+
+    def __init__(self, numel: int, tensors: Dict[str, torch.Tensor], dense: bool = False) -> None:
+        self.numel = numel
+        self.tensors = tensors
+        # Set when a codec fell back to sending the update uncompressed.
+        self.dense = dense
+
+    @property
+    def nbytes(self) -> int:
+        return sum(t.numel() * t.element_size() for t in self.tensors.values())
+
+class UpdateCodec:
+    """
+    Encodes a flat float32 client update (client weights minus global weights)
+    into a compact payload and decodes it back for aggregation.
+
+    `stateful` codecs keep per-client state between rounds (e.g. error-feedback
+    residuals), so every update of a client must go through the same instance.
+    """
+
+    name = "codec"
+    stateful = False
+
+    def encode(self, update: torch.Tensor, client: int) -> EncodedUpdate:
+        raise NotImplementedError
+
+    def decode(self, encoded: EncodedUpdate) -> torch.Tensor:
+        raise NotImplementedError
+
+    def state_dict(self) -> Dict[str, torch.Tensor]:
+        """State to checkpoint (e.g. residuals or RNG state), as named tensors."""
+        return {}
+
+    def load_state_dict(self, state: Dict[str, torch.Tensor]) -> None:
+        pass
+
+class LosslessCodec(UpdateCodec):
+    """Sends the float32 update unchanged; also the fallback of the other codecs."""
+
+    name = "lossless"
+
+    def encode(self, update: torch.Tensor, client: int) -> EncodedUpdate:
+        return EncodedUpdate(update.numel(), {"values": update.clone()}, dense=True)
+
+    def decode(self, encoded: EncodedUpdate) -> torch.Tensor:
+        return encoded.tensors["values"]
+
+class QuantizationCodec(UpdateCodec):
+    """
+    Stochastic uniform quantization to signed 8- or 4-bit integers.
+
+    The update is split into chunks of `chunk_size` values, each with its own
+    float32 scale (its max magnitude over the largest level), and every value
+    is rounded up or down at random in proportion to its distance from the two
+    nearest levels, so the decoded update is an unbiased estimate of the
+    original. 4-bit values are packed two per byte.
+
+    With a `seed`, each client's rounding noise comes from its own generator
+    seeded with `seed + client`, so no two clients draw the same noise (which
+    would correlate their quantization errors instead of letting them average
+    out) and a client's draws do not depend on which process encodes it.
+    """
+
+    def __init__(self, bits: int = 8, chunk_size: int = 1024, seed: Optional[int] = None) -> None:
+        if bits not in (4, 8):
+            raise ValueError(f"Quantization supports 4 or 8 bits, got {bits}")
+        self.bits = bits
+        self.levels = 2 ** (bits - 1) - 1
+        self.chunk_size = chunk_size
+        self.name = f"int{bits}"
+        self.seed = seed
+        # Per-client generators, created lazily: a torch.Generator cannot be
+        # pickled into worker processes.
+        self._generators: Dict[int, torch.Generator] = {}
+
+    def _rand(self, n: int, client: int, device) -> torch.Tensor:
+        generator = None
+        if self.seed is not None:
+            generator = self._generators.get(client)
+            if generator is None:
+                generator = self._generators[client] = torch.Generator(device=device).manual_seed(self.seed + client)
+        return torch.rand(n, generator=generator, device=device)
+
+    def encode(self, update: torch.Tensor, client: int) -> EncodedUpdate:
+        numel = update.numel()
+        num_chunks = math.ceil(numel / self.chunk_size)
+        padded = torch.zeros(num_chunks * self.chunk_size, device=update.device)
+        padded[:numel] = update
+        chunks = padded.view(num_chunks, self.chunk_size)
+
+        scales = chunks.abs().amax(dim=1) / self.levels
+        scales[scales == 0] = 1.0
+        scaled = chunks / scales[:, None]
+        scaled.add_(self._rand(scaled.numel(), client, update.device).view_as(scaled)).floor_()
+        quantized = scaled.clamp_(-self.levels, self.levels).to(torch.int8).view(-1)[:numel]
+
+        if self.bits == 4:
+            # Shift to 0..14 and pack pairs of nibbles into one byte.
+            nibbles = (quantized + self.levels).to(torch.uint8)
+            if numel % 2:
+                nibbles = torch.cat([nibbles, nibbles.new_zeros(1)])
+            quantized = (nibbles[0::2] << 4) | nibbles[1::2]
+        return EncodedUpdate(numel, {"values": quantized, "scales": scales})
+
+    def decode(self, encoded: EncodedUpdate) -> torch.Tensor:
+        values = encoded.tensors["values"]
+        if self.bits == 4:
+            unpacked = torch.stack([values >> 4, values & 0x0F], dim=1).view(-1)
+            values = unpacked[:encoded.numel].to(torch.int8) - self.levels
+        num_chunks = encoded.tensors["scales"].numel()
+        padded = torch.zeros(num_chunks * self.chunk_size, device=values.device)
+        padded[:encoded.numel] = values
+        padded = padded.view(num_chunks, self.chunk_size).mul_(encoded.tensors["scales"][:, None])
+        return padded.view(-1)[:encoded.numel]
+
+    def state_dict(self) -> Dict[str, torch.Tensor]:
+        return {f"generator.{client}": generator.get_state() for client, generator in self._generators.items()}
+
+    def load_state_dict(self, state: Dict[str, torch.Tensor]) -> None:
+        self._generators = {
+            int(name[len("generator."):]): torch.Generator().set_state(generator_state)
+            for name, generator_state in state.items()
+            if name.startswith("generator.")
+        }
+
+class TopKCodec(UpdateCodec):
+    """
+    Keeps only the `fraction` of update values with the largest magnitude.
+
+    With `error_feedback`, what a client's update loses to sparsification is
+    kept as a per-client residual and added to that client's next update, so
+    small but persistent components are eventually sent rather than dropped.
+    If the sparse payload (int32 index + float32 value per entry) would not be
+    smaller than the dense update, the update is sent dense instead.
+    """
+
+    def __init__(self, fraction: float = 0.01, error_feedback: bool = True) -> None:
+        if not 0.0 < fraction <= 1.0:
+            raise ValueError(f"Top-k fraction must be in (0, 1], got {fraction}")
+        self.fraction = fraction
+        self.error_feedback = error_feedback
+        self.stateful = error_feedback
+        self.name = "topk"
+        self.residuals: Dict[int, torch.Tensor] = {}
+
+    def encode(self, update: torch.Tensor, client: int) -> EncodedUpdate:
+        numel = update.numel()
+        if self.error_feedback:
+            residual = self.residuals.get(client)
+            corrected = update.clone() if residual is None else update + residual
+        else:
+            corrected = update
+
+        k = max(1, int(self.fraction * numel))
+        if 2 * k >= numel:
+            if self.error_feedback:
+                self.residuals.pop(client, None)
+            return EncodedUpdate(numel, {"values": corrected.clone()}, dense=True)
+
+        indices = corrected.abs().topk(k, sorted=False).indices
+        values = corrected[indices]
+        if self.error_feedback:
+            # Whatever was not sent carries over to the client's next update.
+            corrected[indices] = 0.0
+            self.residuals[client] = corrected
+        return EncodedUpdate(numel, {"indices": indices.to(torch.int32), "values": values})
+
+    def decode(self, encoded: EncodedUpdate) -> torch.Tensor:
+        if encoded.dense:
+            return encoded.tensors["values"]
+        values = encoded.tensors["values"]
+        update = torch.zeros(encoded.numel, dtype=values.dtype, device=values.device)
+        update[encoded.tensors["indices"].long()] = values
+        return update
+
+    def state_dict(self) -> Dict[str, torch.Tensor]:
+        return {f"residual.{client}": residual for client, residual in self.residuals.items()}
+
+    def load_state_dict(self, state: Dict[str, torch.Tensor]) -> None:
+        self.residuals = {
+            int(name[len("residual."):]): residual.clone()
+            for name, residual in state.items()
+            if name.startswith("residual.")
+        }
+
+CODEC_NAMES = ("none", "lossless", "int8", "int4", "topk")
+
+def make_codec(
+    name: str,
+    topk_fraction: float = 0.01,
+    error_feedback: bool = True,
+    seed: Optional[int] = None
+) -> Optional[UpdateCodec]:
+    """Build a codec by name; "none" returns None (updates are aggregated uncompressed)."""
+    if name == "none":
+        return None
+    if name == "lossless":
+        return LosslessCodec()
+    if name == "int8":
+        return QuantizationCodec(bits=8, seed=seed)
+    if name == "int4":
+        return QuantizationCodec(bits=4, seed=seed)
+    if name == "topk":
+        return TopKCodec(fraction=topk_fraction, error_feedback=error_feedback)
+    raise ValueError(f"Unknown update codec {name!r}; expected one of {CODEC_NAMES}")
+
+class CompressionStats:
+    """Bytes and reconstruction error of the updates encoded in one round."""
+
+    def __init__(self) -> None:
+        self.raw_bytes = 0
+        self.encoded_bytes = 0
+        self.error_sq = 0.0
+        self.norm_sq = 0.0
+
+    @torch.no_grad()
+    def record(self, update: torch.Tensor, decoded: torch.Tensor, encoded: EncodedUpdate) -> None:
+        self.raw_bytes += update.numel() * update.element_size()
+        self.encoded_bytes += encoded.nbytes
+        self.error_sq += float(torch.sub(decoded, update).pow_(2).sum())
+        self.norm_sq += float(update.pow(2).sum())
+
+    def merge(self, other: "CompressionStats") -> None:
+        self.raw_bytes += other.raw_bytes
+        self.encoded_bytes += other.encoded_bytes
+        self.error_sq += other.error_sq
+        self.norm_sq += other.norm_sq
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Returns:
+            Dict[str, float]: compression_ratio (raw over encoded bytes) and
+            compression_error (relative L2 error of the decoded updates).
+        """
+        return {
+            "compression_ratio": self.raw_bytes / self.encoded_bytes if self.encoded_bytes else 1.0,
+            "compression_error": math.sqrt(self.error_sq / self.norm_sq) if self.norm_sq > 0 else 0.0,
+        }
+
+def round_trip(
+    codec: UpdateCodec,
+    update: torch.Tensor,
+    client: int,
+    stats: Optional[CompressionStats] = None
+) -> torch.Tensor:
+    """
+    Encode and decode `update` as it would be sent by `client`, recording the
+    cost in `stats`; returns the update the server would aggregate.
+    """
+    encoded = codec.encode(update, client)
+    decoded = codec.decode(encoded)
+    if stats is not None:
+        stats.record(update, decoded, encoded)
+    return decoded
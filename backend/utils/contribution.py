@@ -0,0 +1,178 @@
+# backend/utils/contribution.py
+
+import copy
+import itertools
+import math
+import random
+import time
+import torch
+from torch import nn
+from typing import Any, Dict, Optional, Sequence
+from utils.evaluation import Evaluator, make_evaluator
+from utils.flat_state import FlatStateLayout
+
+class ContributionScorer:
+    """
+    Estimates every client's Shapley value to a round from the round's
+    updates, by truncated Monte Carlo permutation sampling.
+
+    The value of a coalition of clients is the drop in test loss (on the
+    evaluator's cached test tensor) when the global model takes the
+    sample-weighted average of just their updates, so a round's values add up
+    to the loss reduction of the full aggregate. Each sampled permutation
+    credits every client with its marginal value when added to the clients
+    before it; coalition values are memoized for the round, and once a prefix
+    is within `truncation_tolerance` (relative to the round's total gain) of
+    the full coalition the remaining clients are credited nothing without
+    evaluating them. When `num_permutations` is at least the number of
+    permutations of the round's clients, every permutation is walked once and
+    the values are exact (up to truncation).
+
+    Sampling stops after `num_permutations` permutations, or before starting
+    another one once `max_evaluations` coalition evaluations or
+    `time_budget_s` seconds have been spent on the round; at least one
+    permutation is always completed.
+    """
+
+    def __init__(
+        self,
+        evaluator: Evaluator,
+        num_permutations: int = 50,
+        truncation_tolerance: float = 0.01,
+        max_evaluations: Optional[int] = None,
+        time_budget_s: Optional[float] = None,
+        seed: Optional[int] = None
+    ) -> None:
+        self.evaluator = evaluator
+        self.num_permutations = num_permutations
+        self.truncation_tolerance = truncation_tolerance
+        self.max_evaluations = max_evaluations
+        self.time_budget_s = time_budget_s
+        self.rng = random.Random(seed)
+        # Accumulated value per client id over every scored round.
+        self.totals: Dict[int, float] = {}
+        self.rounds_scored = 0
+        self._model: Optional[nn.Module] = None
+
+    def _over_budget(self, evaluations: int, started: float) -> bool:
+        if self.max_evaluations is not None and evaluations >= self.max_evaluations:
+            return True
+        return self.time_budget_s is not None and time.perf_counter() - started >= self.time_budget_s
+
+    def _permutations(self, num_clients: int):
+        if math.factorial(num_clients) <= self.num_permutations:
+            return itertools.permutations(range(num_clients))
+        positions = list(range(num_clients))
+        return (self.rng.sample(positions, num_clients) for _ in range(self.num_permutations))
+
+    @torch.no_grad()
+    def score_round(
+        self,
+        clients: Sequence[int],
+        model: nn.Module,
+        layout: FlatStateLayout,
+        global_flat: torch.Tensor,
+        updates: Sequence[torch.Tensor],
+        weights: Sequence[float]
+    ) -> Dict[str, Any]:
+        """
+        Score one round's clients and add their values to `totals`.
+
+        Args:
+            clients: Client id of every update.
+            model: A model of the global architecture; its weights are not touched.
+            layout: Layout of `global_flat` and the updates over `model`'s state_dict
+                (it may cover only part of it, e.g. just the parameters).
+            global_flat: Global weights the updates were computed against.
+            updates, weights: Each client's flat update and aggregation weight.
+
+        Returns:
+            Dict[str, Any]: contributions (one value per client, in order) and the
+            permutations, coalition evaluations and seconds the estimate took.
+        """
+        started = time.perf_counter()
+        if self._model is None:
+            self._model = copy.deepcopy(model)
+        scratch_state = self._model.state_dict()
+        candidate = torch.empty_like(global_flat)
+        prefix_sum = torch.empty_like(global_flat)
+        values: Dict[int, float] = {}
+
+        def coalition_value(mask: int, total_weight: float) -> float:
+            # `prefix_sum` holds the weighted sum of the coalition's updates.
+            if mask not in values:
+                candidate.copy_(global_flat)
+                if total_weight > 0:
+                    candidate.add_(prefix_sum, alpha=1.0 / total_weight)
+                layout.load_into(scratch_state, candidate)
+                values[mask] = -self.evaluator.evaluate(self._model)["test_loss"]
+            return values[mask]
+
+        num_clients = len(updates)
+        prefix_sum.zero_()
+        empty_value = coalition_value(0, 0.0)
+        for update, weight in zip(updates, weights):
+            prefix_sum.add_(update, alpha=weight)
+        full_value = coalition_value((1 << num_clients) - 1, float(sum(weights)))
+        tolerance = self.truncation_tolerance * abs(full_value - empty_value)
+
+        marginals = [0.0] * num_clients
+        permutations = 0
+        for order in self._permutations(num_clients):
+            if permutations > 0 and self._over_budget(len(values), started):
+                break
+            prefix_sum.zero_()
+            mask, total_weight, previous = 0, 0.0, empty_value
+            for position in order:
+                if abs(full_value - previous) <= tolerance:
+                    # Truncated: the rest of the permutation adds (almost) nothing.
+                    break
+                mask |= 1 << position
+                prefix_sum.add_(updates[position], alpha=weights[position])
+                total_weight += weights[position]
+                current = coalition_value(mask, total_weight)
+                marginals[position] += current - previous
+                previous = current
+            permutations += 1
+
+        contributions = [marginal / permutations for marginal in marginals]
+        for client, value in zip(clients, contributions):
+            self.totals[client] = self.totals.get(client, 0.0) + value
+        self.rounds_scored += 1
+        return {
+            "contributions": contributions,
+            "contribution_permutations": permutations,
+            "contribution_evaluations": len(values),
+            "contribution_duration_s": time.perf_counter() - started,
+        }
+
+    def state_dict(self) -> Dict[str, Any]:
+        """The accumulated values and the permutation RNG state, as JSON-serializable data to checkpoint."""
+        version, internal, gauss = self.rng.getstate()
+        return {
+            "totals": [[client, value] for client, value in sorted(self.totals.items())],
+            "rounds_scored": self.rounds_scored,
+            "rng_state": [version, list(internal), gauss],
+        }
+
+    def load_state_dict(self, state: Dict[str, Any]) -> None:
+        self.totals = {int(client): float(value) for client, value in state["totals"]}
+        self.rounds_scored = int(state["rounds_scored"])
+        version, internal, gauss = state["rng_state"]
+        self.rng.setstate((version, tuple(internal), gauss))
+
+def make_contribution_scorer(
+    root: str = "./data",
+    sample_size: Optional[int] = 1000,
+    batch_size: int = 2048,
+    num_permutations: int = 50,
+    truncation_tolerance: float = 0.01,
+    max_evaluations: Optional[int] = None,
+    time_budget_s: Optional[float] = None,
+    seed: Optional[int] = None
+) -> ContributionScorer:
+    """A `ContributionScorer` over (a fixed subset of) the cached MNIST test split in `root`."""
+    evaluator = make_evaluator(root, batch_size, sample_size, seed)
+    return ContributionScorer(
+        evaluator, num_permutations, truncation_tolerance, max_evaluations, time_budget_s, seed
+    )
@@ -1,48 +1,113 @@
+import numpy as np
 import torch
-from torchvision import datasets, transforms
-from torch.utils.data import DataLoader, random_split
+from torch.utils.data import DataLoader, Subset
+from typing import Optional
+from utils.mnist_cache import MNISTTensorDataset, TensorBatchLoader
 
 def load_mnist_dataset(train: bool = True, download: bool = True):
     """
     Load the MNIST dataset with standard normalization.
+
+    Samples come from the pre-normalized, memory-mapped tensor cache (built on
+    first use), so no per-sample transform runs at access time.
     
     Args:
         train (bool): If True, loads the training dataset; otherwise, loads the test dataset.
         download (bool): If True, downloads the dataset if not present.
     
     Returns:
-        torch.utils.data.Dataset: The MNIST dataset.
+        MNISTTensorDataset: The MNIST dataset.
     """
-    transform = transforms.Compose([
-        transforms.ToTensor(),
-        transforms.Normalize((0.1307,), (0.3081,))  # Using MNIST mean and std
-    ])
-    dataset = datasets.MNIST(root="./data", train=train, download=download, transform=transform)
-    return dataset
+    return MNISTTensorDataset(root="./data", train=train, download=download)
+
+def _dataset_targets(dataset) -> torch.Tensor:
+    targets = getattr(dataset, "targets", None)
+    if targets is None:
+        targets = [int(dataset[i][1]) for i in range(len(dataset))]
+    return torch.as_tensor(targets, dtype=torch.int64)
 
-def partition_dataset(dataset, num_clients: int):
+def partition_dataset(
+    dataset,
+    num_clients: int,
+    alpha: Optional[float] = None,
+    seed: Optional[int] = None,
+    min_partition_size: int = 10,
+    max_attempts: int = 100,
+    generator: Optional[torch.Generator] = None
+):
     """
-    Partition a dataset into `num_clients` subsets using IID random splitting.
+    Partition a dataset into `num_clients` subsets.
+
+    With `alpha=None` the split is IID: a random permutation cut into
+    near-equal shards. Otherwise each class is spread over the clients with
+    proportions drawn from a Dirichlet(alpha) distribution, giving label-skewed
+    non-IID shards (smaller alpha means more skew); proportions are redrawn
+    until every shard holds at least `min_partition_size` samples.
+
+    Each subset only stores an index tensor into `dataset`, so no samples are copied.
     
     Args:
         dataset (torch.utils.data.Dataset): The dataset to partition.
         num_clients (int): Number of subsets/clients.
+        alpha (Optional[float]): Dirichlet concentration; None for IID.
+        seed (Optional[int]): Seed for a reproducible split.
+        min_partition_size (int): Minimum shard size for Dirichlet splits.
+        max_attempts (int): Dirichlet redraws before giving up.
+        generator (Optional[torch.Generator]): Draw the permutations from this
+            generator instead of a fresh one seeded with `seed` (the Dirichlet
+            proportions are always drawn from `seed`).
         
     Returns:
         List[torch.utils.data.Subset]: A list of dataset subsets.
     """
     total_size = len(dataset)
-    partition_size = total_size // num_clients
-    # Distribute any remainder evenly among the first few partitions
-    lengths = [partition_size] * num_clients
-    remainder = total_size - partition_size * num_clients
-    for i in range(remainder):
-        lengths[i] += 1
-    
-    subsets = random_split(dataset, lengths)
-    return subsets
+    if generator is None:
+        generator = torch.Generator()
+        if seed is not None:
+            generator.manual_seed(seed)
+        else:
+            generator.seed()
+
+    if alpha is None:
+        partition_size = total_size // num_clients
+        # Distribute any remainder evenly among the first few partitions
+        lengths = [partition_size] * num_clients
+        remainder = total_size - partition_size * num_clients
+        for i in range(remainder):
+            lengths[i] += 1
+        shards = torch.randperm(total_size, generator=generator).split(lengths)
+        # Split gives views of one storage; torch.multiprocessing cannot pickle
+        # those into a spawned worker pool, so each shard owns its indices.
+        return [Subset(dataset, shard.clone()) for shard in shards]
+
+    targets = _dataset_targets(dataset)
+    rng = np.random.default_rng(seed)
+    class_indices = [
+        (targets == label).nonzero(as_tuple=True)[0]
+        for label in targets.unique().tolist()
+    ]
+    for _ in range(max_attempts):
+        client_parts = [[] for _ in range(num_clients)]
+        for indices in class_indices:
+            indices = indices[torch.randperm(len(indices), generator=generator)]
+            proportions = rng.dirichlet(np.full(num_clients, alpha))
+            cuts = (np.cumsum(proportions)[:-1] * len(indices)).astype(np.int64).tolist()
+            for client, part in enumerate(np.split(indices.numpy(), cuts)):
+                client_parts[client].append(part)
+        shards = [torch.from_numpy(np.concatenate(parts)) for parts in client_parts]
+        if min(len(shard) for shard in shards) >= min_partition_size:
+            return [Subset(dataset, shard) for shard in shards]
+    raise ValueError(
+        f"Could not draw a Dirichlet(alpha={alpha}) split giving all {num_clients} "
+        f"clients at least {min_partition_size} samples"
+    )
 
-def create_data_loaders(subsets, batch_size: int = 32, shuffle: bool = True):
+def create_data_loaders(
+    subsets,
+    batch_size: int = 32,
+    shuffle: bool = True,
+    generator: Optional[torch.Generator] = None
+):
     """
     Given a list of dataset subsets, create a DataLoader for each subset.
     
@@ -50,11 +115,23 @@ def create_data_loaders(subsets, batch_size: int = 32, shuffle: bool = True):
         subsets (List[torch.utils.data.Subset]): List of dataset partitions.
         batch_size (int): Batch size for the DataLoaders.
         shuffle (bool): Whether to shuffle the data.
+        generator (Optional[torch.Generator]): The generator every loader
+            shuffles with; None uses torch's global RNG.
         
     Returns:
-        List[torch.utils.data.DataLoader]: A list of DataLoaders.
+        List[torch.utils.data.DataLoader]: A list of DataLoaders. Subsets of a
+        tensor-backed dataset get a `TensorBatchLoader` that slices batches
+        directly out of the cached tensors.
     """
-    data_loaders = [DataLoader(subset, batch_size=batch_size, shuffle=shuffle) for subset in subsets]
+    data_loaders = []
+    for subset in subsets:
+        if isinstance(subset, Subset) and isinstance(subset.dataset, MNISTTensorDataset):
+            loader = TensorBatchLoader(
+                subset.dataset, batch_size, shuffle, indices=subset.indices, generator=generator
+            )
+        else:
+            loader = DataLoader(subset, batch_size=batch_size, shuffle=shuffle, generator=generator)
+        data_loaders.append(loader)
     return data_loaders
 
 if __name__ == "__main__":
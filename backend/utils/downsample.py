@@ -0,0 +1,75 @@
+# backend/utils/downsample.py
+
+import numpy as np
+from typing import Tuple
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+def lttb(x: np.ndarray, y: np.ndarray, num_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling of the series (x, y).
+
+    Keeps the first and last points and, from each of `num_points - 2` equal
+    buckets in between, the point forming the largest triangle with the point
+    kept from the previous bucket and the average of the next bucket, which
+    preserves the visual shape of the curve.
+
+    Returns:
+        np.ndarray: Indices of the kept points, in order.
+    """
+    n = len(x)
+    if num_points >= n:
+        return np.arange(n)
+    every = (n - 2) / (num_points - 2)
+    kept = np.empty(num_points, dtype=np.int64)
+    kept[0] = 0
+    previous = 0
+    for bucket in range(num_points - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        average_x = x[end:next_end].mean()
+        average_y = y[end:next_end].mean()
+        areas = np.abs(
+            (x[previous] - average_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (average_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    kept[-1] = n - 1
+    return kept
+
+def minmax(x: np.ndarray, y: np.ndarray, num_points: int) -> np.ndarray:
+    """
+    Min/max bucket downsampling: keep the first and last points, split the
+    points between them into `(num_points - 2) // 2` equal buckets and keep
+    each bucket's lowest and highest point (both ends of a flat bucket), so
+    every spike survives. That is `num_points` points, or one fewer when
+    `num_points` is odd.
+
+    Returns:
+        np.ndarray: Indices of the kept points, in order.
+    """
+    n = len(x)
+    if num_points >= n:
+        return np.arange(n)
+    num_buckets = (num_points - 2) // 2
+    bounds = np.linspace(1, n - 1, num_buckets + 1).astype(np.int64)
+    kept = [0]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        bucket = y[start:end]
+        low, high = start + int(np.argmin(bucket)), start + int(np.argmax(bucket))
+        if low == high:
+            low, high = start, end - 1
+        kept.extend(sorted((low, high)))
+    kept.append(n - 1)
+    return np.array(kept, dtype=np.int64)
+
+def downsample(x: np.ndarray, y: np.ndarray, num_points: int, method: str = "lttb") -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce the series (x, y) to at most `num_points` points with `method` ("lttb" or "minmax")."""
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method {method!r}; expected one of {DOWNSAMPLE_METHODS}")
+    if num_points < 3:
+        raise ValueError("Downsampling needs at least 3 points")
+    kept = (lttb if method == "lttb" else minmax)(x, y, num_points)
+    return x[kept], y[kept]
@@ -0,0 +1,112 @@
+# backend/utils/evaluation.py
+
+import functools
+import time
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch import nn
+from typing import Dict, List, Optional, Tuple
+from utils.mnist_cache import MNISTTensorDataset
+
+@functools.lru_cache(maxsize=4)
+def load_test_set(root: str = "./data") -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    The MNIST test split as resident, pre-normalized tensors.
+
+    Loaded from the `.npy` cache once per process and shared by every
+    simulation after that (10k images, about 31 MB).
+    """
+    dataset = MNISTTensorDataset(root=root, train=False, download=True)
+    return torch.from_numpy(np.array(dataset.images)), torch.from_numpy(np.array(dataset.targets))
+
+class Evaluator:
+    """
+    Scores models on a held-out test set.
+
+    The test images stay resident and are scored in large batches under
+    `torch.inference_mode`, so an evaluation costs a handful of forward
+    passes. With `sample_size`, a fixed random subset of the test set is used
+    (the same one every round, so successive scores are comparable).
+
+    The global model is evaluated every `every_rounds` rounds and after the
+    last one (0: only after the last one), and each result is kept in
+    `history`. With `evaluate_clients`, engines that train clients in-process
+    also score every client model right after it trains.
+    """
+
+    def __init__(
+        self,
+        images: torch.Tensor,
+        targets: torch.Tensor,
+        batch_size: int = 2048,
+        sample_size: Optional[int] = None,
+        seed: Optional[int] = None,
+        device: str = "cpu",
+        every_rounds: int = 1,
+        evaluate_clients: bool = False
+    ) -> None:
+        if sample_size is not None and sample_size < len(targets):
+            generator = torch.Generator()
+            if seed is not None:
+                generator.manual_seed(seed)
+            subset = torch.randperm(len(targets), generator=generator)[:sample_size]
+            images, targets = images[subset], targets[subset]
+        self.images = images.to(device)
+        self.targets = targets.to(device)
+        self.batch_size = batch_size
+        self.device = device
+        self.every_rounds = every_rounds
+        self.evaluate_clients = evaluate_clients
+        # (round, loss, accuracy) of every global-model evaluation, in order.
+        self.history: List[Tuple[int, float, float]] = []
+
+    @property
+    def num_samples(self) -> int:
+        return len(self.targets)
+
+    @torch.inference_mode()
+    def evaluate(self, model: nn.Module) -> Dict[str, float]:
+        """
+        Returns:
+            Dict[str, float]: test_loss (mean cross-entropy) and test_accuracy.
+        """
+        was_training = model.training
+        model.eval()
+        total_loss = 0.0
+        correct = 0
+        for start in range(0, self.num_samples, self.batch_size):
+            inputs = self.images[start:start + self.batch_size]
+            targets = self.targets[start:start + self.batch_size]
+            logits = model(inputs)
+            total_loss += float(F.cross_entropy(logits, targets, reduction="sum"))
+            correct += int((logits.argmax(dim=1) == targets).sum())
+        model.train(was_training)
+        return {
+            "test_loss": total_loss / self.num_samples if self.num_samples else 0.0,
+            "test_accuracy": correct / self.num_samples if self.num_samples else 0.0,
+        }
+
+    def evaluate_global(self, model: nn.Module, round_num: int) -> Dict[str, float]:
+        """Evaluate the global model after `round_num` and record it in `history`."""
+        started = time.perf_counter()
+        metrics = self.evaluate(model)
+        self.history.append((round_num, metrics["test_loss"], metrics["test_accuracy"]))
+        return dict(metrics, eval_duration_s=time.perf_counter() - started)
+
+    def due(self, round_num: int, last_round: int) -> bool:
+        """Whether the global model is evaluated after `round_num`."""
+        return round_num == last_round or (self.every_rounds > 0 and round_num % self.every_rounds == 0)
+
+def make_evaluator(
+    root: str = "./data",
+    batch_size: int = 2048,
+    sample_size: Optional[int] = None,
+    seed: Optional[int] = None,
+    device: str = "cpu",
+    every_rounds: int = 1,
+    evaluate_clients: bool = False
+) -> Evaluator:
+    """An `Evaluator` over the cached MNIST test split in `root`."""
+    images, targets = load_test_set(root)
+    return Evaluator(images, targets, batch_size, sample_size, seed, device, every_rounds, evaluate_clients)
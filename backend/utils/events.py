@@ -0,0 +1,188 @@
+# backend/utils/events.py
+
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+# Simulation progress is reported as typed JSON events. Every event is a dict
+# with a "type" key; the fields per type are:
+#
+#   log            message
+#   round_start    round, clients (ids training this round)
+#   client_result  round, client, loss, num_samples [, test_loss, test_accuracy]
+#   round_summary  round, num_clients, num_samples, avg_loss, min_loss, max_loss,
+#                  duration_s [, test_loss, test_accuracy, eval_duration_s]
+#                  [, compression_ratio, compression_error]
+#                  [, updates_per_second, staleness_mean, staleness_max,
+#                  staleness_counts] [, contributions,
+#                  contribution_permutations, contribution_evaluations,
+#                  contribution_duration_s] [, omitted_client_results]
+#   reward         user_id, reward, balance
+#   done           simulation_id, status, started_at, finished_at
+#   error          message
+#
+# Events are delivered to subscribers in batches: each SSE message carries a
+# JSON array of one or more events.
+Event = Dict[str, Any]
+
+VERBOSITY_LEVELS = ("summary", "clients")
+
+def log_event(message: str) -> Event:
+    return {"type": "log", "message": message}
+
+def round_start_event(round_num: int, clients: List[int]) -> Event:
+    return {"type": "round_start", "round": round_num, "clients": clients}
+
+def client_result_event(
+    round_num: int,
+    client: int,
+    loss: float,
+    num_samples: int,
+    evaluation: Optional[Dict[str, float]] = None
+) -> Event:
+    event = {
+        "type": "client_result",
+        "round": round_num,
+        "client": client,
+        "loss": loss,
+        "num_samples": num_samples,
+    }
+    if evaluation is not None:
+        # Only present when client models are scored on the test set.
+        event.update(evaluation)
+    return event
+
+def round_summary_event(
+    round_num: int,
+    client_losses: List[float],
+    client_samples: List[int],
+    duration_s: float,
+    compression: Optional[Dict[str, float]] = None,
+    asynchronous: Optional[Dict[str, Any]] = None,
+    evaluation: Optional[Dict[str, float]] = None,
+    contribution: Optional[Dict[str, Any]] = None
+) -> Event:
+    event = {
+        "type": "round_summary",
+        "round": round_num,
+        "num_clients": len(client_losses),
+        "num_samples": int(sum(client_samples)),
+        "avg_loss": sum(client_losses) / len(client_losses) if client_losses else 0.0,
+        "min_loss": min(client_losses, default=0.0),
+        "max_loss": max(client_losses, default=0.0),
+        "duration_s": duration_s,
+    }
+    if evaluation is not None:
+        # Only present for rounds after which the global model was evaluated.
+        event.update(evaluation)
+    if compression is not None:
+        # Only present when client updates went through an update codec.
+        event.update(compression)
+    if asynchronous is not None:
+        # Only present for asynchronous (buffered) aggregation, where a round is
+        # one application of the update buffer.
+        event.update(asynchronous)
+    if contribution is not None:
+        # Only present when client contributions are scored; one value per
+        # client, in the order of the round's round_start event.
+        event.update(contribution)
+    return event
+
+def reward_event(user_id: int, reward: float, balance: float) -> Event:
+    return {"type": "reward", "user_id": user_id, "reward": reward, "balance": balance}
+
+def done_event(simulation_id: Optional[int], status: str, started_at: str, finished_at: str) -> Event:
+    return {
+        "type": "done",
+        "simulation_id": simulation_id,
+        "status": status,
+        "started_at": started_at,
+        "finished_at": finished_at,
+    }
+
+def error_event(message: str) -> Event:
+    return {"type": "error", "message": message}
+
+def sse_format(message: str, event_id: Optional[int] = None, event: Optional[str] = None) -> str:
+    """Format a message as an SSE event, optionally with an id and event type."""
+    lines = ""
+    if event_id is not None:
+        lines += f"id: {event_id}\n"
+    if event is not None:
+        lines += f"event: {event}\n"
+    return f"{lines}data: {message}\n\n"
+
+def encode_batch(events: List[Event]) -> str:
+    """Serialize a batch of events as one compact JSON array."""
+    return json.dumps(events, separators=(",", ":"))
+
+class EventCoalescer:
+    """
+    Buffers events and releases them in batches, bounding event volume.
+
+    With `flush_interval_ms=0` a batch is released at the end of every round;
+    otherwise at most one batch per interval, so fast rounds are merged. Reward,
+    done and error events always flush immediately. At "summary" verbosity
+    round_start and client_result events are dropped; at "clients" verbosity at
+    most `max_client_results` client results are kept per round and the round
+    summary records how many were omitted.
+    """
+
+    IMMEDIATE_TYPES = ("reward", "done", "error")
+
+    def __init__(
+        self,
+        verbosity: str = "clients",
+        flush_interval_ms: int = 0,
+        max_client_results: int = 100
+    ) -> None:
+        if verbosity not in VERBOSITY_LEVELS:
+            raise ValueError(f"Unknown verbosity {verbosity!r}; expected one of {VERBOSITY_LEVELS}")
+        self.verbosity = verbosity
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_client_results = max_client_results
+        self._buffer: List[Event] = []
+        self._client_results_in_round = 0
+        self._omitted_in_round = 0
+        self._last_flush = time.monotonic()
+
+    def add(self, event: Event) -> Optional[List[Event]]:
+        """Add an event; returns a batch when one is due, else None."""
+        event_type = event["type"]
+        if event_type == "client_result":
+            self._client_results_in_round += 1
+            if self.verbosity == "summary":
+                return self._maybe_flush(event_type)
+            if self._client_results_in_round > self.max_client_results:
+                self._omitted_in_round += 1
+                return self._maybe_flush(event_type)
+        elif event_type == "round_start" and self.verbosity == "summary":
+            return None
+        elif event_type == "round_summary":
+            if self._omitted_in_round:
+                event = dict(event, omitted_client_results=self._omitted_in_round)
+            self._client_results_in_round = 0
+            self._omitted_in_round = 0
+
+        self._buffer.append(event)
+        return self._maybe_flush(event_type)
+
+    def _maybe_flush(self, event_type: str) -> Optional[List[Event]]:
+        if not self._buffer:
+            return None
+        if event_type in self.IMMEDIATE_TYPES:
+            return self.flush()
+        if self.flush_interval > 0:
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                return self.flush()
+        elif event_type in ("round_summary", "log"):
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[List[Event]]:
+        """Release whatever is buffered (None if nothing is)."""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return None
+        batch, self._buffer = self._buffer, []
+        return batch
@@ -0,0 +1,229 @@
+# backend/utils/fast_compute.py
+
+import contextlib
+import functools
+import time
+import weakref
+import torch
+from torch import nn
+from torch.optim import Optimizer
+from typing import Any, Dict, Optional, Tuple
+from utils.instrumentation import count
+
+def configure_threads(intra_op: Optional[int] = None, inter_op: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Set this process's torch intra-op and inter-op thread counts (None keeps
+    the current one). torch only accepts an inter-op count before the
+    process's first inter-op parallel work; after that it is left as it is.
+
+    Returns:
+        Tuple[int, int]: The intra-op and inter-op thread counts in effect.
+    """
+    if intra_op is not None:
+        torch.set_num_threads(intra_op)
+    if inter_op is not None and inter_op != torch.get_num_interop_threads():
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            pass
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
+@functools.lru_cache(maxsize=1)
+def cpu_supports_bf16() -> bool:
+    """Whether the CPU does bf16 arithmetic natively (AVX512-BF16 or AMX); elsewhere autocast only adds casts."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+_CONFIGURATION = (
+    "compile", "bf16", "backend", "calibration_steps", "intra_op_threads", "inter_op_threads",
+)
+
+class FastCompute:
+    """
+    Opt-in fast path for the client training step on CPU.
+
+    With `compile`, a replica's forward (and through it the backward) is
+    compiled with `torch.compile` the first time it trains, and the compiled
+    module is kept for every later client and round trained on that replica.
+    Compiled code is specialized to the batch size it first saw; batches of
+    another size (a shard's last, partial batch) run eagerly instead of
+    triggering a recompile. With `bf16`, the forward runs under CPU bf16
+    autocast if the CPU supports bf16 natively. The weights, gradients,
+    optimizer state and loss stay float32.
+
+    The first steps alternate between the eager and the fast path until each
+    has been timed `calibration_steps` times (after one warm-up step each),
+    and the fast path is kept only if it processed more samples per second;
+    `report` has both rates. An error while compiling or running the compiled
+    step turns compilation off for good and the step is redone without it
+    (`compile_error` says why). Both fallbacks are counted as
+    "fast_compute_fallbacks".
+
+    Only the configuration is pickled, so every worker process compiles and
+    calibrates for itself.
+    """
+
+    def __init__(
+        self,
+        compile: bool = True,
+        bf16: bool = True,
+        backend: str = "inductor",
+        calibration_steps: int = 20,
+        intra_op_threads: Optional[int] = None,
+        inter_op_threads: Optional[int] = None
+    ) -> None:
+        self.compile = compile
+        self.bf16 = bf16
+        self.backend = backend
+        self.calibration_steps = calibration_steps
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self._reset()
+
+    def _reset(self) -> None:
+        # `compiling` and `autocast` are what the fast path currently does.
+        self.compiling = self.compile
+        self.autocast = self.bf16 and cpu_supports_bf16()
+        self.enabled = self.compiling or self.autocast
+        self.fallback_reason: Optional[str] = None
+        if self.bf16 and not self.enabled:
+            self.fallback_reason = "bf16 is not native on this CPU"
+        self.compile_error: Optional[str] = None
+        # Replica -> (batch size it was compiled for, compiled module).
+        self._compiled: "weakref.WeakKeyDictionary[nn.Module, Tuple[int, nn.Module]]" = weakref.WeakKeyDictionary()
+        # Per path: [steps timed, seconds, samples]; the first step of each is a warm-up.
+        self._timings: Dict[str, list] = {"eager": [0, 0.0, 0], "fast": [0, 0.0, 0]}
+        self._calibrated = not self.enabled or self.calibration_steps <= 0
+        self.calibrated_mode = self.mode
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in _CONFIGURATION}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    def configure_threads(self) -> Tuple[int, int]:
+        """Apply the configured thread counts to the calling (training) process."""
+        return configure_threads(self.intra_op_threads, self.inter_op_threads)
+
+    @property
+    def mode(self) -> str:
+        parts = [name for name, on in (("torch.compile", self.compiling), ("bf16 autocast", self.autocast)) if on]
+        return " + ".join(parts) if self.enabled and parts else "eager"
+
+    def _fall_back(self, reason: str) -> None:
+        self.enabled = False
+        self.fallback_reason = reason
+        self._compiled.clear()
+        count("fast_compute_fallbacks")
+
+    def _forward(self, model: nn.Module, batch_size: int) -> nn.Module:
+        if not self.compiling:
+            return model
+        entry = self._compiled.get(model)
+        if entry is None:
+            entry = self._compiled[model] = (batch_size, torch.compile(model, backend=self.backend))
+        return entry[1] if entry[0] == batch_size else model
+
+    def _eager_step(self, model, optimizer, criterion, inputs, targets) -> torch.Tensor:
+        optimizer.zero_grad()
+        loss = criterion(model(inputs), targets)
+        loss.backward()
+        optimizer.step()
+        return loss
+
+    def _compile_failed(self, error: Exception, model, optimizer, criterion, inputs, targets) -> torch.Tensor:
+        # Nothing has been applied yet, so the step is simply redone without compiling.
+        self.compiling = False
+        self.compile_error = f"{type(error).__name__}: {error}"
+        if not self.autocast:
+            self._fall_back(f"torch.compile failed ({self.compile_error})")
+            return self._eager_step(model, optimizer, criterion, inputs, targets)
+        count("fast_compute_fallbacks")
+        return self._fast_step(model, optimizer, criterion, inputs, targets)
+
+    def _fast_step(self, model, optimizer, criterion, inputs, targets) -> torch.Tensor:
+        try:
+            forward = self._forward(model, inputs.shape[0])
+        except Exception as e:
+            # torch.compile itself raises where it is unsupported (e.g. on a newer Python).
+            return self._compile_failed(e, model, optimizer, criterion, inputs, targets)
+        optimizer.zero_grad()
+        autocast = torch.autocast("cpu", dtype=torch.bfloat16) if self.autocast else contextlib.nullcontext()
+        try:
+            with autocast:
+                outputs = forward(inputs)
+            loss = criterion(outputs.float(), targets)
+            loss.backward()
+        except Exception as e:
+            if forward is model:
+                raise
+            return self._compile_failed(e, model, optimizer, criterion, inputs, targets)
+        optimizer.step()
+        return loss
+
+    def step(
+        self,
+        model: nn.Module,
+        optimizer: Optimizer,
+        criterion: nn.Module,
+        inputs: torch.Tensor,
+        targets: torch.Tensor
+    ) -> torch.Tensor:
+        """
+        One optimizer step of `model` on a batch, on the fast path while it is enabled.
+
+        Returns:
+            torch.Tensor: The batch's (float32) loss.
+        """
+        if not self.enabled:
+            return self._eager_step(model, optimizer, criterion, inputs, targets)
+        if self._calibrated:
+            return self._fast_step(model, optimizer, criterion, inputs, targets)
+
+        eager, fast = self._timings["eager"], self._timings["fast"]
+        path = "eager" if eager[0] <= fast[0] else "fast"
+        started = time.perf_counter()
+        if path == "eager":
+            loss = self._eager_step(model, optimizer, criterion, inputs, targets)
+        else:
+            loss = self._fast_step(model, optimizer, criterion, inputs, targets)
+        seconds = time.perf_counter() - started
+        if not self.enabled:
+            return loss
+        timing = self._timings[path]
+        timing[0] += 1
+        if timing[0] > 1:
+            timing[1] += seconds
+            timing[2] += inputs.shape[0]
+        if min(eager[0], fast[0]) > self.calibration_steps:
+            self._calibrated = True
+            self.calibrated_mode = self.mode
+            if fast[2] / fast[1] <= eager[2] / eager[1]:
+                self._fall_back("no faster than eager")
+        return loss
+
+    def report(self) -> Optional[Dict[str, Any]]:
+        """
+        The calibration's result, once it has finished: the fast path's mode,
+        samples per second on the eager and the fast path, their ratio, why
+        torch.compile was dropped (if it was) and the reason for falling back
+        to eager (None if the fast path is in use).
+        """
+        eager, fast = self._timings["eager"], self._timings["fast"]
+        if eager[1] <= 0 or fast[1] <= 0 or not self._calibrated:
+            return None
+        eager_rate, fast_rate = eager[2] / eager[1], fast[2] / fast[1]
+        return {
+            "mode": self.calibrated_mode,
+            "eager_samples_per_s": eager_rate,
+            "fast_samples_per_s": fast_rate,
+            "speedup": fast_rate / eager_rate,
+            "compile_error": self.compile_error,
+            "fallback_reason": self.fallback_reason,
+        }
@@ -1,59 +1,282 @@
-# backend/federated.py
+# backend/utils/federated.py
+#
+# Runs a federation on the local machine: this process is the server and each
+# client is its own process. Run from the backend directory:
+#
+#     python -m utils.federated [--num_rounds N] [--num_clients N] ...
+#
+# Parameters default to config.Settings (NUM_ROUNDS, NUM_CLIENTS, FRACTION_FIT,
+# PARTITION_*, TRAINING_*, UPDATE_CODEC*).
 
-import multiprocessing as mp
-import subprocess
+import argparse
+import random
 import time
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+import torch.nn as nn
+import torch.optim as optim
+from multiprocessing.connection import wait
+from typing import Generator, List, Optional
+from config import settings
+from nn_models import MNISTModel
+from utils.aggregation import StreamingAggregator
+from utils.client_training import reset_optimizer_state, train_client_epoch
+from utils.compression import CompressionStats, EncodedUpdate, LosslessCodec, make_codec
+from utils.data_partition import partition_dataset
+from utils.events import Event, client_result_event, log_event, round_start_event, round_summary_event
+from utils.flat_state import FlatStateLayout
+from utils.mnist_cache import MNISTTensorDataset, TensorBatchLoader
+from utils.training_loop import sample_clients
 
-def run_server():
+def _codec(name: str, topk_fraction: float, error_feedback: bool, seed: Optional[int]):
+    # Updates always go through a codec on the wire; "none" means dense float32.
+    return make_codec(name, topk_fraction, error_feedback, seed) or LosslessCodec()
+
+def _client_main(client_id, conn, shared_global, layout, dataset, shard_order, shard_bounds,
+                 batch_size, num_threads, codec_args):
     """
-    Runs the FedML server.
-    Assumes that 'utils/federated-server.py' accepts command-line arguments,
-    for example: --num_rounds and --num_clients.
+    Client process: announce readiness, then train one local epoch for every
+    "train" message and send back the encoded update, until told to stop.
     """
-    cmd = [
-        "python",
-        "utils/federated-server.py",
-        "--num_rounds", "100",
-        "--num_clients", "2"
-    ]
-    subprocess.run(cmd, check=True)
-
-def run_client(client_id: int):
+    torch.set_num_threads(num_threads)
+    model = MNISTModel()
+    model_state = model.state_dict()
+    start, stop = shard_bounds
+    loader = TensorBatchLoader(dataset, batch_size=batch_size, shuffle=True, indices=shard_order[start:stop])
+    criterion = nn.CrossEntropyLoss()
+    # One optimizer for the whole run, reset at the start of every round.
+    optimizer = optim.Adam(model.parameters(), lr=0.001)
+    # A client keeps its codec for the whole run, so error-feedback residuals persist.
+    codec = _codec(*codec_args)
+    update = layout.empty()
+    conn.send(("ready", client_id))
+
+    while True:
+        message = conn.recv()
+        if message[0] == "stop":
+            break
+        _, round_num = message
+        # The server does not touch the global weights while a round is running.
+        layout.load_into(model_state, shared_global)
+        reset_optimizer_state(optimizer)
+        avg_loss, num_samples = train_client_epoch(model, loader, criterion, optimizer)
+        layout.flatten(model_state, out=update).sub_(shared_global)
+        encoded = codec.encode(update, client_id)
+        # Plain numpy arrays pickle as bytes through the pipe.
+        payload = {name: tensor.numpy() for name, tensor in encoded.tensors.items()}
+        conn.send(("update", round_num, avg_loss, num_samples, encoded.dense, payload))
+    conn.close()
+
+class LocalFederation:
     """
-    Runs a FedML client.
-    Assumes that 'utils/federated-client.py' accepts command-line arguments,
-    such as --client_id and --server_address.
+    A server plus `num_clients` client processes on one host.
+
+    The global weights live in one shared-memory flat vector that every client
+    reads at the start of a round, so broadcasting costs nothing per client.
+    Each client sends its encoded update back over its own pipe and the server
+    folds it into a streaming aggregator as soon as it arrives. Clients get
+    their shard as indices into the memory-mapped MNIST cache, so the dataset
+    is partitioned once and never copied or re-read per client.
     """
-    cmd = [
-        "python",
-        "utils/federated-client.py",
-        "--client_id", str(client_id),
-        "--server_address", "127.0.0.1:5000"  # Adjust as needed; ensure it matches server settings.
-    ]
-    subprocess.run(cmd, check=True)
+
+    def __init__(
+        self,
+        num_clients: int,
+        dirichlet_alpha: Optional[float] = None,
+        seed: Optional[int] = None,
+        batch_size: int = 32,
+        threads_per_client: int = 1,
+        start_method: str = "spawn",
+        codec_name: str = "none",
+        topk_fraction: float = 0.01,
+        error_feedback: bool = True,
+        ready_timeout: float = 120.0
+    ) -> None:
+        self.num_clients = num_clients
+        self.model = MNISTModel()
+        self.layout = FlatStateLayout(self.model.state_dict())
+        self.shared_global = self.layout.empty(shared=True)
+        self.layout.flatten(self.model.state_dict(), out=self.shared_global)
+        self.codec = _codec(codec_name, topk_fraction, error_feedback, seed)
+        self.ready_timeout = ready_timeout
+
+        dataset = MNISTTensorDataset(root="./data", train=True, download=True)
+        shards = partition_dataset(dataset, num_clients, alpha=dirichlet_alpha, seed=seed)
+        # All shards' indices in one shared tensor: a client only receives its
+        # bounds, so the spawn payload stays small and start() never blocks on it.
+        shard_order = torch.cat([torch.as_tensor(shard.indices, dtype=torch.int64) for shard in shards])
+        shard_order.share_memory_()
+        bounds = np.cumsum([0] + [len(shard.indices) for shard in shards]).tolist()
+        context = mp.get_context(start_method)
+        self.connections = []
+        self.processes = []
+        started = time.perf_counter()
+        for client_id in range(num_clients):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_client_main,
+                args=(
+                    client_id, child_conn, self.shared_global, self.layout, dataset, shard_order,
+                    (bounds[client_id], bounds[client_id + 1]), batch_size, threads_per_client,
+                    (codec_name, topk_fraction, error_feedback, seed),
+                ),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+        self.spawn_time = time.perf_counter() - started
+        self.startup_time: Optional[float] = None
+
+    def wait_ready(self) -> float:
+        """
+        Block until every client has reported ready; returns the seconds it took
+        from the first spawn. Raises if a client exits or the timeout passes first.
+        """
+        started = time.perf_counter() - self.spawn_time
+        pending = {conn: client_id for client_id, conn in enumerate(self.connections)}
+        sentinels = {process.sentinel: client_id for client_id, process in enumerate(self.processes)}
+        deadline = time.perf_counter() + self.ready_timeout
+        while pending:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError(f"{len(pending)} clients not ready after {self.ready_timeout}s")
+            for ready in wait(list(pending) + list(sentinels), timeout=remaining):
+                if ready in sentinels and not self.processes[sentinels[ready]].is_alive():
+                    raise RuntimeError(f"Client {sentinels[ready]} exited during startup")
+                if ready in pending:
+                    message = ready.recv()
+                    if message[0] != "ready":
+                        raise RuntimeError(f"Unexpected message from client {pending[ready]}: {message[0]}")
+                    del pending[ready]
+        self.startup_time = time.perf_counter() - started
+        return self.startup_time
+
+    def run_round(
+        self,
+        round_num: int,
+        clients: List[int],
+        aggregator: StreamingAggregator,
+        stats: CompressionStats
+    ) -> Generator[Event, None, None]:
+        """Train `clients` on the current global weights and aggregate their updates."""
+        pending = {self.connections[client]: client for client in clients}
+        sentinels = {self.processes[client].sentinel: client for client in clients}
+        for conn in pending:
+            conn.send(("train", round_num))
+        while pending:
+            for ready in wait(list(pending) + list(sentinels)):
+                if ready in sentinels:
+                    if not self.processes[sentinels[ready]].is_alive():
+                        raise RuntimeError(f"Client {sentinels[ready]} exited during round {round_num}")
+                    continue
+                client = pending.pop(ready)
+                del sentinels[self.processes[client].sentinel]
+                _, _, avg_loss, num_samples, dense, payload = ready.recv()
+                tensors = {name: torch.from_numpy(array) for name, array in payload.items()}
+                encoded = EncodedUpdate(self.layout.numel, tensors, dense=dense)
+                update = self.codec.decode(encoded)
+                stats.raw_bytes += self.layout.numel * 4
+                stats.encoded_bytes += encoded.nbytes
+                aggregator.add(update, weight=num_samples)
+                yield client_result_event(round_num, client, avg_loss, num_samples)
+
+    def close(self) -> None:
+        for conn in self.connections:
+            try:
+                conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for conn in self.connections:
+            conn.close()
+
+def federation_stream(
+    num_rounds: int,
+    num_clients: int,
+    fraction_fit: float,
+    dirichlet_alpha: Optional[float] = None,
+    seed: Optional[int] = None,
+    threads_per_client: int = 1,
+    start_method: str = "spawn",
+    codec_name: str = "none",
+    topk_fraction: float = 0.01,
+    error_feedback: bool = True,
+    ready_timeout: float = 120.0
+) -> Generator[Event, None, None]:
+    """
+    Run a local multi-process federation, yielding the same progress events as
+    `training_loop_stream`. Round summaries carry each round's wall time and
+    the bytes clients sent relative to dense float32 updates.
+    """
+    federation = LocalFederation(
+        num_clients, dirichlet_alpha, seed, threads_per_client=threads_per_client,
+        start_method=start_method, codec_name=codec_name, topk_fraction=topk_fraction,
+        error_feedback=error_feedback, ready_timeout=ready_timeout,
+    )
+    try:
+        yield log_event(f"Spawned {num_clients} client processes in {federation.spawn_time:.2f}s")
+        startup_time = federation.wait_ready()
+        yield log_event(f"All {num_clients} clients ready {startup_time:.2f}s after the first spawn")
+
+        rng = random.Random(seed)
+        aggregator = StreamingAggregator(federation.layout)
+        for round_num in range(1, num_rounds + 1):
+            round_started = time.perf_counter()
+            clients = sample_clients(num_clients, fraction_fit, rng)
+            yield round_start_event(round_num, clients)
+            stats = CompressionStats()
+            client_losses = []
+            client_samples = []
+            for event in federation.run_round(round_num, clients, aggregator, stats):
+                client_losses.append(event["loss"])
+                client_samples.append(event["num_samples"])
+                yield event
+            aggregator.apply_to(federation.shared_global)
+            summary = stats.summary()
+            yield round_summary_event(
+                round_num, client_losses, client_samples, time.perf_counter() - round_started,
+                {"compression_ratio": summary["compression_ratio"]},
+            )
+    finally:
+        federation.close()
+    yield log_event("Federation finished.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local multi-process federation on MNIST")
+    parser.add_argument("--num_rounds", type=int, default=settings.NUM_ROUNDS, help="Number of federated learning rounds")
+    parser.add_argument("--num_clients", type=int, default=settings.NUM_CLIENTS, help="Number of client processes")
+    parser.add_argument("--fraction_fit", type=float, default=settings.FRACTION_FIT, help="Fraction of clients trained per round")
+    parser.add_argument("--dirichlet_alpha", type=float, default=settings.PARTITION_DIRICHLET_ALPHA, help="Dirichlet alpha for non-IID shards (omit for IID)")
+    parser.add_argument("--seed", type=int, default=settings.PARTITION_SEED, help="Seed for partitioning and client sampling")
+    parser.add_argument("--codec", type=str, default=settings.UPDATE_CODEC, help="Update codec: none, lossless, int8, int4 or topk")
+    args = parser.parse_args()
+
+    for event in federation_stream(
+        num_rounds=args.num_rounds,
+        num_clients=args.num_clients,
+        fraction_fit=args.fraction_fit,
+        dirichlet_alpha=args.dirichlet_alpha,
+        seed=args.seed,
+        threads_per_client=settings.TRAINING_THREADS_PER_WORKER,
+        start_method=settings.TRAINING_MP_START_METHOD,
+        codec_name=args.codec,
+        topk_fraction=settings.UPDATE_CODEC_TOPK_FRACTION,
+        error_feedback=settings.UPDATE_CODEC_ERROR_FEEDBACK,
+        ready_timeout=settings.FEDERATION_READY_TIMEOUT_SECONDS,
+    ):
+        if event["type"] == "log":
+            print(event["message"])
+        elif event["type"] == "round_summary":
+            print(
+                f"Round {event['round']}: {event['num_clients']} clients, "
+                f"average loss {event['avg_loss']:.4f}, {event['duration_s']:.2f}s"
+            )
 
 if __name__ == "__main__":
-    processes = []
-
-    # Start the server process.
-    server_proc = mp.Process(target=run_server)
-    server_proc.start()
-    processes.append(server_proc)
-    print("Server started...")
-
-    # Allow some time for the server to start up.
-    time.sleep(5)
-
-    # Start client processes.
-    num_clients = 2  # Adjust the number of clients as needed.
-    for client_id in range(num_clients):
-        p = mp.Process(target=run_client, args=(client_id,))
-        p.start()
-        processes.append(p)
-        print(f"Client {client_id} started...")
-
-    # Wait for all processes to complete.
-    for p in processes:
-        p.join()
-
-    print("Federated learning simulation finished.")
+    main()
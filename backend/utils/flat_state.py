@@ -0,0 +1,55 @@
+# backend/utils/flat_state.py
+
+import torch
+from typing import Dict, List, Optional, Tuple
+
+
+class FlatStateLayout:
+    """
+    Describes how a model's state_dict maps onto one contiguous float32 vector.
+
+    Every entry of the state_dict occupies a fixed slice of the flat vector, so a
+    whole model can be copied, shared between processes or accumulated with a
+    single tensor operation instead of one operation per key.
+    """
+
+    def __init__(self, state_dict: Dict[str, torch.Tensor]) -> None:
+        self.entries: List[Tuple[str, torch.Size, torch.dtype, int, int]] = []
+        offset = 0
+        for key, tensor in state_dict.items():
+            numel = tensor.numel()
+            self.entries.append((key, tensor.shape, tensor.dtype, offset, numel))
+            offset += numel
+        self.numel = offset
+
+    def keys(self) -> List[str]:
+        return [key for key, _, _, _, _ in self.entries]
+
+    def empty(self, shared: bool = False) -> torch.Tensor:
+        """Allocate an uninitialised flat vector, optionally in shared memory."""
+        flat = torch.empty(self.numel, dtype=torch.float32)
+        if shared:
+            flat.share_memory_()
+        return flat
+
+    def flatten(self, state_dict: Dict[str, torch.Tensor], out: Optional[torch.Tensor] = None) -> torch.Tensor:
+        """Copy a state_dict into a flat vector, reusing `out` when it is given."""
+        if out is None:
+            out = self.empty()
+        for key, _, _, offset, numel in self.entries:
+            out[offset:offset + numel].copy_(state_dict[key].reshape(-1))
+        return out
+
+    def unflatten(self, flat: torch.Tensor) -> Dict[str, torch.Tensor]:
+        """Return a state_dict whose float tensors are views into `flat`."""
+        state = {}
+        for key, shape, dtype, offset, numel in self.entries:
+            view = flat[offset:offset + numel].view(shape)
+            state[key] = view if dtype == flat.dtype else view.to(dtype)
+        return state
+
+    @torch.no_grad()
+    def load_into(self, state_dict: Dict[str, torch.Tensor], flat: torch.Tensor) -> None:
+        """Copy a flat vector into the (live) tensors of a state_dict in place."""
+        for key, shape, _, offset, numel in self.entries:
+            state_dict[key].copy_(flat[offset:offset + numel].view(shape))
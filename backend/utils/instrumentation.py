@@ -0,0 +1,290 @@
+# backend/utils/instrumentation.py
+
+import contextlib
+import datetime
+import functools
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from config import settings
+
+# Upper bounds, in seconds, of the timer histogram buckets.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Shared no-op context, returned by timers while metrics are disabled.
+_NOOP = contextlib.nullcontext()
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str,
+                 labelnames: Sequence[str]) -> None:
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """A monotonically increasing count per label set."""
+
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+class _TimerContext:
+    __slots__ = ("timer", "labels", "started")
+
+    def __init__(self, timer: "Timer", labels: Dict[str, str]) -> None:
+        self.timer = timer
+        self.labels = labels
+
+    def __enter__(self) -> "_TimerContext":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.timer.observe(time.perf_counter() - self.started, **self.labels)
+
+class Timer(_Metric):
+    """Durations per label set, exported as a Prometheus histogram in seconds."""
+
+    type_name = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # Per label set: per-bucket (non-cumulative) counts, sum and count.
+        self._values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, seconds: float, **labels) -> None:
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            index = 0
+            while index < len(self.buckets) and seconds > self.buckets[index]:
+                index += 1
+            entry[0][index] += 1
+            entry[1] += seconds
+            entry[2] += 1
+
+    def time(self, **labels):
+        """Context manager that observes the time spent in its block."""
+        if not self.registry.enabled:
+            return _NOOP
+        return _TimerContext(self, labels)
+
+    def total(self, **labels) -> Tuple[float, int]:
+        """Sum of observed seconds and number of observations for a label set."""
+        entry = self._values.get(self._key(labels))
+        return (entry[1], entry[2]) if entry else (0.0, 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(names, key + (_format_value(bound),))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+class MetricsRegistry:
+    """
+    Process-wide collection of counters and timers, rendered in the Prometheus
+    text exposition format.
+
+    With `enabled=False` every update returns after a single attribute check
+    and timers hand out a shared no-op context, so instrumented hot paths cost
+    next to nothing. Metrics recorded in training worker processes stay in
+    those processes; only the server-side phases reach /metrics.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type_name}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def timer(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Timer:
+        return self._get_or_create(Timer, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+registry = MetricsRegistry(enabled=settings.METRICS_ENABLED)
+
+PHASE_SECONDS = registry.timer(
+    "fml_phase_seconds", "Time spent in each phase of a simulation", ("phase",)
+)
+SIMULATION_EVENTS = registry.counter(
+    "fml_simulation_events_total", "Rounds, client updates, batches and samples processed", ("event",)
+)
+RESULT_CACHE_EVENTS = registry.counter(
+    "fml_result_cache_total", "Simulation result cache hits, misses, stores and evictions", ("outcome",)
+)
+LEDGER_SECONDS = registry.timer(
+    "fml_ledger_operation_seconds", "Latency of token ledger operations", ("operation",)
+)
+LEDGER_TRANSACTIONS = registry.counter(
+    "fml_ledger_transactions_total", "Ledger rows written"
+)
+HTTP_REQUEST_SECONDS = registry.timer(
+    "fml_http_request_seconds", "Latency of HTTP requests until the response starts",
+    ("method", "route", "status"),
+)
+
+def phase(name: str):
+    """Time a block as simulation phase `name`."""
+    return PHASE_SECONDS.time(phase=name)
+
+def observe_phase(name: str, seconds: float) -> None:
+    PHASE_SECONDS.observe(seconds, phase=name)
+
+def count(event: str, amount: float = 1.0) -> None:
+    SIMULATION_EVENTS.inc(amount, event=event)
+
+def timed(timer: Timer, **labels) -> Callable:
+    """Decorator observing every call of the function on `timer`."""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer.time(**labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class TimedIterable:
+    """Wraps an iterable and accumulates the time spent waiting for its items."""
+
+    def __init__(self, iterable: Iterable) -> None:
+        self.iterable = iterable
+        self.seconds = 0.0
+
+    def __iter__(self):
+        iterator = iter(self.iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.seconds += time.perf_counter() - started
+                return
+            self.seconds += time.perf_counter() - started
+            yield item
+
+class RoundProfiler:
+    """
+    Captures a `torch.profiler` trace of one round (`settings.PROFILE_ROUND`)
+    and writes it to `settings.PROFILE_DIR` as a Chrome trace.
+
+    `start` and `stop` are called at the boundaries of every round and do
+    nothing for the other rounds.
+    """
+
+    def __init__(self, round_num: Optional[int] = None, directory: Optional[str] = None) -> None:
+        self.round_num = settings.PROFILE_ROUND if round_num is None else round_num
+        self.directory = directory or settings.PROFILE_DIR
+        self._profile = None
+        self._round: Optional[int] = None
+
+    def start(self, round_num: int) -> None:
+        if round_num != self.round_num:
+            return
+        from torch.profiler import ProfilerActivity, profile
+
+        self._profile = profile(activities=[ProfilerActivity.CPU])
+        self._profile.start()
+        self._round = round_num
+
+    def stop(self) -> Optional[str]:
+        """Stop a running capture; returns the trace's path, or None if none was running."""
+        if self._profile is None:
+            return None
+        self._profile.stop()
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(self.directory, f"round-{self._round}-{stamp}-{os.getpid()}.json")
+        self._profile.export_chrome_trace(path)
+        self._profile = None
+        return path
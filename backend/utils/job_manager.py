@@ -0,0 +1,304 @@
+# backend/utils/job_manager.py
+
+import collections
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Iterator, Optional, Tuple
+from config import settings
+from database import SessionLocal
+from models import SimulationRecord
+from utils.events import EventCoalescer, encode_batch, error_event, log_event, sse_format
+
+# Lifecycle of a job; the same strings are persisted to SimulationRecord.status.
+QUEUED = "Queued"
+RUNNING = "Running"
+COMPLETED = "Completed"
+FAILED = "Failed"
+CANCELLED = "Cancelled"
+FINAL_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+class SimulationJob:
+    """
+    One submitted simulation and the ring buffer of events it has produced.
+
+    Events are coalesced into batches (one JSON array per SSE message) before
+    they are buffered, and batches get consecutive integer ids starting at 1.
+    Only the most recent `buffer_size` batches are kept, which bounds memory
+    for long runs while still letting a reconnecting subscriber resume from
+    its `Last-Event-ID`.
+    """
+
+    def __init__(self, job_id: int, parameters: dict, buffer_size: int,
+                 coalescer: EventCoalescer) -> None:
+        self.id = job_id
+        self.parameters = parameters
+        self.coalescer = coalescer
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        self.cancel_requested = threading.Event()
+        self._events: Deque[Tuple[int, str]] = collections.deque(maxlen=buffer_size)
+        self._last_event_id = 0
+        self._condition = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINAL_STATUSES
+
+    @property
+    def last_event_id(self) -> int:
+        return self._last_event_id
+
+    def publish_event(self, event: dict) -> None:
+        batch = self.coalescer.add(event)
+        if batch:
+            self.publish(encode_batch(batch))
+
+    def flush_events(self) -> None:
+        batch = self.coalescer.flush()
+        if batch:
+            self.publish(encode_batch(batch))
+
+    def publish(self, message: str) -> None:
+        with self._condition:
+            self._last_event_id += 1
+            self._events.append((self._last_event_id, message))
+            self._condition.notify_all()
+
+    def set_status(self, status: str, error: Optional[str] = None) -> None:
+        with self._condition:
+            self.status = status
+            self.error = error
+            self._condition.notify_all()
+
+    def _events_after(self, event_id: int):
+        # Ids in the buffer are contiguous, so the start index is a subtraction.
+        first_id = self._last_event_id - len(self._events) + 1
+        start = max(event_id + 1 - first_id, 0)
+        return [self._events[i] for i in range(start, len(self._events))]
+
+    def subscribe(self, last_event_id: int = 0, keepalive_seconds: float = 15.0) -> Iterator[str]:
+        """
+        Yield SSE-formatted events after `last_event_id`, then follow new ones.
+
+        A comment line is sent whenever nothing happened for `keepalive_seconds`,
+        and a final `close` event once the job has finished and the subscriber has
+        caught up. Detaching (closing this iterator) does not affect the job.
+        """
+        cursor = last_event_id
+        while True:
+            with self._condition:
+                events = self._events_after(cursor)
+                if not events and not self.finished:
+                    self._condition.wait(timeout=keepalive_seconds)
+                    events = self._events_after(cursor)
+                finished = self.finished
+                status = self.status
+
+            if events:
+                for event_id, message in events:
+                    yield sse_format(message, event_id=event_id)
+                cursor = events[-1][0]
+            elif finished:
+                yield sse_format(status, event="close")
+                return
+            else:
+                yield ": keep-alive\n\n"
+
+class SimulationJobManager:
+    """
+    Runs simulations as background jobs on a dedicated thread pool.
+
+    Training is decoupled from HTTP responses: a dropped or slow SSE
+    subscriber neither stops nor throttles its job, and uvicorn's request
+    threadpool only ever serves short requests and stream reads.
+    """
+
+    def __init__(self, max_workers: int, buffer_size: int, max_history: int) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="simulation")
+        self._buffer_size = buffer_size
+        self._max_history = max_history
+        self._jobs: "collections.OrderedDict[int, SimulationJob]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        num_rounds: int,
+        num_clients: int,
+        fraction_fit: float,
+        dirichlet_alpha: Optional[float] = None,
+        verbosity: str = "clients",
+        flush_interval_ms: int = 0,
+        aggregation: str = "sync",
+        async_buffer_size: Optional[int] = None,
+        seed: Optional[int] = None
+    ) -> SimulationJob:
+        """
+        Persist a queued SimulationRecord and schedule the simulation.
+
+        `seed` (default: settings.SIMULATION_SEED) makes the run deterministic,
+        so a repeated configuration can be replayed from the result cache.
+        """
+        db = SessionLocal()
+        try:
+            record = SimulationRecord(
+                num_rounds=num_rounds,
+                num_clients=num_clients,
+                fraction_fit=fraction_fit,
+                status=QUEUED,
+            )
+            db.add(record)
+            db.commit()
+            db.refresh(record)
+            job_id = record.id
+        finally:
+            db.close()
+
+        parameters = {
+            "num_rounds": num_rounds,
+            "num_clients": num_clients,
+            "fraction_fit": fraction_fit,
+            "dirichlet_alpha": dirichlet_alpha,
+            "aggregation": aggregation,
+            "async_buffer_size": async_buffer_size,
+        }
+        if seed is None:
+            seed = settings.SIMULATION_SEED
+        if seed is not None:
+            parameters["partition_seed"] = seed
+        return self._schedule(job_id, parameters, verbosity, flush_interval_ms)
+
+    def resume(
+        self,
+        simulation_id: int,
+        verbosity: str = "clients",
+        flush_interval_ms: int = 0
+    ) -> Optional[SimulationJob]:
+        """
+        Continue a stopped simulation from its latest checkpoint, as a new job
+        with the same id. Returns None if the simulation has no checkpoint;
+        raises ValueError if it is still running.
+        """
+        from utils.checkpoint import latest_checkpoint_meta
+
+        existing = self.get(simulation_id)
+        if existing is not None and not existing.finished:
+            raise ValueError(f"Simulation {simulation_id} is still {existing.status.lower()}")
+        meta = latest_checkpoint_meta(settings.CHECKPOINT_DIR, simulation_id)
+        if meta is None:
+            return None
+
+        db = SessionLocal()
+        try:
+            record = db.get(SimulationRecord, simulation_id)
+            if record is None:
+                return None
+            if record.status == COMPLETED:
+                raise ValueError(f"Simulation {simulation_id} has already completed")
+            record.status = QUEUED
+            record.finished_at = None
+            db.commit()
+        finally:
+            db.close()
+
+        parameters = dict(meta["parameters"], resume=True)
+        return self._schedule(simulation_id, parameters, verbosity, flush_interval_ms)
+
+    def _schedule(self, job_id: int, parameters: dict, verbosity: str, flush_interval_ms: int) -> SimulationJob:
+        coalescer = EventCoalescer(verbosity, flush_interval_ms, settings.SSE_MAX_CLIENT_RESULTS_PER_ROUND)
+        job = SimulationJob(job_id, parameters, self._buffer_size, coalescer)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._evict_finished()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: int) -> Optional[SimulationJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: int) -> Optional[SimulationJob]:
+        """Ask a job to stop; a queued job is cancelled before it starts."""
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel_requested.set()
+        return job
+
+    def shutdown(self) -> None:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel_requested.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _evict_finished(self) -> None:
+        # Keep at most `max_history` jobs in memory, dropping the oldest finished ones.
+        excess = len(self._jobs) - self._max_history
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+    def _persist_status(self, db, record: SimulationRecord, job: SimulationJob, status: str,
+                        error: Optional[str] = None) -> None:
+        record.status = status
+        if status in FINAL_STATUSES and record.finished_at is None:
+            record.finished_at = datetime.datetime.utcnow()
+        db.commit()
+        job.set_status(status, error)
+
+    def _run(self, job: SimulationJob) -> None:
+        # The ML stack is imported by the first job rather than by the web tier,
+        # so workers that never train never load torch.
+        from nn_models import MNISTModel
+        from utils.simulation_manager import run_simulation_events
+
+        db = SessionLocal()
+        try:
+            record = db.get(SimulationRecord, job.id)
+            if job.cancel_requested.is_set():
+                job.publish_event(log_event("Simulation cancelled before it started"))
+                job.flush_events()
+                self._persist_status(db, record, job, CANCELLED)
+                return
+
+            if not job.parameters.get("resume"):
+                record.started_at = datetime.datetime.utcnow()
+            self._persist_status(db, record, job, RUNNING)
+            events = run_simulation_events(
+                db=db,
+                global_model=MNISTModel(),
+                simulation_record=record,
+                **job.parameters,
+            )
+            try:
+                for event in events:
+                    job.publish_event(event)
+                    if job.cancel_requested.is_set():
+                        break
+            finally:
+                # Closing the generator tears down any training worker processes.
+                events.close()
+
+            if job.cancel_requested.is_set() and record.status != COMPLETED:
+                job.publish_event(log_event("Simulation cancelled"))
+                job.flush_events()
+                self._persist_status(db, record, job, CANCELLED)
+            else:
+                job.flush_events()
+                job.set_status(COMPLETED)
+        except Exception as e:
+            db.rollback()
+            job.publish_event(error_event(f"Simulation failed: {e}"))
+            job.flush_events()
+            record = db.get(SimulationRecord, job.id)
+            if record is not None:
+                self._persist_status(db, record, job, FAILED, str(e))
+            else:
+                job.set_status(FAILED, str(e))
+        finally:
+            db.close()
+
+job_manager = SimulationJobManager(
+    max_workers=settings.SIMULATION_MAX_CONCURRENT_JOBS,
+    buffer_size=settings.SIMULATION_EVENT_BUFFER_SIZE,
+    max_history=settings.SIMULATION_JOB_HISTORY,
+)
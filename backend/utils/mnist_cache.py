@@ -0,0 +1,168 @@
+# backend/utils/mnist_cache.py
+
+import math
+import os
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from typing import Optional, Sequence, Tuple
+
+MNIST_MEAN = 0.1307
+MNIST_STD = 0.3081
+
+def _cache_paths(root: str, train: bool) -> Tuple[str, str]:
+    split = "train" if train else "test"
+    cache_dir = os.path.join(root, "MNIST", "cache")
+    return (
+        os.path.join(cache_dir, f"{split}-images-f32.npy"),
+        os.path.join(cache_dir, f"{split}-labels-i64.npy"),
+    )
+
+def _atomic_save(path: str, array: np.ndarray) -> None:
+    # Write next to the destination and rename, so concurrent readers never see
+    # a half-written file.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+def build_mnist_cache(root: str = "./data", train: bool = True, download: bool = True) -> Tuple[str, str]:
+    """
+    Decode and normalize an MNIST split once and store it as `.npy` arrays.
+
+    Images are stored as float32 of shape (N, 1, 28, 28), already normalized
+    with the MNIST mean and std, and labels as int64 of shape (N,).
+
+    Returns:
+        Tuple[str, str]: Paths of the image and label arrays.
+    """
+    from torchvision import datasets
+
+    images_path, labels_path = _cache_paths(root, train)
+    if os.path.exists(images_path) and os.path.exists(labels_path):
+        return images_path, labels_path
+
+    raw = datasets.MNIST(root=root, train=train, download=download)
+    images = raw.data.numpy().astype(np.float32)[:, None, :, :]
+    images /= 255.0
+    images -= MNIST_MEAN
+    images /= MNIST_STD
+    labels = raw.targets.numpy().astype(np.int64)
+
+    os.makedirs(os.path.dirname(images_path), exist_ok=True)
+    _atomic_save(images_path, images)
+    _atomic_save(labels_path, labels)
+    return images_path, labels_path
+
+def mnist_cache_version(root: str = "./data", download: bool = True) -> str:
+    """
+    Identify the contents of the train and test caches in `root` (building
+    them if needed) by the size and modification time of their files, which
+    change whenever a cache is rebuilt.
+    """
+    parts = []
+    for train in (True, False):
+        for path in build_mnist_cache(root, train, download):
+            stat = os.stat(path)
+            parts.append(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}")
+    return ";".join(parts)
+
+class MNISTTensorDataset(Dataset):
+    """
+    MNIST backed by the pre-normalized, memory-mapped `.npy` cache.
+
+    The arrays are mapped copy-on-write, so every process that opens the cache
+    (simulation workers, FedML clients) shares the same page-cache pages. When
+    pickled, only the cache location is sent and the receiving process maps
+    the files again rather than receiving a copy of the data.
+    """
+
+    def __init__(self, root: str = "./data", train: bool = True, download: bool = True) -> None:
+        self.root = root
+        self.train = train
+        build_mnist_cache(root, train, download)
+        self._open()
+
+    def _open(self) -> None:
+        images_path, labels_path = _cache_paths(self.root, self.train)
+        self.images = torch.from_numpy(np.load(images_path, mmap_mode="c"))
+        self.targets = torch.from_numpy(np.load(labels_path, mmap_mode="c"))
+
+    def __len__(self) -> int:
+        return self.targets.shape[0]
+
+    def __getitem__(self, index):
+        return self.images[index], int(self.targets[index])
+
+    def __getstate__(self):
+        return {"root": self.root, "train": self.train}
+
+    def __setstate__(self, state):
+        self.root = state["root"]
+        self.train = state["train"]
+        self._open()
+
+class TensorBatchLoader:
+    """
+    Serves shuffled mini-batches from a tensor-backed dataset by index slicing.
+
+    A drop-in replacement for `DataLoader` over `MNISTTensorDataset` (optionally
+    restricted to `indices`): each batch is one fancy-index into the resident
+    image and label tensors instead of `batch_size` `__getitem__` calls plus a
+    collate step. A `generator` is pickled as a copy of its state, so the
+    receiving process gets a generator of its own that continues from where
+    this one was when the loader was sent.
+    """
+
+    def __init__(
+        self,
+        dataset: MNISTTensorDataset,
+        batch_size: int = 32,
+        shuffle: bool = True,
+        indices: Optional[Sequence[int]] = None,
+        generator: Optional[torch.Generator] = None
+    ) -> None:
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.generator = generator
+        if indices is None:
+            self.indices = None
+            self.num_samples = len(dataset)
+        else:
+            self.indices = torch.as_tensor(indices, dtype=torch.int64)
+            self.num_samples = len(self.indices)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.generator is not None:
+            # A numpy array is pickled by value; the temporary state tensor would be
+            # sent through shared memory and freed before a spawned process got it.
+            state["generator"] = self.generator.get_state().numpy()
+        return state
+
+    def __setstate__(self, state):
+        generator_state = state.pop("generator")
+        self.__dict__.update(state)
+        self.generator = None
+        if generator_state is not None:
+            self.generator = torch.Generator()
+            self.generator.set_state(torch.from_numpy(generator_state))
+
+    def __len__(self) -> int:
+        return math.ceil(self.num_samples / self.batch_size)
+
+    def __iter__(self):
+        if self.shuffle:
+            order = torch.randperm(self.num_samples, generator=self.generator)
+            if self.indices is not None:
+                order = self.indices[order]
+        elif self.indices is not None:
+            order = self.indices
+        else:
+            order = torch.arange(self.num_samples)
+
+        images, targets = self.dataset.images, self.dataset.targets
+        for start in range(0, self.num_samples, self.batch_size):
+            batch_indices = order[start:start + self.batch_size]
+            yield images[batch_indices], targets[batch_indices]
@@ -0,0 +1,193 @@
+# backend/utils/result_cache.py
+
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import torch
+from torch import nn
+from typing import Any, Dict, List, Optional, Tuple
+from utils.events import Event
+from utils.flat_state import FlatStateLayout
+from utils.instrumentation import RESULT_CACHE_EVENTS
+
+# Each cached result is a directory named by its key under the cache root:
+#
+#   meta.json     key, the configuration it was computed for, state keys, the
+#                 test scores before and after training, size in bytes
+#   events.jsonl  the run's training events, one JSON object per line
+#   weights.npy   the flat float32 final global weights
+#
+# An entry is written to a temporary directory and renamed into place, so a
+# reader never sees a partial entry. A hit touches meta.json: its modification
+# time orders the entries from least to most recently used.
+RESULT_CACHE_FORMAT_VERSION = 2
+
+def configuration_key(configuration: Dict[str, Any]) -> str:
+    """The sha256 of a configuration's canonical JSON form (sorted keys, no whitespace)."""
+    payload = json.dumps(configuration, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+@torch.no_grad()
+def model_fingerprint(model: nn.Module) -> Dict[str, str]:
+    """The model's class and a sha256 of its state_dict (keys, shapes, dtypes and values)."""
+    digest = hashlib.sha256()
+    for key, tensor in model.state_dict().items():
+        digest.update(f"{key}:{tuple(tensor.shape)}:{tensor.dtype}".encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return {"class": f"{type(model).__module__}.{type(model).__qualname__}", "state": digest.hexdigest()}
+
+class CachedResult:
+    """A simulation result read back from the cache."""
+
+    def __init__(self, key: str, meta: Dict[str, Any], events: List[Event], weights: torch.Tensor) -> None:
+        self.key = key
+        self.meta = meta
+        self.events = events
+        self.weights = weights
+
+    @property
+    def results(self) -> Dict[str, Any]:
+        return self.meta["results"]
+
+    def load_into(self, model: nn.Module) -> None:
+        """Copy the cached final weights into `model` in place."""
+        state_dict = model.state_dict()
+        layout = FlatStateLayout(state_dict)
+        if layout.keys() != self.meta["keys"] or layout.numel != self.weights.numel():
+            raise ValueError(f"Cached result {self.key} does not match the model's state_dict")
+        layout.load_into(state_dict, self.weights)
+
+class ResultCache:
+    """
+    On-disk store of finished simulations, addressed by a hash of everything
+    that determines their outcome (see `configuration_key`).
+
+    Holds each run's event stream and final weights, so a deterministic run
+    that was seen before can be replayed instead of trained. The store is kept
+    under `max_bytes` by evicting the least recently used entries after every
+    write. Entries are only ever replaced by renames, so processes can share
+    one store; a lookup that loses a race with an eviction is a miss.
+    """
+
+    def __init__(self, root: str, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """Read the entry for `key` and mark it as used; None (a miss) if there is none."""
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, "meta.json")
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get("version") != RESULT_CACHE_FORMAT_VERSION:
+                raise ValueError(f"Cached result {key} has an unsupported format")
+            with open(os.path.join(entry_dir, "events.jsonl")) as f:
+                events = [json.loads(line) for line in f]
+            weights = torch.from_numpy(np.load(os.path.join(entry_dir, "weights.npy")))
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            RESULT_CACHE_EVENTS.inc(outcome="miss")
+            return None
+        RESULT_CACHE_EVENTS.inc(outcome="hit")
+        return CachedResult(key, meta, events, weights)
+
+    @torch.no_grad()
+    def put(
+        self,
+        key: str,
+        configuration: Dict[str, Any],
+        events: List[Event],
+        model: nn.Module,
+        results: Dict[str, Any]
+    ) -> int:
+        """
+        Store a finished run's events and `model`'s final weights under `key`,
+        then evict least recently used entries until the store fits again.
+
+        Returns:
+            int: The number of bytes written (0 if the entry alone exceeds
+            `max_bytes`, or another process stored it first).
+        """
+        state_dict = model.state_dict()
+        layout = FlatStateLayout(state_dict)
+        os.makedirs(self.root, exist_ok=True)
+        tmp_dir = os.path.join(self.root, f".{key}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            np.save(os.path.join(tmp_dir, "weights.npy"), layout.flatten(state_dict).numpy())
+            with open(os.path.join(tmp_dir, "events.jsonl"), "w") as f:
+                for event in events:
+                    f.write(json.dumps(event, separators=(",", ":")))
+                    f.write("\n")
+            num_bytes = sum(entry.stat().st_size for entry in os.scandir(tmp_dir))
+            meta = {
+                "version": RESULT_CACHE_FORMAT_VERSION,
+                "key": key,
+                "configuration": configuration,
+                "keys": layout.keys(),
+                "results": results,
+                "num_bytes": num_bytes,
+                "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+            }
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump(meta, f, default=str)
+            num_bytes += os.path.getsize(os.path.join(tmp_dir, "meta.json"))
+            if num_bytes > self.max_bytes or os.path.isdir(self._entry_dir(key)):
+                return 0
+            os.replace(tmp_dir, self._entry_dir(key))
+        except OSError:
+            # Another process renamed the same entry into place first.
+            return 0
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        RESULT_CACHE_EVENTS.inc(outcome="store")
+        self.evict(keep=key)
+        return num_bytes
+
+    def entries(self) -> List[Tuple[str, float, int]]:
+        """(key, last used timestamp, bytes) of every entry, least recently used first."""
+        if not os.path.isdir(self.root):
+            return []
+        entries = []
+        for name in os.listdir(self.root):
+            entry_dir = self._entry_dir(name)
+            if name.startswith("."):
+                continue
+            try:
+                last_used = os.path.getmtime(os.path.join(entry_dir, "meta.json"))
+                num_bytes = sum(entry.stat().st_size for entry in os.scandir(entry_dir))
+            except OSError:
+                continue
+            entries.append((name, last_used, num_bytes))
+        return sorted(entries, key=lambda entry: entry[1])
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Delete least recently used entries (other than `keep`) until the store
+        is within `max_bytes`.
+
+        Returns:
+            int: The number of entries deleted.
+        """
+        entries = self.entries()
+        total = sum(num_bytes for _, _, num_bytes in entries)
+        evicted = 0
+        for key, _, num_bytes in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= num_bytes
+            evicted += 1
+        if evicted:
+            RESULT_CACHE_EVENTS.inc(evicted, outcome="evict")
+        return evicted
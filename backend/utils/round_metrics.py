@@ -0,0 +1,127 @@
+# backend/utils/round_metrics.py
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import delete, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import RoundMetric
+from utils.events import Event
+from utils.instrumentation import phase
+
+# The `client` of a round's own row (average loss, test scores, duration).
+GLOBAL_CLIENT = -1
+
+# Columns replaced when a round is written again (e.g. re-run after a resume).
+_VALUE_COLUMNS = ("loss", "num_samples", "test_loss", "test_accuracy", "duration_s")
+
+class RoundMetricsWriter:
+    """
+    Buffers a simulation's client_result and round_summary events as
+    `round_metrics` rows and writes them every `flush_every_rounds` rounds,
+    in one bulk upsert per flush on its own session.
+
+    Rows are held until `simulation_id` is known, so runs whose record is
+    only created at the end can still be written then. A round written again
+    (after resuming from a checkpoint) replaces the earlier rows.
+
+    A client can report more than once in a round (the asynchronous engine
+    may train it again before the buffer is applied); its results are merged
+    into one row with the samples summed and the losses and test scores
+    weighted by samples.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        simulation_id: Optional[int] = None,
+        flush_every_rounds: int = 10,
+        include_clients: bool = True
+    ) -> None:
+        self.session_factory = session_factory
+        self.simulation_id = simulation_id
+        self.flush_every_rounds = max(flush_every_rounds, 1)
+        self.include_clients = include_clients
+        # Buffered rows by (client, round), the table's key within a simulation.
+        self._rows: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self._rounds_buffered = 0
+
+    def _add_client_result(self, event: Event) -> None:
+        row = {
+            "client": event["client"],
+            "round": event["round"],
+            "loss": event["loss"],
+            "num_samples": event["num_samples"],
+            "test_loss": event.get("test_loss"),
+            "test_accuracy": event.get("test_accuracy"),
+            "duration_s": None,
+        }
+        key = (row["client"], row["round"])
+        previous = self._rows.get(key)
+        if previous is not None:
+            num_samples = previous["num_samples"] + row["num_samples"]
+            for name in ("loss", "test_loss", "test_accuracy"):
+                if previous[name] is None:
+                    continue
+                if row[name] is None:
+                    row[name] = previous[name]
+                elif num_samples > 0:
+                    row[name] = (
+                        previous[name] * previous["num_samples"] + row[name] * row["num_samples"]
+                    ) / num_samples
+            row["num_samples"] = num_samples
+        self._rows[key] = row
+
+    def add(self, event: Event) -> None:
+        event_type = event["type"]
+        if event_type == "client_result" and self.include_clients:
+            self._add_client_result(event)
+        elif event_type == "round_summary":
+            self._rows[(GLOBAL_CLIENT, event["round"])] = {
+                "client": GLOBAL_CLIENT,
+                "round": event["round"],
+                "loss": event["avg_loss"],
+                "num_samples": event["num_samples"],
+                "test_loss": event.get("test_loss"),
+                "test_accuracy": event.get("test_accuracy"),
+                "duration_s": event["duration_s"],
+            }
+            self._rounds_buffered += 1
+            if self._rounds_buffered >= self.flush_every_rounds:
+                self.flush()
+
+    def flush(self) -> int:
+        """
+        Write the buffered rows in one transaction.
+
+        Returns:
+            int: The number of rows written (0 while `simulation_id` is unknown).
+        """
+        if not self._rows or self.simulation_id is None:
+            return 0
+        rows = [dict(row, simulation_id=self.simulation_id) for row in self._rows.values()]
+        with phase("metrics_flush"), self.session_factory() as db, db.begin():
+            upsert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(db.get_bind().dialect.name)
+            if upsert is not None:
+                statement = upsert(RoundMetric)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[RoundMetric.simulation_id, RoundMetric.client, RoundMetric.round],
+                    set_={name: statement.excluded[name] for name in _VALUE_COLUMNS},
+                )
+                db.execute(statement, rows)
+            else:
+                # Delete exactly the rows about to be written, one statement per round.
+                clients_by_round: Dict[int, List[int]] = {}
+                for client, round_num in self._rows:
+                    clients_by_round.setdefault(round_num, []).append(client)
+                for round_num, clients in clients_by_round.items():
+                    db.execute(
+                        delete(RoundMetric).where(
+                            RoundMetric.simulation_id == self.simulation_id,
+                            RoundMetric.round == round_num,
+                            RoundMetric.client.in_(clients),
+                        )
+                    )
+                db.execute(insert(RoundMetric), rows)
+        self._rows = {}
+        self._rounds_buffered = 0
+        return len(rows)
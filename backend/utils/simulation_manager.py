@@ -1,82 +1,397 @@
 # backend/utils/simulation_manager.py
 
 import datetime
+import functools
+import random
 from sqlalchemy.orm import Session
 import torch
 import torch.nn as nn
 import torch.optim as optim
+from config import settings
+from database import SessionLocal
 from models import SimulationRecord  # SQLAlchemy model
-from models import MNISTModel       # Our PyTorch model
+from nn_models import reset_parameters
+from typing import List, Optional
+from utils.checkpoint import SimulationCheckpointer
+from utils.compression import make_codec
+from utils.contribution import make_contribution_scorer
+from utils.evaluation import make_evaluator
+from utils.fast_compute import FastCompute
+from utils.result_cache import RESULT_CACHE_FORMAT_VERSION, ResultCache, configuration_key, model_fingerprint
+from utils.round_metrics import RoundMetricsWriter
 from utils.training_loop import training_loop_stream
-from utils.token_rewards import calculate_reward, global_ledger
-from torchvision import datasets, transforms
-from torch.utils.data import DataLoader
-
-def load_mnist_dataloader(batch_size: int = 32) -> DataLoader:
-    transform = transforms.Compose([
-        transforms.ToTensor(),
-        transforms.Normalize((0.1307,), (0.3081,))
-    ])
-    dataset = datasets.MNIST(root="./data", train=True, download=True, transform=transform)
-    return DataLoader(dataset, batch_size=batch_size, shuffle=True)
-
-def sse_format(message: str) -> str:
-    """Format a message as an SSE event."""
-    return f"data: {message}\n\n"
+from utils.token_rewards import credit_contributions, credit_rewards
+from utils.mnist_cache import MNISTTensorDataset, TensorBatchLoader, mnist_cache_version
+from utils.data_partition import partition_dataset, create_data_loaders
+from utils.instrumentation import phase
+from utils.events import (
+    EventCoalescer,
+    done_event,
+    encode_batch,
+    error_event,
+    log_event,
+    reward_event,
+    sse_format,
+)
+
+# Settings besides the run's parameters that change what a simulation computes.
+RESULT_SETTINGS = (
+    "TRAINING_NUM_WORKERS",
+    "TRAINING_VECTORIZED",
+    "TRAINING_PERSISTENT_OPTIMIZER_STATE",
+    "TRAINING_FAST_COMPUTE",
+    "TRAINING_COMPILE",
+    "TRAINING_BF16_AUTOCAST",
+    "ASYNC_SERVER_LR",
+    "UPDATE_CODEC",
+    "UPDATE_CODEC_TOPK_FRACTION",
+    "UPDATE_CODEC_ERROR_FEEDBACK",
+    "EVALUATION_EVERY_ROUNDS",
+    "EVALUATION_SAMPLE_SIZE",
+    "EVALUATION_BATCH_SIZE",
+    "EVALUATION_CLIENTS",
+    "CONTRIBUTION_SCORING",
+    "CONTRIBUTION_SAMPLE_SIZE",
+    "CONTRIBUTION_PERMUTATIONS",
+    "CONTRIBUTION_TRUNCATION_TOLERANCE",
+    "CONTRIBUTION_MAX_EVALUATIONS",
+    "CONTRIBUTION_TIME_BUDGET_SECONDS",
+)
+
+@functools.lru_cache(maxsize=1)
+def load_mnist_train_set() -> MNISTTensorDataset:
+    """The memory-mapped MNIST training cache, opened once per process and shared by every simulation."""
+    return MNISTTensorDataset(root="./data", train=True, download=True)
+
+def load_mnist_dataloader(batch_size: int = 32) -> TensorBatchLoader:
+    # Batches are sliced from the pre-normalized, memory-mapped MNIST cache.
+    return TensorBatchLoader(load_mnist_train_set(), batch_size=batch_size, shuffle=True)
+
+def load_client_dataloaders(
+    num_clients: int,
+    batch_size: int = 32,
+    dirichlet_alpha: Optional[float] = None,
+    seed: Optional[int] = None,
+    generator: Optional[torch.Generator] = None
+) -> List[TensorBatchLoader]:
+    """Split the MNIST training set into one shard (and loader) per client, drawing from `generator` if given."""
+    shards = partition_dataset(
+        load_mnist_train_set(), num_clients, alpha=dirichlet_alpha, seed=seed, generator=generator
+    )
+    return create_data_loaders(shards, batch_size=batch_size, shuffle=True, generator=generator)
 
 def run_simulation_stream(
     db: Session, 
     num_rounds: int, 
     num_clients: int, 
     fraction_fit: float, 
-    global_model: nn.Module
+    global_model: nn.Module,
+    dirichlet_alpha: Optional[float] = None,
+    verbosity: str = "clients",
+    flush_interval_ms: int = 0
+):
+    """Run a simulation, yielding coalesced batches of JSON events as SSE messages."""
+    coalescer = EventCoalescer(verbosity, flush_interval_ms, settings.SSE_MAX_CLIENT_RESULTS_PER_ROUND)
+    for event in run_simulation_events(
+        db, num_rounds, num_clients, fraction_fit, global_model, dirichlet_alpha
+    ):
+        batch = coalescer.add(event)
+        if batch:
+            yield sse_format(encode_batch(batch))
+    batch = coalescer.flush()
+    if batch:
+        yield sse_format(encode_batch(batch))
+
+def run_simulation_events(
+    db: Session,
+    num_rounds: int,
+    num_clients: int,
+    fraction_fit: float,
+    global_model: nn.Module,
+    dirichlet_alpha: Optional[float] = None,
+    simulation_record: Optional[SimulationRecord] = None,
+    partition_seed: Optional[int] = None,
+    resume: bool = False,
+    aggregation: str = "sync",
+    async_buffer_size: Optional[int] = None,
+    skip_rewards: bool = False
 ):
-    start_time = datetime.datetime.utcnow()
-    yield sse_format(f"Starting simulation at {start_time.isoformat()}Z")
+    """
+    Run a simulation, yielding event dicts (see `utils.events`).
+
+    If `simulation_record` is given (e.g. created when a job was submitted), it
+    is completed in place; otherwise a new record is saved at the end. Runs
+    with a record are checkpointed every CHECKPOINT_EVERY_ROUNDS rounds, and
+    `resume=True` continues the record's run from its latest checkpoint.
+
+    A run with a seed draws the initial weights of `global_model` (see
+    `nn_models.reset_parameters`), its client shards and their shuffling from
+    one torch.Generator seeded with it, never from torch's global RNG, so
+    runs sharing a process do not perturb each other.
+
+    A seeded run (`partition_seed`) that is not resumed is looked up in the
+    result cache by its whole configuration (parameters, settings, initial
+    model weights, data and torch version). On a hit its training events and
+    final weights are replayed instead of training, and no rewards are
+    credited again; otherwise the finished run is stored there.
+
+    With `skip_rewards`, nothing is credited to the ledger (e.g. for the
+    configurations of a parameter sweep, which are trials rather than
+    contributions).
+    """
+    if resume and simulation_record is not None:
+        start_time = simulation_record.started_at
+        yield log_event(f"Resuming simulation {simulation_record.id} at {datetime.datetime.utcnow().isoformat()}Z")
+    else:
+        start_time = datetime.datetime.utcnow()
+        yield log_event(f"Starting simulation at {start_time.isoformat()}Z")
+
+    # Each client trains on its own shard; None for dirichlet_alpha means an IID split.
+    if dirichlet_alpha is None:
+        dirichlet_alpha = settings.PARTITION_DIRICHLET_ALPHA
+    if partition_seed is None:
+        partition_seed = settings.PARTITION_SEED
+    if async_buffer_size is None:
+        async_buffer_size = settings.ASYNC_BUFFER_SIZE
+    seeded = partition_seed is not None
+
+    checkpointer = None
+    checkpoint = None
+    if simulation_record is not None and (settings.CHECKPOINT_EVERY_ROUNDS > 0 or resume):
+        if partition_seed is None:
+            # A resumed run must see the same client shards, so fix the seed up front.
+            partition_seed = random.randrange(2 ** 31)
+        checkpointer = SimulationCheckpointer(
+            settings.CHECKPOINT_DIR,
+            simulation_record.id,
+            every_rounds=settings.CHECKPOINT_EVERY_ROUNDS,
+            keep_last=settings.CHECKPOINT_KEEP_LAST,
+            full_every=settings.CHECKPOINT_FULL_EVERY,
+            parameters={
+                "num_rounds": num_rounds,
+                "num_clients": num_clients,
+                "fraction_fit": fraction_fit,
+                "dirichlet_alpha": dirichlet_alpha,
+                "partition_seed": partition_seed,
+                "aggregation": aggregation,
+                "async_buffer_size": async_buffer_size,
+            },
+        )
+        if resume:
+            checkpoint = checkpointer.latest()
+            if checkpoint is None:
+                raise ValueError(f"Simulation {simulation_record.id} has no checkpoint to resume from")
+
+    generator = None
+    if partition_seed is not None:
+        generator = torch.Generator().manual_seed(partition_seed)
+        # Also on resume, so the generator is where it was when the shards were drawn.
+        reset_parameters(global_model, generator)
 
-    train_loader = load_mnist_dataloader(batch_size=32)
     criterion = nn.CrossEntropyLoss()
-    optimizer_fn = lambda params: optim.Adam(params, lr=0.001)
-
-    # Run the training loop as a generator that yields log messages
-    for log in training_loop_stream(
-        global_model=global_model,
-        num_rounds=num_rounds,
-        client_dataloader=train_loader,
-        criterion=criterion,
-        optimizer_fn=optimizer_fn,
-        num_clients=num_clients,
-        device="cpu"  # Change to "cuda" if available
-    ):
-        yield sse_format(log)
+    # A partial (unlike a lambda) can be pickled into training worker processes.
+    optimizer_fn = functools.partial(optim.Adam, lr=0.001)
+
+    result_cache = None
+    cache_key = None
+    cached = None
+    if settings.RESULT_CACHE_ENABLED and seeded and checkpoint is None:
+        result_cache = ResultCache(settings.RESULT_CACHE_DIR, settings.RESULT_CACHE_MAX_BYTES)
+        cache_configuration = {
+            "version": RESULT_CACHE_FORMAT_VERSION,
+            "parameters": {
+                "num_rounds": num_rounds,
+                "num_clients": num_clients,
+                "fraction_fit": fraction_fit,
+                "dirichlet_alpha": dirichlet_alpha,
+                "partition_seed": partition_seed,
+                "aggregation": aggregation,
+                "async_buffer_size": async_buffer_size,
+            },
+            "training": {"batch_size": 32, "criterion": repr(criterion), "optimizer": repr(optimizer_fn)},
+            # A replay credits nothing, so only a run that was paid may stand in for one that would be.
+            "skip_rewards": skip_rewards,
+            "settings": {name: getattr(settings, name) for name in RESULT_SETTINGS},
+            "model": model_fingerprint(global_model),
+            "data": mnist_cache_version(),
+            "torch": torch.__version__,
+        }
+        cache_key = configuration_key(cache_configuration)
+        cached = result_cache.get(cache_key)
+
+    metrics_writer = None
+    if settings.ROUND_METRICS_ENABLED:
+        metrics_writer = RoundMetricsWriter(
+            SessionLocal,
+            simulation_record.id if simulation_record is not None else None,
+            flush_every_rounds=settings.ROUND_METRICS_FLUSH_EVERY_ROUNDS,
+            include_clients=settings.ROUND_METRICS_CLIENTS,
+        )
+
+    contribution = None
+    if cached is not None:
+        # A replay needs neither the client shards nor the test split.
+        yield log_event(f"Replaying cached result {cache_key[:12]} of an identical run")
+        training_events = (event for event in cached.events)
+    else:
+        with phase("partition"):
+            client_loaders = load_client_dataloaders(
+                num_clients, batch_size=32, dirichlet_alpha=dirichlet_alpha, seed=partition_seed,
+                generator=generator,
+            )
+        split = "IID" if dirichlet_alpha is None else f"Dirichlet(alpha={dirichlet_alpha})"
+        yield log_event(f"Partitioned MNIST into {num_clients} {split} client shards")
+        # The global model is scored on the MNIST test split; the scores drive the reward.
+        evaluator = make_evaluator(
+            batch_size=settings.EVALUATION_BATCH_SIZE,
+            sample_size=settings.EVALUATION_SAMPLE_SIZE,
+            seed=partition_seed,
+            every_rounds=settings.EVALUATION_EVERY_ROUNDS,
+            evaluate_clients=settings.EVALUATION_CLIENTS,
+        )
+        if settings.CONTRIBUTION_SCORING:
+            contribution = make_contribution_scorer(
+                sample_size=settings.CONTRIBUTION_SAMPLE_SIZE,
+                batch_size=settings.EVALUATION_BATCH_SIZE,
+                num_permutations=settings.CONTRIBUTION_PERMUTATIONS,
+                truncation_tolerance=settings.CONTRIBUTION_TRUNCATION_TOLERANCE,
+                max_evaluations=settings.CONTRIBUTION_MAX_EVALUATIONS,
+                time_budget_s=settings.CONTRIBUTION_TIME_BUDGET_SECONDS,
+                seed=partition_seed,
+            )
+
+        # Run the training loop as a generator that yields progress events
+        training_events = training_loop_stream(
+            global_model=global_model,
+            num_rounds=num_rounds,
+            client_dataloader=client_loaders,
+            criterion=criterion,
+            optimizer_fn=optimizer_fn,
+            num_clients=num_clients,
+            device="cpu",  # Change to "cuda" if available
+            num_workers=settings.TRAINING_NUM_WORKERS,
+            threads_per_worker=settings.TRAINING_THREADS_PER_WORKER,
+            mp_start_method=settings.TRAINING_MP_START_METHOD,
+            vectorized=settings.TRAINING_VECTORIZED,
+            fraction_fit=fraction_fit,
+            seed=partition_seed,
+            codec=make_codec(
+                settings.UPDATE_CODEC,
+                topk_fraction=settings.UPDATE_CODEC_TOPK_FRACTION,
+                error_feedback=settings.UPDATE_CODEC_ERROR_FEEDBACK,
+                seed=partition_seed,
+            ),
+            checkpointer=checkpointer,
+            resume_from=checkpoint,
+            data_generator=generator,
+            aggregation=aggregation,
+            async_buffer_size=async_buffer_size,
+            server_lr=settings.ASYNC_SERVER_LR,
+            evaluator=evaluator,
+            contribution=contribution,
+            persistent_optimizer_state=settings.TRAINING_PERSISTENT_OPTIMIZER_STATE,
+            fast_compute=FastCompute(
+                compile=settings.TRAINING_COMPILE,
+                bf16=settings.TRAINING_BF16_AUTOCAST,
+                backend=settings.TRAINING_COMPILE_BACKEND,
+                calibration_steps=settings.TRAINING_FAST_COMPUTE_CALIBRATION_STEPS,
+                intra_op_threads=settings.TRAINING_INTRA_OP_THREADS,
+                inter_op_threads=settings.TRAINING_INTER_OP_THREADS,
+            ) if settings.TRAINING_FAST_COMPUTE else None,
+        )
+    # The events of a run that is not replayed are kept for the result cache.
+    recorded = [] if result_cache is not None and cached is None else None
+    try:
+        for event in training_events:
+            if metrics_writer is not None:
+                metrics_writer.add(event)
+            if recorded is not None:
+                recorded.append(event)
+            yield event
+    finally:
+        # Also keeps the rounds of a run that is cancelled or fails part way.
+        training_events.close()
+        if metrics_writer is not None:
+            metrics_writer.flush()
 
     finish_time = datetime.datetime.utcnow()
-    yield sse_format(f"Finishing simulation at {finish_time.isoformat()}Z")
-
-    # Calculate reward based on loss improvement.
-    previous_metric = 0.5  # Example baseline
-    # For demonstration, assume the final average loss is 0.4
-    current_metric = 0.4  
-    reward = calculate_reward(previous_metric, current_metric, scaling_factor=10.0)
-    yield sse_format(f"Calculated reward: {reward:.4f}")
-    global_ledger.record_transaction(1, reward, "Reward for simulation performance improvement")
-    new_balance = global_ledger.get_balance(1)
-    yield sse_format(f"Updated token balance for user 1: {new_balance:.2f}")
-
-    simulation_record = SimulationRecord(
-        num_rounds=num_rounds,
-        num_clients=num_clients,
-        fraction_fit=fraction_fit,
-        started_at=start_time,
-        finished_at=finish_time,
-        status="Completed"
+    yield log_event(f"Finishing simulation at {finish_time.isoformat()}Z")
+
+    if cached is not None:
+        cached.load_into(global_model)
+        results = cached.results
+    else:
+        _, previous_metric, previous_accuracy = evaluator.history[0]
+        _, current_metric, current_accuracy = evaluator.history[-1]
+        results = {
+            "initial_test_loss": previous_metric,
+            "initial_test_accuracy": previous_accuracy,
+            "test_loss": current_metric,
+            "test_accuracy": current_accuracy,
+        }
+        if recorded is not None:
+            result_cache.put(cache_key, cache_configuration, recorded, global_model, results)
+    previous_metric, previous_accuracy = results["initial_test_loss"], results["initial_test_accuracy"]
+    current_metric, current_accuracy = results["test_loss"], results["test_accuracy"]
+    yield log_event(
+        f"Test loss {previous_metric:.4f} -> {current_metric:.4f}, "
+        f"accuracy {previous_accuracy:.2%} -> {current_accuracy:.2%}"
     )
-    db.add(simulation_record)
+    # Clients are rewarded for their contributions when they were scored, else user 1
+    # for the improvement in test loss from before the first round to after the last.
+    # Credited through the same bulk path as POST /api/incentives/rewards/batch.
+    if cached is not None:
+        # The run's contributions were paid when it first ran.
+        yield log_event("No rewards for a replayed run")
+    elif skip_rewards:
+        yield log_event("No rewards for this run")
+    elif contribution is not None and contribution.rounds_scored:
+        # Client i is paid to user i + 1 for its Shapley value summed over the rounds.
+        clients = sorted(contribution.totals)
+        user_ids = [client + 1 for client in clients]
+        with phase("reward"):
+            rewards, balances = credit_contributions(
+                user_ids, [contribution.totals[client] for client in clients],
+                description="Reward for contribution to the global model"
+            )
+        for user_id, reward in zip(user_ids, rewards):
+            yield reward_event(user_id, float(reward), balances[user_id])
+    else:
+        with phase("reward"):
+            rewards, balances = credit_rewards(
+                [1], [previous_metric], [current_metric],
+                description="Reward for simulation performance improvement"
+            )
+        yield reward_event(1, float(rewards[0]), balances[1])
+
+    if simulation_record is None:
+        simulation_record = SimulationRecord(
+            num_rounds=num_rounds,
+            num_clients=num_clients,
+            fraction_fit=fraction_fit,
+            started_at=start_time,
+        )
+        db.add(simulation_record)
+    simulation_record.finished_at = finish_time
+    simulation_record.status = "Completed"
+    simulation_record.rounds_completed = num_rounds
+    simulation_record.test_loss = current_metric
+    simulation_record.test_accuracy = current_accuracy
     try:
-        db.commit()
-        db.refresh(simulation_record)
-        yield sse_format(f"Simulation record saved with ID: {simulation_record.id}")
+        with phase("db_commit"):
+            db.commit()
+            db.refresh(simulation_record)
+        if metrics_writer is not None and metrics_writer.simulation_id is None:
+            # The record was only created now, so its rounds are written now.
+            metrics_writer.simulation_id = simulation_record.id
+            metrics_writer.flush()
+        yield done_event(
+            simulation_record.id,
+            simulation_record.status,
+            start_time.isoformat() + "Z",
+            finish_time.isoformat() + "Z",
+        )
     except Exception as e:
         db.rollback()
-        yield sse_format(f"Error saving simulation record: {str(e)}")
+        yield error_event(f"Error saving simulation record: {str(e)}")
         raise e
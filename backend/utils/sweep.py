@@ -0,0 +1,266 @@
+# backend/utils/sweep.py
+
+import concurrent.futures
+import datetime
+import itertools
+import math
+import multiprocessing as mp
+import os
+import random
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+from config import settings
+from database import SessionLocal
+from models import SimulationRecord, SimulationSweep
+from utils.job_manager import CANCELLED, COMPLETED, FAILED, QUEUED, RUNNING
+
+# A configuration stopped early by successive halving.
+STOPPED = "Stopped"
+
+def expand_grid(grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of the values in `grid`, as one configuration dict each."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def halving_milestones(num_rounds: int, min_rounds: int, eta: int) -> List[int]:
+    """Rounds at which a run of `num_rounds` rounds is compared: min_rounds * eta^k before the last round."""
+    milestones = []
+    milestone = min_rounds
+    while milestone < num_rounds:
+        milestones.append(milestone)
+        milestone *= eta
+    return milestones
+
+def _should_stop(board, lock, milestone: int, test_loss: float, eta: int) -> bool:
+    # Asynchronous successive halving: record this run's loss at the milestone,
+    # and stop it unless it is among the best 1/eta of the losses recorded
+    # there so far. Runs are only compared once eta of them got this far.
+    with lock:
+        recorded = board.get(milestone, []) + [test_loss]
+        board[milestone] = recorded
+    if len(recorded) < eta:
+        return False
+    cutoff = sorted(recorded)[math.ceil(len(recorded) / eta) - 1]
+    return test_loss > cutoff
+
+def _init_sweep_worker(num_threads: int) -> None:
+    import torch
+
+    # Every worker gets a fixed share of the host's cores, and trains its
+    # clients in-process so that share is all it uses.
+    torch.set_num_threads(num_threads)
+    settings.TRAINING_NUM_WORKERS = 0
+    settings.TRAINING_THREADS_PER_WORKER = num_threads
+
+def _run_configuration(record_id: int, parameters: Dict[str, Any], partition_seed: int,
+                       milestones: List[int], eta: int, board, lock, cancelled) -> Dict[str, Any]:
+    """Worker process: run one configuration of a sweep to completion, an early stop or cancellation."""
+    from nn_models import MNISTModel
+    from utils.simulation_manager import run_simulation_events
+
+    db = SessionLocal()
+    try:
+        record = db.get(SimulationRecord, record_id)
+        if cancelled.is_set():
+            record.status = CANCELLED
+            record.finished_at = datetime.datetime.utcnow()
+            db.commit()
+            return {"id": record_id, "status": CANCELLED}
+        record.status = RUNNING
+        record.started_at = datetime.datetime.utcnow()
+        db.commit()
+
+        outcome = None
+        rounds_completed = 0
+        test_loss = test_accuracy = None
+        # Every configuration draws the same initial weights from the shared seed.
+        events = run_simulation_events(
+            db=db,
+            global_model=MNISTModel(),
+            simulation_record=record,
+            partition_seed=partition_seed,
+            skip_rewards=True,
+            **parameters,
+        )
+        try:
+            for event in events:
+                if event["type"] == "round_summary":
+                    rounds_completed = event["round"]
+                    if "test_loss" in event:
+                        test_loss, test_accuracy = event["test_loss"], event["test_accuracy"]
+                    if (rounds_completed in milestones and test_loss is not None
+                            and _should_stop(board, lock, rounds_completed, test_loss, eta)):
+                        outcome = STOPPED
+                        break
+                if cancelled.is_set():
+                    outcome = CANCELLED
+                    break
+        finally:
+            events.close()
+
+        if outcome is not None:
+            # Stopped runs keep the scores they had reached.
+            record.status = outcome
+            record.finished_at = datetime.datetime.utcnow()
+            record.rounds_completed = rounds_completed
+            record.test_loss = test_loss
+            record.test_accuracy = test_accuracy
+            db.commit()
+        return {"id": record_id, "status": record.status, "rounds_completed": record.rounds_completed}
+    except Exception as e:
+        db.rollback()
+        record = db.get(SimulationRecord, record_id)
+        if record is not None:
+            record.status = FAILED
+            record.finished_at = datetime.datetime.utcnow()
+            db.commit()
+        return {"id": record_id, "status": FAILED, "error": str(e)}
+    finally:
+        db.close()
+
+class SweepManager:
+    """
+    Runs parameter sweeps: many simulations on one host, side by side.
+
+    Each sweep gets a pool of worker processes, at most
+    `max_concurrent_jobs` of them (default: one per CPU), and each worker a
+    fixed budget of `cpu_threads // workers` torch threads, so concurrent
+    simulations share the cores instead of oversubscribing them. Workers
+    outlive the simulations they run, so the memory-mapped training set and
+    the resident test set are loaded once per worker and reused by every
+    configuration it picks up. Every configuration runs against the same
+    client partition.
+
+    Configurations are started cheapest first (rounds x sampled clients), so
+    comparisons become available early. With successive halving, runs are
+    compared at rounds `min_rounds * eta^k` and a run that is not among the
+    best 1/eta (by test loss) of those that reached the same round is stopped
+    there. Every configuration is persisted as a `SimulationRecord` carrying
+    the sweep's id and its result; sweeps run one at a time.
+    """
+
+    def __init__(self, max_concurrent_jobs: Optional[int] = None, cpu_threads: Optional[int] = None) -> None:
+        self.cpu_threads = cpu_threads or os.cpu_count() or 1
+        self.max_concurrent_jobs = max_concurrent_jobs or self.cpu_threads
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="sweep")
+        self._cancel_requested: Dict[int, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        configurations: List[Dict[str, Any]],
+        successive_halving: bool = True,
+        eta: int = 3,
+        min_rounds: int = 1,
+        seed: Optional[int] = None
+    ) -> int:
+        """
+        Persist the sweep and a queued record per configuration, and schedule it.
+
+        Returns:
+            int: The sweep id.
+        """
+        if seed is None:
+            seed = settings.PARTITION_SEED if settings.PARTITION_SEED is not None else random.randrange(2 ** 31)
+        db = SessionLocal()
+        try:
+            sweep = SimulationSweep(num_configurations=len(configurations), status=QUEUED)
+            db.add(sweep)
+            db.flush()
+            records = [
+                SimulationRecord(
+                    num_rounds=configuration["num_rounds"],
+                    num_clients=configuration["num_clients"],
+                    fraction_fit=configuration["fraction_fit"],
+                    status=QUEUED,
+                    sweep_id=sweep.id,
+                )
+                for configuration in configurations
+            ]
+            db.add_all(records)
+            db.commit()
+            sweep_id = sweep.id
+            jobs = [(record.id, configuration) for record, configuration in zip(records, configurations)]
+        finally:
+            db.close()
+
+        with self._lock:
+            self._cancel_requested[sweep_id] = threading.Event()
+        self._executor.submit(self._run, sweep_id, jobs, successive_halving, eta, min_rounds, seed)
+        return sweep_id
+
+    def cancel(self, sweep_id: int) -> bool:
+        """Ask a queued or running sweep to stop; returns False if it is not active."""
+        with self._lock:
+            event = self._cancel_requested.get(sweep_id)
+        if event is None:
+            return False
+        event.set()
+        return True
+
+    def shutdown(self) -> None:
+        with self._lock:
+            events = list(self._cancel_requested.values())
+        for event in events:
+            event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _set_sweep_status(self, sweep_id: int, status: str) -> None:
+        db = SessionLocal()
+        try:
+            sweep = db.get(SimulationSweep, sweep_id)
+            sweep.status = status
+            if status in (COMPLETED, CANCELLED, FAILED):
+                sweep.finished_at = datetime.datetime.utcnow()
+                # Configurations that never started are cancelled with the sweep.
+                db.query(SimulationRecord).filter(
+                    SimulationRecord.sweep_id == sweep_id, SimulationRecord.status == QUEUED
+                ).update({"status": CANCELLED, "finished_at": sweep.finished_at})
+            db.commit()
+        finally:
+            db.close()
+
+    def _run(self, sweep_id: int, jobs: List, successive_halving: bool, eta: int,
+             min_rounds: int, seed: int) -> None:
+        cancel_requested = self._cancel_requested[sweep_id]
+        status = FAILED
+        try:
+            if cancel_requested.is_set():
+                status = CANCELLED
+                return
+            self._set_sweep_status(sweep_id, RUNNING)
+            num_workers = max(1, min(len(jobs), self.max_concurrent_jobs))
+            threads_per_job = max(1, self.cpu_threads // num_workers)
+            jobs = sorted(jobs, key=lambda job: job[1]["num_rounds"] * job[1]["num_clients"] * job[1]["fraction_fit"])
+            context = mp.get_context("spawn")
+            with context.Manager() as manager, concurrent.futures.ProcessPoolExecutor(
+                max_workers=num_workers, mp_context=context,
+                initializer=_init_sweep_worker, initargs=(threads_per_job,),
+            ) as pool:
+                # The results at every milestone, shared by all workers.
+                board, lock, cancelled = manager.dict(), manager.Lock(), manager.Event()
+                futures = [
+                    pool.submit(
+                        _run_configuration, record_id, configuration, seed,
+                        halving_milestones(configuration["num_rounds"], min_rounds, eta) if successive_halving else [],
+                        eta, board, lock, cancelled,
+                    )
+                    for record_id, configuration in jobs
+                ]
+                pending = set(futures)
+                while pending:
+                    _, pending = concurrent.futures.wait(pending, timeout=1.0)
+                    if cancel_requested.is_set() and not cancelled.is_set():
+                        cancelled.set()
+                        for future in pending:
+                            future.cancel()
+            status = CANCELLED if cancel_requested.is_set() else COMPLETED
+        finally:
+            self._set_sweep_status(sweep_id, status)
+            with self._lock:
+                self._cancel_requested.pop(sweep_id, None)
+
+sweep_manager = SweepManager(
+    max_concurrent_jobs=settings.SWEEP_MAX_CONCURRENT_JOBS,
+    cpu_threads=settings.SWEEP_CPU_THREADS,
+)
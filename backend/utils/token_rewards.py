@@ -1,7 +1,15 @@
 # backend/utils/token_rewards.py
 
 import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from config import settings
+from database import SessionLocal
+from models import LedgerTransaction, TokenBalance
+from utils.instrumentation import LEDGER_SECONDS, LEDGER_TRANSACTIONS, timed
 
 def calculate_reward(previous_metric: float, current_metric: float, scaling_factor: float = 10.0) -> float:
     """
@@ -14,10 +22,37 @@ def calculate_reward(previous_metric: float, current_metric: float, scaling_fact
         return improvement * scaling_factor
     return 0.0
 
+def calculate_rewards(
+    previous_metrics: Sequence[float],
+    current_metrics: Sequence[float],
+    scaling_factor: float = 10.0
+) -> np.ndarray:
+    """
+    Vectorized `calculate_reward` over arrays of metrics (lower is better).
+
+    Returns:
+        np.ndarray: One non-negative reward per pair of metrics.
+    """
+    improvement = np.asarray(previous_metrics, dtype=np.float64) - np.asarray(current_metrics, dtype=np.float64)
+    return np.maximum(improvement, 0.0) * scaling_factor
+
+def _sum_by_user(user_ids: Sequence[int], amounts: Sequence[float]) -> Dict[int, float]:
+    totals: Dict[int, float] = {}
+    for user_id, amount in zip(user_ids, amounts):
+        totals[user_id] = totals.get(user_id, 0.0) + amount
+    return totals
+
 class TokenLedger:
+    """
+    Process-local ledger, kept for tests and standalone scripts.
+
+    Balances are maintained on every write, so `get_balance` is O(1).
+    """
+
     def __init__(self) -> None:
         # Ledger is a dictionary mapping user IDs to a list of transaction records.
         self.ledger: Dict[int, List[Dict[str, Any]]] = {}
+        self.balances: Dict[int, float] = {}
 
     def record_transaction(self, user_id: int, amount: float, description: str = "") -> None:
         transaction = {
@@ -28,11 +63,20 @@ class TokenLedger:
         if user_id not in self.ledger:
             self.ledger[user_id] = []
         self.ledger[user_id].append(transaction)
+        self.balances[user_id] = self.balances.get(user_id, 0.0) + amount
+
+    def record_transactions(
+        self,
+        user_ids: Sequence[int],
+        amounts: Sequence[float],
+        description: str = ""
+    ) -> Dict[int, float]:
+        for user_id, amount in zip(user_ids, amounts):
+            self.record_transaction(int(user_id), float(amount), description)
+        return {user_id: self.balances[user_id] for user_id in _sum_by_user(user_ids, amounts)}
 
     def get_balance(self, user_id: int) -> float:
-        if user_id not in self.ledger:
-            return 0.0
-        return sum(tx["amount"] for tx in self.ledger[user_id])
+        return self.balances.get(user_id, 0.0)
 
     def transfer_tokens(self, sender_id: int, receiver_id: int, amount: float, description: str = "") -> None:
         if self.get_balance(sender_id) < amount:
@@ -40,5 +84,206 @@ class TokenLedger:
         self.record_transaction(sender_id, -amount, f"Transfer to user {receiver_id}: {description}")
         self.record_transaction(receiver_id, amount, f"Transfer from user {sender_id}: {description}")
 
+class SQLTokenLedger:
+    """
+    Token ledger persisted in the application database.
+
+    Every credit or debit appends a row to `ledger_transactions` and adjusts the
+    user's row in `token_balances` in the same database transaction, so balance
+    reads are a primary-key lookup and history survives restarts and is shared
+    by all uvicorn workers.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session]) -> None:
+        self.session_factory = session_factory
+
+    # Balances are read back in chunks to stay under SQLite's bound-parameter limit.
+    BALANCE_QUERY_CHUNK = 500
+
+    @staticmethod
+    def _adjust_balances(db: Session, totals: Dict[int, float], now: datetime.datetime) -> None:
+        # Rows are touched in user_id order so concurrent writers lock them in
+        # the same order. A single (executemany) upsert where the dialect
+        # supports it, else update-then-insert per user.
+        rows = [
+            {"user_id": user_id, "balance": amount, "updated_at": now}
+            for user_id, amount in sorted(totals.items())
+        ]
+        upsert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(db.get_bind().dialect.name)
+        if upsert is not None:
+            statement = upsert(TokenBalance)
+            statement = statement.on_conflict_do_update(
+                index_elements=[TokenBalance.user_id],
+                set_={
+                    "balance": TokenBalance.balance + statement.excluded.balance,
+                    "updated_at": statement.excluded.updated_at,
+                },
+            )
+            db.execute(statement, rows)
+            return
+
+        for row in rows:
+            result = db.execute(
+                update(TokenBalance)
+                .where(TokenBalance.user_id == row["user_id"])
+                .values(balance=TokenBalance.balance + row["balance"], updated_at=now)
+            )
+            if result.rowcount == 0:
+                db.execute(insert(TokenBalance).values(**row))
+
+    def _append(self, db: Session, user_id: int, amount: float, description: str) -> None:
+        now = datetime.datetime.utcnow()
+        db.add(LedgerTransaction(user_id=user_id, amount=amount, description=description, created_at=now))
+        self._adjust_balances(db, {user_id: amount}, now)
+        LEDGER_TRANSACTIONS.inc()
+
+    @timed(LEDGER_SECONDS, operation="record_transaction")
+    def record_transaction(self, user_id: int, amount: float, description: str = "") -> None:
+        with self.session_factory() as db, db.begin():
+            self._append(db, user_id, amount, description)
+
+    @timed(LEDGER_SECONDS, operation="record_transactions")
+    def record_transactions(
+        self,
+        user_ids: Sequence[int],
+        amounts: Sequence[float],
+        description: str = ""
+    ) -> Dict[int, float]:
+        """
+        Append one transaction per (user, amount) pair in a single database
+        transaction, using one bulk INSERT for the ledger rows and one upsert
+        for the balances.
+
+        Returns:
+            Dict[int, float]: The new balance of every user that was credited.
+        """
+        user_ids = [int(user_id) for user_id in user_ids]
+        amounts = [float(amount) for amount in amounts]
+        if not user_ids:
+            return {}
+        now = datetime.datetime.utcnow()
+        totals = _sum_by_user(user_ids, amounts)
+        with self.session_factory() as db, db.begin():
+            db.execute(
+                insert(LedgerTransaction),
+                [
+                    {"user_id": user_id, "amount": amount, "description": description, "created_at": now}
+                    for user_id, amount in zip(user_ids, amounts)
+                ],
+            )
+            self._adjust_balances(db, totals, now)
+            balances: Dict[int, float] = {}
+            touched = list(totals)
+            for start in range(0, len(touched), self.BALANCE_QUERY_CHUNK):
+                chunk = touched[start:start + self.BALANCE_QUERY_CHUNK]
+                balances.update(db.execute(
+                    select(TokenBalance.user_id, TokenBalance.balance).where(TokenBalance.user_id.in_(chunk))
+                ).all())
+        LEDGER_TRANSACTIONS.inc(len(user_ids))
+        return balances
+
+    @timed(LEDGER_SECONDS, operation="get_balance")
+    def get_balance(self, user_id: int) -> float:
+        with self.session_factory() as db:
+            balance = db.execute(
+                select(TokenBalance.balance).where(TokenBalance.user_id == user_id)
+            ).scalar_one_or_none()
+        return balance or 0.0
+
+    @timed(LEDGER_SECONDS, operation="transfer_tokens")
+    def transfer_tokens(self, sender_id: int, receiver_id: int, amount: float, description: str = "") -> None:
+        """Move tokens atomically; raises ValueError if the sender's balance is too low."""
+        with self.session_factory() as db, db.begin():
+            now = datetime.datetime.utcnow()
+            # Debit only if the funds are there, in a single conditional UPDATE so
+            # two concurrent transfers cannot both spend the same balance.
+            debited = db.execute(
+                update(TokenBalance)
+                .where(TokenBalance.user_id == sender_id, TokenBalance.balance >= amount)
+                .values(balance=TokenBalance.balance - amount, updated_at=now)
+            )
+            if debited.rowcount == 0:
+                raise ValueError("Insufficient funds for transfer")
+            db.add(LedgerTransaction(
+                user_id=sender_id,
+                amount=-amount,
+                description=f"Transfer to user {receiver_id}: {description}",
+                created_at=now,
+            ))
+            LEDGER_TRANSACTIONS.inc()
+            self._append(db, receiver_id, amount, f"Transfer from user {sender_id}: {description}")
+
+    @timed(LEDGER_SECONDS, operation="get_transactions")
+    def get_transactions(
+        self,
+        user_id: int,
+        limit: int = 50,
+        cursor: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Return one page of a user's transactions, newest first.
+
+        Pass the returned cursor back to get the next (older) page; it is None
+        once there are no more transactions.
+        """
+        query = select(LedgerTransaction).where(LedgerTransaction.user_id == user_id)
+        if cursor is not None:
+            query = query.where(LedgerTransaction.id < cursor)
+        query = query.order_by(LedgerTransaction.id.desc()).limit(limit + 1)
+        with self.session_factory() as db:
+            rows = db.execute(query).scalars().all()
+
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
+        transactions = [
+            {
+                "id": row.id,
+                "timestamp": row.created_at.isoformat() + "Z",
+                "amount": row.amount,
+                "description": row.description,
+            }
+            for row in rows[:limit]
+        ]
+        return transactions, next_cursor
+
 # Global ledger instance to be used across the app
-global_ledger = TokenLedger()
+global_ledger = SQLTokenLedger(SessionLocal)
+
+def credit_rewards(
+    user_ids: Sequence[int],
+    previous_metrics: Sequence[float],
+    current_metrics: Sequence[float],
+    scaling_factor: Optional[float] = None,
+    description: str = "Reward for performance improvement"
+) -> Tuple[np.ndarray, Dict[int, float]]:
+    """
+    Compute rewards for a cohort of users and credit them in one ledger write.
+
+    Args:
+        user_ids: User to credit for each pair of metrics.
+        previous_metrics, current_metrics: Metric before and after (lower is better).
+        scaling_factor: Defaults to `settings.TOKEN_REWARD_SCALING_FACTOR`.
+
+    Returns:
+        Tuple[np.ndarray, Dict[int, float]]: The rewards, and the new balance of
+        every credited user.
+    """
+    if scaling_factor is None:
+        scaling_factor = settings.TOKEN_REWARD_SCALING_FACTOR
+    rewards = calculate_rewards(previous_metrics, current_metrics, scaling_factor)
+    balances = global_ledger.record_transactions(user_ids, rewards, description)
+    return rewards, balances
+
+def credit_contributions(
+    user_ids: Sequence[int],
+    contributions: Sequence[float],
+    scaling_factor: Optional[float] = None,
+    description: str = "Reward for contribution to the global model"
+) -> Tuple[np.ndarray, Dict[int, float]]:
+    """
+    Credit each user for their measured contribution, a reduction in loss
+    (e.g. a Shapley value from `utils.contribution`), in one ledger write.
+
+    Rewards follow `calculate_reward`: the contribution times the scaling
+    factor, and nothing for a contribution that is not positive.
+    """
+    return credit_rewards(user_ids, contributions, [0.0] * len(contributions), scaling_factor, description)
@@ -1,88 +1,698 @@
 # backend/utils/training_loop.py
 
+import collections
 import copy
+import math
+import queue
+import random
+import time
 import numpy as np
 import torch
 from torch import nn
 from torch.optim import Optimizer
 from torch.utils.data import DataLoader
-from typing import List, Callable, Generator
+from typing import List, Callable, Generator, Optional, Sequence, Union
+from utils.aggregation import StreamingAggregator, aggregate_updates
+from utils.checkpoint import Checkpoint, SimulationCheckpointer
+from utils.client_training import ClientProcessPool, ClientReplicaPool, train_client_epoch
+from utils.compression import CompressionStats, UpdateCodec, round_trip
+from utils.contribution import ContributionScorer
+from utils.events import (
+    Event,
+    client_result_event,
+    log_event,
+    round_start_event,
+    round_summary_event,
+)
+from utils.evaluation import Evaluator
+from utils.fast_compute import FastCompute
+from utils.flat_state import FlatStateLayout
+from utils.instrumentation import RoundProfiler, count, observe_phase, phase
+from utils.vectorized_training import VectorizedClientTrainer
 
-def aggregate_updates(client_updates: List[dict]) -> dict:
-    """
-    Aggregate client updates by computing the element-wise average of the updates.
-    """
-    aggregated_update = {}
-    keys = client_updates[0].keys()
-    for key in keys:
-        total_update = sum(client_update[key] for client_update in client_updates)
-        aggregated_update[key] = total_update / len(client_updates)
-    return aggregated_update
+AGGREGATION_MODES = ("sync", "async")
+
+def clients_per_round(num_clients: int, fraction_fit: float) -> int:
+    """Number of clients that train each round: ceil(fraction_fit * num_clients), at least one."""
+    return min(num_clients, max(1, math.ceil(fraction_fit * num_clients)))
+
+def sample_clients(num_clients: int, fraction_fit: float, rng: random.Random) -> List[int]:
+    """Pick this round's participating clients, in id order."""
+    return sorted(rng.sample(range(num_clients), clients_per_round(num_clients, fraction_fit)))
+
+def _save_checkpoint(
+    checkpointer: SimulationCheckpointer,
+    round_num: int,
+    layout: FlatStateLayout,
+    global_flat: torch.Tensor,
+    rng: random.Random,
+    codec: Optional[UpdateCodec],
+    evaluator: Optional[Evaluator],
+    contribution: Optional[ContributionScorer] = None,
+    data_generator: Optional[torch.Generator] = None
+) -> Event:
+    # The scores before the first round are the baseline of the run's reward.
+    run_state = {}
+    if evaluator is not None and evaluator.history:
+        run_state["initial_evaluation"] = list(evaluator.history[0])
+    if contribution is not None:
+        run_state["contribution"] = contribution.state_dict()
+    with phase("checkpoint"):
+        kind, num_bytes = checkpointer.save(
+            round_num, layout, global_flat, rng, codec.state_dict() if codec is not None else None, run_state,
+            data_generator.get_state() if data_generator is not None else None,
+        )
+    return log_event(f"Saved {kind} checkpoint for round {round_num} ({num_bytes} bytes)")
+
+def _record_round(round_started: float) -> float:
+    """Wall time of the round started at `round_started`, recorded as the "round" phase."""
+    duration = time.perf_counter() - round_started
+    observe_phase("round", duration)
+    count("rounds")
+    return duration
+
+def _evaluate_global(
+    evaluator: Optional[Evaluator],
+    model: nn.Module,
+    round_num: int,
+    num_rounds: int,
+    load_weights: Callable[[], None]
+) -> Optional[dict]:
+    # Scores the global weights (loaded into `model` by `load_weights`) when due.
+    if evaluator is None or not evaluator.due(round_num, num_rounds):
+        return None
+    with phase("evaluate"):
+        load_weights()
+        return evaluator.evaluate_global(model, round_num)
+
+def _fast_compute_report(fast_compute: FastCompute) -> Event:
+    report = fast_compute.report()
+    message = (
+        f"Fast compute ({report['mode']}): {report['fast_samples_per_s']:.0f} samples/s "
+        f"vs {report['eager_samples_per_s']:.0f} eager ({report['speedup']:.2f}x)"
+    )
+    if report["compile_error"] is not None:
+        message += f"; torch.compile unavailable ({report['compile_error']})"
+    if report["fallback_reason"] is not None:
+        message += f"; using eager ({report['fallback_reason']})"
+    return log_event(message)
+
+def _stop_profiler(profiler: RoundProfiler, round_num: int) -> Optional[Event]:
+    trace_path = profiler.stop()
+    if trace_path is None:
+        return None
+    return log_event(f"Saved a torch.profiler trace of round {round_num} to {trace_path}")
 
 def training_loop_stream(
     global_model: nn.Module,
     num_rounds: int,
-    client_dataloader: DataLoader,
+    client_dataloader: Union[DataLoader, Sequence[DataLoader]],
     criterion: nn.Module,
     optimizer_fn: Callable[[List[torch.nn.parameter.Parameter]], Optimizer],
     num_clients: int = 1,
-    device: str = "cpu"
-) -> Generator[str, None, None]:
+    device: str = "cpu",
+    num_workers: int = 0,
+    threads_per_worker: int = 1,
+    mp_start_method: str = "spawn",
+    vectorized: bool = False,
+    fraction_fit: float = 1.0,
+    seed: Optional[int] = None,
+    codec: Optional[UpdateCodec] = None,
+    checkpointer: Optional[SimulationCheckpointer] = None,
+    resume_from: Optional[Checkpoint] = None,
+    data_generator: Optional[torch.Generator] = None,
+    aggregation: str = "sync",
+    async_buffer_size: int = 4,
+    server_lr: float = 1.0,
+    evaluator: Optional[Evaluator] = None,
+    contribution: Optional[ContributionScorer] = None,
+    persistent_optimizer_state: bool = False,
+    fast_compute: Optional[FastCompute] = None
+) -> Generator[Event, None, None]:
     """
-    A generator version of the federated training loop that yields log messages as each round is processed.
+    A generator version of the federated training loop that yields progress events as each round is processed.
+
+    `client_dataloader` is either one loader that every client trains on, or a
+    sequence of `num_clients` per-client loaders (e.g. shards from
+    `partition_dataset`). Each round, `ceil(fraction_fit * num_clients)` clients
+    are sampled (reproducibly when `seed` is given) and only they train.
+
+    Clients train on a preallocated replica of the model whose weights are
+    refreshed in place and whose optimizer state is zeroed and reused (see
+    `ClientReplicaPool`). With `persistent_optimizer_state`, each client keeps
+    its optimizer state across rounds instead; only the sequential engine
+    supports this.
+
+    Client updates are weighted by the number of samples each client trained on
+    and folded into a `StreamingAggregator` as soon as the client finishes, so
+    memory stays at about two model copies whatever `num_clients` is.
+
+    When `num_workers` is greater than zero, clients are trained in parallel by a
+    pool of `num_workers` processes, each limited to `threads_per_worker` torch
+    threads. `optimizer_fn`, `criterion` and `client_dataloader` must then be
+    picklable (e.g. a `functools.partial` instead of a lambda) unless the
+    "fork" start method is used.
+
+    When `vectorized` is True, all clients are trained as one batched model
+    (see `VectorizedClientTrainer`); this requires an Adam `optimizer_fn`.
+
+    When a `codec` is given (see `utils.compression`), every client update is
+    encoded and decoded before it is aggregated, as if sent to a server, and
+    each round summary reports the compression ratio and the relative error
+    the codec introduced.
+
+    With a `checkpointer`, the server state is checkpointed every
+    `checkpointer.every_rounds` rounds. Passing a loaded checkpoint as
+    `resume_from` restores the global weights, RNG and codec state, the
+    evaluator's score from before the first round and the contribution totals,
+    and continues with the round after it. If the client loaders shuffle with
+    a `data_generator` rather than torch's global RNG, its state is what is
+    checkpointed and restored. With worker processes, the workers'
+    data shuffling and quantization noise are not part of the checkpoint, so a
+    resumed run continues from the same weights but not the same random draws.
+
+    With `aggregation="async"` rounds are not synchronous (FedBuff-style):
+    `ceil(fraction_fit * num_clients)` clients train at a time on a process
+    pool of `max(num_workers, 1)` workers, each against the global weights as
+    they were when it started. Every finished update is discounted by its
+    staleness and buffered, the buffer is applied (scaled by `server_lr`) as
+    soon as it holds `async_buffer_size` updates, and an idle client is started
+    whenever one finishes. Each application counts as a round.
+
+    With an `evaluator`, the global model is scored on the test set before the
+    first round and then as `evaluator.due` says; the scores go into the round
+    summaries and `evaluator.history`.
+
+    With a `contribution` scorer, every client's Shapley value to each round
+    is estimated from the round's updates before they are applied (see
+    `ContributionScorer`) and reported in the round summary. The round's
+    updates are then kept in memory (one model-sized vector per client) until
+    they are scored. Only the sequential and vectorized engines have the
+    updates in-process, so scoring with worker processes or asynchronous
+    aggregation is rejected.
+
+    With a `fast_compute` (see `FastCompute`), client steps are compiled and/or
+    run under bf16 autocast, in the training process or in every worker, with
+    its thread counts. The sequential engine logs the calibrated throughput
+    against eager once it is known; the vectorized engine trains eagerly.
     
     Yields:
-        Log messages as strings.
+        Event dicts (see `utils.events`): log, round_start, client_result and
+        round_summary.
     """
-    yield f"Initial global_model type: {type(global_model)}\n"
+    yield log_event(f"Initial global_model type: {type(global_model).__name__}")
     global_model.to(device)
-    global_weights = copy.deepcopy(global_model.state_dict())
 
-    for round_num in range(num_rounds):
-        yield f"=== Round {round_num + 1} ===\n"
-        client_updates = []
+    if isinstance(client_dataloader, (list, tuple)):
+        if len(client_dataloader) != num_clients:
+            raise ValueError(f"Expected {num_clients} client dataloaders, got {len(client_dataloader)}")
+        client_dataloaders = list(client_dataloader)
+    else:
+        client_dataloaders = [client_dataloader] * num_clients
+    rng = random.Random(seed)
+
+    start_round = 1
+    if resume_from is not None:
+        layout = FlatStateLayout(global_model.state_dict())
+        if resume_from.keys != layout.keys():
+            raise ValueError("Checkpoint does not match the model's state_dict")
+        layout.load_into(global_model.state_dict(), resume_from.weights)
+        rng.setstate(resume_from.rng_state)
+        if data_generator is not None:
+            data_generator.set_state(resume_from.torch_rng_state)
+        else:
+            torch.set_rng_state(resume_from.torch_rng_state)
+        if codec is not None:
+            codec.load_state_dict(resume_from.codec_state)
+        run_state = resume_from.run_state
+        if evaluator is not None and "initial_evaluation" in run_state:
+            evaluator.history.append(tuple(run_state["initial_evaluation"]))
+        if contribution is not None and "contribution" in run_state:
+            contribution.load_state_dict(run_state["contribution"])
+        start_round = resume_from.round + 1
+        yield log_event(f"Resuming from the round {resume_from.round} checkpoint")
+
+    if aggregation not in AGGREGATION_MODES:
+        raise ValueError(f"Unknown aggregation {aggregation!r}; expected one of {AGGREGATION_MODES}")
+    if persistent_optimizer_state and (aggregation == "async" or num_workers > 0 or vectorized):
+        # Clients move between worker processes, and the batched model resets its optimizer every round.
+        raise ValueError("Persistent per-client optimizer state needs the sequential engine")
+    if contribution is not None and (aggregation == "async" or num_workers > 0):
+        # Worker processes fold their updates into shared accumulators and never hand them back.
+        raise ValueError("Contribution scoring needs synchronous aggregation without worker processes")
+    if evaluator is not None:
+        with phase("evaluate"):
+            initial = evaluator.evaluate_global(global_model, start_round - 1)
+        yield log_event(
+            f"Test loss before round {start_round}: {initial['test_loss']:.4f} "
+            f"(accuracy {initial['test_accuracy']:.2%} on {evaluator.num_samples} samples)"
+        )
+    if fast_compute is not None:
+        if vectorized and aggregation != "async" and num_workers == 0:
+            yield log_event("Fast compute does not apply to the vectorized engine; training eagerly")
+            fast_compute = None
+        elif aggregation == "async" or num_workers > 0:
+            yield log_event(f"Fast compute ({fast_compute.mode}) in every worker process")
+        else:
+            intra_op, inter_op = fast_compute.configure_threads()
+            yield log_event(f"Fast compute ({fast_compute.mode}) with {intra_op} intra-op / {inter_op} inter-op threads")
+    if aggregation == "async":
+        yield from _async_training_loop_stream(
+            global_model, num_rounds, client_dataloaders, criterion, optimizer_fn,
+            num_clients, device, max(num_workers, 1), threads_per_worker, mp_start_method,
+            fraction_fit, rng, codec, checkpointer, start_round, async_buffer_size, server_lr,
+            evaluator, fast_compute,
+        )
+        return
+    if num_workers > 0:
+        yield from _parallel_training_loop_stream(
+            global_model, num_rounds, client_dataloaders, criterion, optimizer_fn,
+            num_clients, device, num_workers, threads_per_worker, mp_start_method,
+            fraction_fit, rng, codec, checkpointer, start_round, evaluator, fast_compute,
+        )
+        return
+    if vectorized:
+        yield from _vectorized_training_loop_stream(
+            global_model, num_rounds, client_dataloaders, criterion, optimizer_fn,
+            num_clients, device, fraction_fit, rng, codec, checkpointer, start_round, evaluator,
+            contribution, data_generator,
+        )
+        return
+
+    layout = FlatStateLayout(global_model.state_dict())
+    global_flat = layout.flatten(global_model.state_dict()).to(device)
+    global_weights = layout.unflatten(global_flat)
+    aggregator = StreamingAggregator(layout, device)
+    update = layout.empty().to(device) if codec is not None else None
+    replicas = ClientReplicaPool(
+        global_model, optimizer_fn, layout, device=device,
+        persistent_optimizer_state=persistent_optimizer_state,
+    )
+    profiler = RoundProfiler()
+    fast_compute_reported = False
+
+    for round_num in range(start_round, num_rounds + 1):
+        round_started = time.perf_counter()
+        profiler.start(round_num)
+        clients = sample_clients(num_clients, fraction_fit, rng)
+        yield round_start_event(round_num, clients)
         client_losses = []
+        client_samples = []
+        client_updates = []
+        stats = CompressionStats() if codec is not None else None
+
+        for client in clients:
+            # Train on a pooled replica holding the global weights
+            with replicas.replica(client, global_flat) as (client_model, optimizer):
+                # One epoch of training for the client
+                avg_client_loss, num_samples = train_client_epoch(
+                    client_model, client_dataloaders[client], criterion, optimizer, device, fast_compute
+                )
+                client_losses.append(avg_client_loss)
+                client_samples.append(num_samples)
+                client_evaluation = None
+                if evaluator is not None and evaluator.evaluate_clients:
+                    with phase("evaluate_client"):
+                        client_evaluation = evaluator.evaluate(client_model)
+
+                # Fold the client's update (client weights minus global weights) in right away
+                with phase("aggregate"):
+                    if codec is None and contribution is None:
+                        aggregator.add_state_delta(client_model.state_dict(), global_flat, weight=num_samples)
+                    else:
+                        # Updates kept for contribution scoring each get their own vector.
+                        client_update = layout.flatten(
+                            client_model.state_dict(), out=update if contribution is None else None
+                        ).sub_(global_flat)
+                        if codec is not None:
+                            client_update = round_trip(codec, client_update, client, stats)
+                        aggregator.add(client_update, weight=num_samples)
+                        if contribution is not None:
+                            client_updates.append(client_update)
+            count("client_updates")
+            yield client_result_event(round_num, client, avg_client_loss, num_samples, client_evaluation)
+
+        contributions = None
+        if contribution is not None:
+            with phase("contribution"):
+                contributions = contribution.score_round(
+                    clients, global_model, layout, global_flat, client_updates, client_samples
+                )
+            del client_updates
+
+        # Apply the sample-weighted average update to the global weights
+        with phase("apply"):
+            aggregator.apply_to(global_flat)
+
+        duration = _record_round(round_started)
+        evaluation = _evaluate_global(
+            evaluator, global_model, round_num, num_rounds,
+            lambda: layout.load_into(global_model.state_dict(), global_flat),
+        )
+        profiled = _stop_profiler(profiler, round_num)
+        if profiled is not None:
+            yield profiled
+        yield round_summary_event(
+            round_num, client_losses, client_samples, duration,
+            stats.summary() if stats is not None else None,
+            evaluation=evaluation,
+            contribution=contributions,
+        )
+        if fast_compute is not None and not fast_compute_reported and fast_compute.report() is not None:
+            yield _fast_compute_report(fast_compute)
+            fast_compute_reported = True
+        if checkpointer is not None and checkpointer.due(round_num):
+            yield _save_checkpoint(
+                checkpointer, round_num, layout, global_flat, rng, codec, evaluator, contribution, data_generator
+            )
+
+    global_model.load_state_dict(global_weights)
+    yield log_event("Training loop completed.")
+
+def _parallel_training_loop_stream(
+    global_model: nn.Module,
+    num_rounds: int,
+    client_dataloaders: List[DataLoader],
+    criterion: nn.Module,
+    optimizer_fn: Callable[[List[torch.nn.parameter.Parameter]], Optimizer],
+    num_clients: int,
+    device: str,
+    num_workers: int,
+    threads_per_worker: int,
+    mp_start_method: str,
+    fraction_fit: float,
+    rng: random.Random,
+    codec: Optional[UpdateCodec],
+    checkpointer: Optional[SimulationCheckpointer],
+    start_round: int,
+    evaluator: Optional[Evaluator],
+    fast_compute: Optional[FastCompute]
+) -> Generator[Event, None, None]:
+    """Same rounds as `training_loop_stream`, with clients trained by a process pool."""
+    yield log_event(f"Training clients with {num_workers} worker processes ({threads_per_worker} threads each)")
+    with ClientProcessPool(
+        global_model, client_dataloaders, criterion, optimizer_fn,
+        num_workers, threads_per_worker, device, mp_start_method, codec, fast_compute=fast_compute,
+    ) as pool:
+        aggregator = StreamingAggregator(pool.layout)
+        profiler = RoundProfiler()
+        for round_num in range(start_round, num_rounds + 1):
+            round_started = time.perf_counter()
+            profiler.start(round_num)
+            clients = sample_clients(num_clients, fraction_fit, rng)
+            yield round_start_event(round_num, clients)
+            client_losses = []
+            client_samples = []
+            stats = CompressionStats() if codec is not None else None
+
+            # Results arrive in client order even though the clients train concurrently.
+            for client, avg_client_loss, num_samples, client_stats in pool.train_round(clients):
+                client_losses.append(avg_client_loss)
+                client_samples.append(num_samples)
+                if client_stats is not None:
+                    stats.merge(client_stats)
+                count("client_updates")
+                yield client_result_event(round_num, client, avg_client_loss, num_samples)
+
+            # Workers have folded their clients' updates into shared accumulators.
+            with phase("aggregate"):
+                pool.collect(aggregator)
+            with phase("apply"):
+                aggregator.apply_to(pool.shared_global)
+
+            duration = _record_round(round_started)
+            evaluation = _evaluate_global(
+                evaluator, global_model, round_num, num_rounds,
+                lambda: pool.layout.load_into(global_model.state_dict(), pool.shared_global),
+            )
+            profiled = _stop_profiler(profiler, round_num)
+            if profiled is not None:
+                yield profiled
+            yield round_summary_event(
+                round_num, client_losses, client_samples, duration,
+                stats.summary() if stats is not None else None,
+                evaluation=evaluation,
+            )
+            if checkpointer is not None and checkpointer.due(round_num):
+                yield _save_checkpoint(
+                    checkpointer, round_num, pool.layout, pool.shared_global, rng, codec, evaluator
+                )
+
+        pool.layout.load_into(global_model.state_dict(), pool.shared_global)
+    yield log_event("Training loop completed.")
+
+def _staleness_stats(staleness: List[int]) -> dict:
+    counts = [0] * (max(staleness, default=0) + 1)
+    for value in staleness:
+        counts[value] += 1
+    return {
+        "staleness_mean": sum(staleness) / len(staleness) if staleness else 0.0,
+        "staleness_max": max(staleness, default=0),
+        "staleness_counts": counts,
+    }
+
+class _AsyncRound:
+    """The client results of one asynchronous round, as the server consumes them."""
+
+    def __init__(self, compressed: bool) -> None:
+        self.client_losses: List[float] = []
+        self.client_samples: List[int] = []
+        self.staleness: List[int] = []
+        self.stats = CompressionStats() if compressed else None
+        # client_result events that arrived while an earlier round was still open.
+        self.held_back: List[Event] = []
+
+    def add(self, loss: float, num_samples: int, stats: Optional[CompressionStats], staleness: int) -> None:
+        self.client_losses.append(loss)
+        self.client_samples.append(num_samples)
+        self.staleness.append(staleness)
+        if stats is not None:
+            self.stats.merge(stats)
+
+def _async_training_loop_stream(
+    global_model: nn.Module,
+    num_rounds: int,
+    client_dataloaders: List[DataLoader],
+    criterion: nn.Module,
+    optimizer_fn: Callable[[List[torch.nn.parameter.Parameter]], Optimizer],
+    num_clients: int,
+    device: str,
+    num_workers: int,
+    threads_per_worker: int,
+    mp_start_method: str,
+    fraction_fit: float,
+    rng: random.Random,
+    codec: Optional[UpdateCodec],
+    checkpointer: Optional[SimulationCheckpointer],
+    start_round: int,
+    buffer_size: int,
+    server_lr: float,
+    evaluator: Optional[Evaluator],
+    fast_compute: Optional[FastCompute]
+) -> Generator[Event, None, None]:
+    """Buffered asynchronous aggregation; see `training_loop_stream`."""
+    concurrency = clients_per_round(num_clients, fraction_fit)
+    yield log_event(
+        f"Asynchronous aggregation: {concurrency} clients in flight on {num_workers} worker process{'es' if num_workers != 1 else ''}, "
+        f"applying every {buffer_size} updates"
+    )
+    # Filled from the pool's result thread: result tuples, or the exception a task raised.
+    results: "queue.Queue" = queue.Queue()
+    staleness_total = collections.Counter()
+    applied_total = 0
+    loop_started = time.perf_counter()
+
+    with ClientProcessPool(
+        global_model, client_dataloaders, criterion, optimizer_fn,
+        num_workers, threads_per_worker, device, mp_start_method, codec, asynchronous=True,
+        fast_compute=fast_compute,
+    ) as pool:
+        idle = list(range(num_clients))
+        in_flight = 0
+        round_num = start_round
+        round_started = time.perf_counter()
+        # A round is the time between two buffer applications, so a trace of
+        # it holds the server's wait for updates and the application itself.
+        profiler = RoundProfiler()
+        profiler.start(round_num)
+        # A worker folds its update into the buffer before the server consumes
+        # its result, so an application can merge updates whose results are
+        # still queued. Results are therefore kept by the round whose buffer
+        # they went into (its version, counted from `start_round`), and a
+        # round ends once it has consumed every update its application merged.
+        # Results for the next round are held back until then.
+        rounds = collections.defaultdict(lambda: _AsyncRound(codec is not None))
+        applied = None
+
+        while round_num <= num_rounds:
+            # Keep `concurrency` clients busy, starting idle ones at random.
+            while in_flight < concurrency and idle:
+                pool.submit(idle.pop(rng.randrange(len(idle))), results.put, results.put)
+                in_flight += 1
+
+            result = results.get()
+            if isinstance(result, BaseException):
+                raise result
+            client, avg_client_loss, num_samples, client_stats, client_staleness, fold_seconds, buffer_version = result
+            observe_phase("aggregate", fold_seconds)
+            in_flight -= 1
+            idle.append(client)
+            count("client_updates")
+            result_round = start_round + buffer_version
+            rounds[result_round].add(avg_client_loss, num_samples, client_stats, client_staleness)
+            event = client_result_event(result_round, client, avg_client_loss, num_samples)
+            if result_round == round_num:
+                yield event
+            else:
+                rounds[result_round].held_back.append(event)
+
+            while round_num <= num_rounds:
+                if applied is None:
+                    if pool.buffered_updates() < buffer_size:
+                        break
+                    with phase("apply"):
+                        applied = pool.apply_buffer(server_lr)
+                    duration = _record_round(round_started)
+                    evaluation = _evaluate_global(
+                        evaluator, global_model, round_num, num_rounds,
+                        lambda: pool.layout.load_into(global_model.state_dict(), pool.shared_global),
+                    )
+                current = rounds[round_num]
+                if len(current.client_losses) < applied:
+                    break
+                del rounds[round_num]
+                applied_total += applied
+                staleness_total.update(current.staleness)
+                profiled = _stop_profiler(profiler, round_num)
+                if profiled is not None:
+                    yield profiled
+                yield round_summary_event(
+                    round_num, current.client_losses, current.client_samples, duration,
+                    current.stats.summary() if current.stats is not None else None,
+                    dict(
+                        _staleness_stats(current.staleness),
+                        updates_per_second=applied / duration if duration > 0 else 0.0,
+                    ),
+                    evaluation,
+                )
+                if checkpointer is not None and checkpointer.due(round_num):
+                    yield _save_checkpoint(
+                        checkpointer, round_num, pool.layout, pool.shared_global, rng, codec, evaluator
+                    )
+
+                round_num += 1
+                applied = None
+                round_started = time.perf_counter()
+                profiler.start(round_num)
+                if round_num <= num_rounds:
+                    yield from rounds[round_num].held_back
+                    rounds[round_num].held_back.clear()
+
+        pool.layout.load_into(global_model.state_dict(), pool.shared_global)
+
+    elapsed = time.perf_counter() - loop_started
+    distribution = ", ".join(f"{s}: {count}" for s, count in sorted(staleness_total.items()))
+    yield log_event(
+        f"Applied {applied_total} updates at {applied_total / elapsed:.2f} updates/s; "
+        f"staleness distribution {{{distribution}}}"
+    )
+    yield log_event("Training loop completed.")
+
+def _vectorized_training_loop_stream(
+    global_model: nn.Module,
+    num_rounds: int,
+    client_dataloaders: List[DataLoader],
+    criterion: nn.Module,
+    optimizer_fn: Callable[[List[torch.nn.parameter.Parameter]], Optimizer],
+    num_clients: int,
+    device: str,
+    fraction_fit: float,
+    rng: random.Random,
+    codec: Optional[UpdateCodec],
+    checkpointer: Optional[SimulationCheckpointer],
+    start_round: int,
+    evaluator: Optional[Evaluator],
+    contribution: Optional[ContributionScorer],
+    data_generator: Optional[torch.Generator]
+) -> Generator[Event, None, None]:
+    """Same rounds as `training_loop_stream`, with all clients trained as one batched model."""
+    num_sampled = clients_per_round(num_clients, fraction_fit)
+    yield log_event(f"Training {num_sampled} clients per round as one vectorized model")
+    # The batched model only needs a slot for each client that trains in a round.
+    trainer = VectorizedClientTrainer(global_model, criterion, optimizer_fn, num_sampled, device)
+    global_weights = copy.deepcopy(global_model.state_dict())
+    if codec is not None or contribution is not None:
+        # Per-client updates are flattened over the trained parameters only.
+        layout = FlatStateLayout({name: global_weights[name] for name in trainer.param_names})
+        aggregator = StreamingAggregator(layout, device)
+        update = layout.empty().to(device)
+    if checkpointer is not None:
+        state_layout = FlatStateLayout(global_weights)
+    profiler = RoundProfiler()
+
+    for round_num in range(start_round, num_rounds + 1):
+        round_started = time.perf_counter()
+        profiler.start(round_num)
+        clients = sample_clients(num_clients, fraction_fit, rng)
+        yield round_start_event(round_num, clients)
+        with phase("train"):
+            client_losses, client_samples = trainer.train_round(
+                global_weights, [client_dataloaders[client] for client in clients]
+            )
+        count("client_updates", len(clients))
+        for client, avg_client_loss, num_samples in zip(clients, client_losses, client_samples):
+            yield client_result_event(round_num, client, avg_client_loss, num_samples)
+
+        stats = None
+        contributions = None
+        with phase("aggregate"):
+            if codec is None and contribution is None:
+                aggregated_update = trainer.mean_update(global_weights, client_samples)
+                for key in aggregated_update.keys():
+                    global_weights[key] += aggregated_update[key]
+            else:
+                # Each client's update is flattened (and goes through the codec) on its own.
+                stats = CompressionStats() if codec is not None else None
+                global_flat = layout.flatten(global_weights).to(device)
+                client_updates = []
+                for index, (client, num_samples) in enumerate(zip(clients, client_samples)):
+                    client_params = {name: trainer.params[name][index] for name in trainer.param_names}
+                    client_update = layout.flatten(
+                        client_params, out=update if contribution is None else None
+                    ).sub_(global_flat)
+                    if codec is not None:
+                        client_update = round_trip(codec, client_update, client, stats)
+                    aggregator.add(client_update, weight=num_samples)
+                    if contribution is not None:
+                        client_updates.append(client_update)
+                if contribution is not None:
+                    with phase("contribution"):
+                        contributions = contribution.score_round(
+                            clients, global_model, layout, global_flat, client_updates, client_samples
+                        )
+                    del client_updates
+                aggregator.apply_to(global_flat)
+                layout.load_into(global_weights, global_flat)
 
-        for client in range(num_clients):
-            # Create a fresh client model and load global weights
-            client_model = copy.deepcopy(global_model)
-            client_model.load_state_dict(global_weights)
-            client_model.to(device)
-            client_model.train()
-
-            optimizer = optimizer_fn(client_model.parameters())
-            running_loss = 0.0
-            total_batches = 0
-
-            # One epoch of training for the client
-            for batch in client_dataloader:
-                inputs, targets = batch
-                inputs, targets = inputs.to(device), targets.to(device)
-                optimizer.zero_grad()
-                outputs = client_model(inputs)
-                loss = criterion(outputs, targets)
-                loss.backward()
-                optimizer.step()
-
-                running_loss += loss.item()
-                total_batches += 1
-
-            avg_client_loss = running_loss / total_batches if total_batches > 0 else 0.0
-            client_losses.append(avg_client_loss)
-            yield f"Client {client} average loss: {avg_client_loss:.4f}\n"
-
-            # Calculate update: difference between client model and global weights
-            client_state = client_model.state_dict()
-            update = {key: client_state[key] - global_weights[key] for key in global_weights.keys()}
-            client_updates.append(update)
-
-        # Aggregate client updates and update global weights
-        aggregated_update = aggregate_updates(client_updates)
-        for key in global_weights.keys():
-            global_weights[key] += aggregated_update[key]
-
-        round_avg_loss = sum(client_losses) / num_clients
-        yield f"Average loss for round {round_num + 1}: {round_avg_loss:.4f}\n"
+        duration = _record_round(round_started)
+        evaluation = _evaluate_global(
+            evaluator, global_model, round_num, num_rounds,
+            lambda: global_model.load_state_dict(global_weights),
+        )
+        profiled = _stop_profiler(profiler, round_num)
+        if profiled is not None:
+            yield profiled
+        yield round_summary_event(
+            round_num, client_losses, client_samples, duration,
+            stats.summary() if stats is not None else None,
+            evaluation=evaluation,
+            contribution=contributions,
+        )
+        if checkpointer is not None and checkpointer.due(round_num):
+            yield _save_checkpoint(
+                checkpointer, round_num, state_layout, state_layout.flatten(global_weights), rng, codec,
+                evaluator, contribution, data_generator,
+            )
 
     global_model.load_state_dict(global_weights)
-    yield "Training loop completed.\n"
+    yield log_event("Training loop completed.")
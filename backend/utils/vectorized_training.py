@@ -0,0 +1,246 @@
+# backend/utils/vectorized_training.py
+
+import math
+import torch
+from torch import nn
+from torch.func import functional_call, grad_and_value, vmap
+from torch.optim import Adam, Optimizer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+class BatchedAdam:
+    """
+    Adam over parameters stacked along a leading "client" dimension.
+
+    Each client keeps its own moment estimates and step count, and the update
+    follows `torch.optim.Adam`'s single-tensor implementation exactly, so
+    client `c` of a batched run sees the same trajectory as an `Adam` instance
+    driving an unstacked copy of its parameters.
+    """
+
+    def __init__(
+        self,
+        params: Dict[str, torch.Tensor],
+        lr: float = 1e-3,
+        betas: Tuple[float, float] = (0.9, 0.999),
+        eps: float = 1e-8,
+        weight_decay: float = 0.0
+    ) -> None:
+        self.params = params
+        self.lr = lr
+        self.beta1, self.beta2 = betas
+        self.eps = eps
+        self.weight_decay = weight_decay
+        num_clients = next(iter(params.values())).shape[0]
+        self.step_count = torch.zeros(num_clients, dtype=torch.float64)
+        self.exp_avg = {key: torch.zeros_like(p) for key, p in params.items()}
+        self.exp_avg_sq = {key: torch.zeros_like(p) for key, p in params.items()}
+        # Scratch space for the denominator, so a step allocates nothing model-sized.
+        self._denom = {key: torch.empty_like(p) for key, p in params.items()}
+
+    @classmethod
+    def from_optimizer_fn(
+        cls,
+        optimizer_fn: Callable[[List[torch.nn.parameter.Parameter]], Optimizer],
+        params: Dict[str, torch.Tensor]
+    ) -> "BatchedAdam":
+        """Build a batched optimizer with the hyperparameters `optimizer_fn` would use."""
+        probe = optimizer_fn([torch.nn.Parameter(torch.zeros(1))])
+        if type(probe) is not Adam:
+            raise ValueError(f"Vectorized training only supports Adam, got {type(probe).__name__}")
+        defaults = probe.defaults
+        if defaults.get("amsgrad") or defaults.get("maximize"):
+            raise ValueError("Vectorized training does not support amsgrad or maximize")
+        return cls(
+            params,
+            lr=defaults["lr"],
+            betas=defaults["betas"],
+            eps=defaults["eps"],
+            weight_decay=defaults["weight_decay"],
+        )
+
+    def reset(self) -> None:
+        """Zero all moment estimates, as if every client built a fresh optimizer."""
+        self.step_count.zero_()
+        for key in self.params:
+            self.exp_avg[key].zero_()
+            self.exp_avg_sq[key].zero_()
+
+    @torch.no_grad()
+    def step(self, grads: Dict[str, torch.Tensor], index: Optional[torch.Tensor] = None) -> None:
+        """
+        Apply one Adam step.
+
+        Args:
+            grads: Gradients stacked like the parameters, restricted to `index`.
+            index: Clients the gradients belong to; None means every client.
+        """
+        if index is None:
+            self.step_count += 1
+            step = self.step_count
+        else:
+            self.step_count[index] += 1
+            step = self.step_count[index]
+
+        # Clients normally advance in lockstep; then the bias corrections are plain
+        # scalars and the update is the exact `torch.optim.Adam` arithmetic.
+        lockstep = bool((step == step[0]).all())
+        if lockstep:
+            bias_correction1 = 1 - self.beta1 ** step[0].item()
+            bias_correction2_sqrt = math.sqrt(1 - self.beta2 ** step[0].item())
+            step_size = self.lr / bias_correction1
+        else:
+            bias_correction1 = 1 - self.beta1 ** step
+            bias_correction2_sqrt = (1 - self.beta2 ** step).sqrt().to(torch.float32)
+            step_size = (self.lr / bias_correction1).to(torch.float32)
+
+        for key, grad in grads.items():
+            if index is None:
+                param, exp_avg, exp_avg_sq = self.params[key], self.exp_avg[key], self.exp_avg_sq[key]
+                denom = self._denom[key]
+            else:
+                param = self.params[key][index]
+                exp_avg = self.exp_avg[key][index]
+                exp_avg_sq = self.exp_avg_sq[key][index]
+                denom = torch.empty_like(param)
+
+            if self.weight_decay != 0:
+                grad = grad.add(param, alpha=self.weight_decay)
+            exp_avg.lerp_(grad, 1 - self.beta1)
+            exp_avg_sq.mul_(self.beta2).addcmul_(grad, grad, value=1 - self.beta2)
+            torch.sqrt(exp_avg_sq, out=denom)
+            if lockstep:
+                denom.div_(bias_correction2_sqrt).add_(self.eps)
+                param.addcdiv_(exp_avg, denom, value=-step_size)
+            else:
+                # Broadcast the per-client scalars over each client's parameter block.
+                shape = (-1,) + (1,) * (param.dim() - 1)
+                denom.div_(bias_correction2_sqrt.view(shape)).add_(self.eps)
+                torch.div(exp_avg, denom, out=denom)
+                param.sub_(denom.mul_(step_size.view(shape)))
+
+            if index is not None:
+                self.params[key].index_copy_(0, index, param)
+                self.exp_avg[key].index_copy_(0, index, exp_avg)
+                self.exp_avg_sq[key].index_copy_(0, index, exp_avg_sq)
+
+class VectorizedClientTrainer:
+    """
+    Trains many "virtual clients" of one model as a single batched model.
+
+    Every parameter is stacked along a leading client dimension and a single
+    `vmap`-ed forward/backward call computes all clients' gradients at once,
+    replacing the per-client model copy, optimizer and training loop. The
+    storage for the stacked parameters and the Adam state is allocated once
+    and reused every round.
+    """
+
+    def __init__(
+        self,
+        global_model: nn.Module,
+        criterion: nn.Module,
+        optimizer_fn: Callable[[List[torch.nn.parameter.Parameter]], Optimizer],
+        num_clients: int,
+        device: str = "cpu"
+    ) -> None:
+        self.model = global_model
+        self.criterion = criterion
+        self.num_clients = num_clients
+        self.device = device
+        self.param_names = [name for name, _ in global_model.named_parameters()]
+        self.buffers = {name: b.detach() for name, b in global_model.named_buffers()}
+        self.params = {
+            name: torch.empty((num_clients,) + p.shape, dtype=p.dtype, device=device)
+            for name, p in global_model.named_parameters()
+        }
+        self.optimizer = BatchedAdam.from_optimizer_fn(optimizer_fn, self.params)
+        self._grad_fn = vmap(grad_and_value(self._client_loss), in_dims=(0, None, 0, 0))
+
+    def _client_loss(self, params, buffers, inputs, targets):
+        outputs = functional_call(self.model, (params, buffers), (inputs,))
+        return self.criterion(outputs, targets)
+
+    def train_round(
+        self,
+        global_weights: Dict[str, torch.Tensor],
+        client_dataloaders: Sequence[Iterable]
+    ) -> Tuple[List[float], List[int]]:
+        """
+        Run one local epoch for every client, starting from `global_weights`.
+
+        Afterwards `self.params[name][c]` holds client c's trained parameters.
+
+        Returns:
+            Tuple[List[float], List[int]]: Each client's average training loss
+            and number of samples seen.
+        """
+        with torch.no_grad():
+            for name in self.param_names:
+                self.params[name].copy_(global_weights[name].expand_as(self.params[name]))
+        self.optimizer.reset()
+        self.model.train()
+
+        running_loss = torch.zeros(self.num_clients, dtype=torch.float64)
+        total_batches = torch.zeros(self.num_clients, dtype=torch.float64)
+        total_samples = torch.zeros(self.num_clients, dtype=torch.int64)
+        iterators = [iter(loader) for loader in client_dataloaders]
+        active = list(range(self.num_clients))
+
+        while active:
+            # Clients whose next batches have the same shape train together; in
+            # practice that is everybody except on each epoch's final, short batch.
+            groups = {}
+            still_active = []
+            for client in active:
+                batch = next(iterators[client], None)
+                if batch is None:
+                    continue
+                still_active.append(client)
+                inputs, targets = batch
+                groups.setdefault(tuple(inputs.shape), []).append((client, inputs, targets))
+            active = still_active
+
+            for group in groups.values():
+                clients = [client for client, _, _ in group]
+                inputs = torch.stack([inputs for _, inputs, _ in group]).to(self.device)
+                targets = torch.stack([targets for _, _, targets in group]).to(self.device)
+                if len(clients) == self.num_clients:
+                    index = None
+                    params = self.params
+                else:
+                    index = torch.tensor(clients, device=self.device)
+                    params = {name: p[index] for name, p in self.params.items()}
+
+                grads, losses = self._grad_fn(params, self.buffers, inputs, targets)
+                self.optimizer.step(grads, index)
+
+                losses = losses.detach().to("cpu", torch.float64)
+                if index is None:
+                    running_loss += losses
+                    total_batches += 1
+                    total_samples += targets.size(1)
+                else:
+                    running_loss[clients] += losses
+                    total_batches[clients] += 1
+                    total_samples[clients] += targets.size(1)
+
+        averages = running_loss / total_batches.clamp(min=1)
+        return averages.tolist(), total_samples.tolist()
+
+    def mean_update(
+        self,
+        global_weights: Dict[str, torch.Tensor],
+        client_samples: Optional[List[int]] = None
+    ) -> Dict[str, torch.Tensor]:
+        """
+        Average client update (client weights minus global weights) per parameter,
+        weighted by each client's sample count when `client_samples` is given.
+        """
+        if client_samples is None:
+            client_samples = [1] * self.num_clients
+        weights = torch.tensor(client_samples, dtype=torch.float32, device=self.device)
+        weights /= weights.sum()
+        # A weighted contraction over the client dimension; no per-client temporaries.
+        return {
+            name: torch.tensordot(weights, self.params[name], dims=1) - global_weights[name]
+            for name in self.param_names
+        }
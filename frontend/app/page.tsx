@@ -4,6 +4,42 @@ import React, { useState, useRef, useEffect } from "react";
 import Head from "next/head";
 // import { useRouter } from "next/navigation";
 
+// Simulation progress event, as streamed by the backend (see backend/utils/events.py).
+interface SimulationEvent {
+  type: string;
+  [field: string]: unknown;
+}
+
+function describeEvent(e: SimulationEvent): string {
+  const num = (value: unknown, digits: number) => Number(value).toFixed(digits);
+  switch (e.type) {
+    case "round_start":
+      return `=== Round ${e.round} ===`;
+    case "client_result":
+      return `Client ${e.client} average loss: ${num(e.loss, 4)}`;
+    case "round_summary": {
+      const omitted = e.omitted_client_results
+        ? ` (${e.omitted_client_results} client results omitted)`
+        : "";
+      const staleness =
+        e.staleness_mean !== undefined
+          ? ` (${num(e.updates_per_second, 2)} updates/s, mean staleness ${num(e.staleness_mean, 2)})`
+          : "";
+      const evaluation =
+        e.test_accuracy !== undefined
+          ? `, test loss ${num(e.test_loss, 4)}, accuracy ${num(Number(e.test_accuracy) * 100, 2)}%`
+          : "";
+      return `Average loss for round ${e.round}: ${num(e.avg_loss, 4)}${evaluation}${staleness}${omitted}`;
+    }
+    case "reward":
+      return `Calculated reward: ${num(e.reward, 4)} (balance for user ${e.user_id}: ${num(e.balance, 2)})`;
+    case "done":
+      return `Simulation record saved with ID: ${e.simulation_id}`;
+    default:
+      return String(e.message ?? JSON.stringify(e));
+  }
+}
+
 export default function HomePage() {
   // const router = useRouter();
   const [simulationLogs, setSimulationLogs] = useState<string[]>([]);
@@ -12,7 +48,7 @@ export default function HomePage() {
   const [error, setError] = useState<string>("");
   const logsContainerRef = useRef<HTMLDivElement>(null);
 
-  const handleTriggerSimulation = () => {
+  const handleTriggerSimulation = async () => {
     setLoading(true);
     setError("");
     setSimulationLogs([]);
@@ -21,35 +57,60 @@ export default function HomePage() {
     const numRounds = 10;
     const numClients = 2;
     const fractionFit = 0.5;
-    const url = `http://localhost:8000/api/simulations/stream?num_rounds=${numRounds}&num_clients=${numClients}&fraction_fit=${fractionFit}`;
+    const apiBase = "http://localhost:8000/api/simulations";
+
+    // Submit the simulation as a background job, then follow its event stream.
+    let jobId: number;
+    try {
+      const res = await fetch(`${apiBase}/jobs`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          num_rounds: numRounds,
+          num_clients: numClients,
+          fraction_fit: fractionFit,
+        }),
+      });
+      const data = await res.json();
+      if (!res.ok) {
+        throw new Error(data.detail || "Failed to start simulation");
+      }
+      jobId = data.job_id;
+    } catch (err: unknown) {
+      setError(err instanceof Error ? err.message : "An unexpected error occurred");
+      setLoading(false);
+      return;
+    }
 
-    const eventSource = new EventSource(url);
+    const eventSource = new EventSource(`${apiBase}/jobs/${jobId}/events`);
 
     eventSource.onmessage = (event) => {
-      console.log("Received event:", event.data);
-      setSimulationLogs((prevLogs) => [...prevLogs, event.data]);
+      // Each message carries a JSON array of typed simulation events.
+      const batch: SimulationEvent[] = JSON.parse(event.data);
+      setSimulationLogs((prevLogs) => [...prevLogs, ...batch.map(describeEvent)]);
 
       // Append summary messages to trainingResult state.
-      if (
-        event.data.startsWith("Calculated reward:") ||
-        event.data.startsWith("Simulation record saved with ID:")
-      ) {
-        setTrainingResult((prev) => prev + event.data + "\n");
+      const summaries = batch
+        .filter((e) => e.type === "reward" || e.type === "done")
+        .map(describeEvent);
+      if (summaries.length > 0) {
+        setTrainingResult((prev) => prev + summaries.join("\n") + "\n");
       }
     };
 
-    // Modified error handler: simply close connection and stop loading.
+    // The browser reconnects on its own after a dropped connection and resumes
+    // from the last event it saw (Last-Event-ID); only stop once it gives up.
     eventSource.onerror = () => {
-      // Removed console.error to avoid unnecessary error logging.
-      eventSource.close();
-      setLoading(false);
+      if (eventSource.readyState === EventSource.CLOSED) {
+        setLoading(false);
+      }
     };
 
     eventSource.onopen = () => {
       console.log("EventSource connection established.");
     };
 
-    // Close connection when stream ends.
+    // The server sends a "close" event once the job has finished.
     eventSource.addEventListener("close", () => {
       eventSource.close();
       setLoading(false);
@@ -13,33 +13,43 @@ interface SimulationRecord {
   status: string;
 }
 
+interface SimulationRecordPage {
+  items: SimulationRecord[];
+  next_cursor: string | null;
+}
+
 export default function SimulationsPage() {
   const [simulations, setSimulations] = useState<SimulationRecord[]>([]);
   const [loading, setLoading] = useState<boolean>(true);
   const [error, setError] = useState<string>("");
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
-  useEffect(() => {
-    const fetchSimulations = async () => {
-      try {
-        const res = await fetch("/api/simulations/"); // using trailing slash
-        if (!res.ok) {
-          const data = await res.json();
-          throw new Error(data.detail || "Failed to fetch simulations");
-        }
-        const data: SimulationRecord[] = await res.json();
-        setSimulations(data);
-      } catch (err: unknown) {
-        if (err instanceof Error) {
-          setError(err.message);
-        } else {
-          setError("An unexpected error occurred");
-        }
-      } finally {
-        setLoading(false);
+  // Records are paginated newest first; each page carries the cursor of the next.
+  const fetchSimulations = async (cursor: string | null) => {
+    setLoading(true);
+    try {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+      const res = await fetch(`/api/simulations/${query}`); // using trailing slash
+      if (!res.ok) {
+        const data = await res.json();
+        throw new Error(data.detail || "Failed to fetch simulations");
       }
-    };
+      const data: SimulationRecordPage = await res.json();
+      setSimulations((prev) => (cursor ? [...prev, ...data.items] : data.items));
+      setNextCursor(data.next_cursor);
+    } catch (err: unknown) {
+      if (err instanceof Error) {
+        setError(err.message);
+      } else {
+        setError("An unexpected error occurred");
+      }
+    } finally {
+      setLoading(false);
+    }
+  };
 
-    fetchSimulations();
+  useEffect(() => {
+    fetchSimulations(null);
   }, []);
 
   return (
@@ -49,12 +59,12 @@ export default function SimulationsPage() {
       </Head>
       <main className="container mx-auto px-4 py-8">
         <h1 className="text-4xl font-bold mb-6">Simulations Dashboard</h1>
-        {loading && <p>Loading simulation records...</p>}
+        {loading && simulations.length === 0 && <p>Loading simulation records...</p>}
         {error && <p className="text-red-500">{error}</p>}
         {!loading && !error && simulations.length === 0 && (
           <p>No simulation records found.</p>
         )}
-        {!loading && !error && simulations.length > 0 && (
+        {!error && simulations.length > 0 && (
           <div className="space-y-4">
             {simulations.map((sim) => (
               <div key={sim.id} className="p-4 bg-white shadow rounded">
@@ -75,6 +85,15 @@ export default function SimulationsPage() {
                 <p>Status: {sim.status}</p>
               </div>
             ))}
+            {nextCursor && (
+              <button
+                onClick={() => fetchSimulations(nextCursor)}
+                disabled={loading}
+                className="px-4 py-2 bg-blue-500 text-white rounded"
+              >
+                {loading ? "Loading..." : "Load more"}
+              </button>
+            )}
           </div>
         )}
       </main>